@@ -1,12 +1,71 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.forms.models import BaseInlineFormSet
 
 from .models import (
     CallRecord, 
+    CompletedCall,
+    PeriodTotal,
     PhoneBill, 
-    CallDetail
+    CallDetail,
+    QuarantinedCallRecord,
+    SubscriberTariff,
+    Tariff,
+    TariffVersion,
+    TariffWindow,
 )
+from .tariffs import compile_tariff, publish_tariff_version
+
+
+class TariffWindowFormSet(BaseInlineFormSet):
+    def clean(self):
+        """
+        Reject windows that overlap others of the same day type.
+        """
+        super().clean()
+        windows = [
+            (
+                form.cleaned_data["day_type"],
+                form.cleaned_data["start_time"],
+                form.cleaned_data["end_time"],
+                form.cleaned_data["rate_per_minute"],
+            )
+            for form in self.forms
+            if form.cleaned_data and not form.errors and not self._should_delete_form(form)
+        ]
+        try:
+            compile_tariff(0, windows)
+        except ValueError as exc:
+            raise ValidationError(str(exc)) from exc
+
+
+class TariffWindowInline(admin.TabularInline):
+    model = TariffWindow
+    formset = TariffWindowFormSet
+    extra = 0
+
+
+@admin.register(TariffVersion)
+class TariffVersionAdmin(admin.ModelAdmin):
+    list_display = ("tariff", "effective_from", "fixed_rate", "published_at")
+    list_filter = ("tariff",)
+    inlines = [TariffWindowInline]
+    actions = ["publish"]
+
+    @admin.action(description="Publish the selected tariff versions")
+    def publish(self, request, queryset):
+        for version in queryset.filter(published_at__isnull=True):
+            try:
+                publish_tariff_version(version)
+            except ValidationError as exc:
+                self.message_user(request, f"{version} was not published: {exc.messages[0]}", messages.ERROR)
 
 
 admin.site.register(CallRecord)
+admin.site.register(CompletedCall)
+admin.site.register(PeriodTotal)
 admin.site.register(PhoneBill)
-admin.site.register(CallDetail)
\ No newline at end of file
+admin.site.register(CallDetail)
+admin.site.register(QuarantinedCallRecord)
+admin.site.register(Tariff)
+admin.site.register(SubscriberTariff)
@@ -0,0 +1,219 @@
+import os
+import json
+import shutil
+import hashlib
+from decimal import Decimal
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.conf import settings
+
+from .utils import CENT
+
+
+# Completed call fields stored in an archive, one column file each
+ARCHIVE_FIELDS = [
+    "id", "call_id", "source", "destination", "start_time", "end_time", "duration", "billable_minutes", "price",
+]
+
+# Fields that can be null, each stored with a mask of its null values next
+# to it, since strings are stored as bytes
+NULLABLE_FIELDS = ["source", "destination"]
+ARCHIVE_COLUMNS = ARCHIVE_FIELDS + [f"{field}_null" for field in NULLABLE_FIELDS]
+
+MANIFEST = "manifest.json"
+ARCHIVE_FORMAT = 1
+
+# Archived periods kept open, memory-mapped, per process
+ARCHIVE_CACHE_SIZE = 24
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def cents_price(cents):
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_path(period_start):
+    return os.path.join(settings.BILLING_ARCHIVE_DIR, f"{period_start:%Y-%m}")
+
+
+def is_archived(period_start):
+    """
+    Return whether the period beginning on the `period_start` date was
+    archived.
+    """
+    return os.path.exists(os.path.join(archive_path(period_start), MANIFEST))
+
+
+def call_columns(calls):
+    """
+    Return fixed-width arrays of the `ARCHIVE_FIELDS` of completed calls,
+    given as tuples, sorted by (source, start_time, id) so the calls of a
+    subscriber are one contiguous, ordered slice.
+
+    Strings are stored as UTF-8 bytes of the longest value's width, with
+    null sources and destinations as empty strings flagged in their
+    `NULLABLE_FIELDS` masks, times and durations as integer microseconds
+    and prices as integer cents.
+    """
+    ids, call_ids, sources, destinations = [], [], [], []
+    source_nulls, destination_nulls = [], []
+    start_times, end_times, durations, billable_minutes, prices = [], [], [], [], []
+
+    for call in calls:
+        ids.append(call[0])
+        call_ids.append(call[1].encode())
+        sources.append((call[2] or "").encode())
+        source_nulls.append(call[2] is None)
+        destinations.append((call[3] or "").encode())
+        destination_nulls.append(call[3] is None)
+        start_times.append((call[4] - EPOCH) // MICROSECOND)
+        end_times.append((call[5] - EPOCH) // MICROSECOND)
+        durations.append(call[6] // MICROSECOND)
+        billable_minutes.append(call[7])
+        prices.append(int(call[8] * 100))
+
+    columns = {
+        "id": np.array(ids, dtype=np.int64),
+        "call_id": np.array(call_ids, dtype=np.bytes_),
+        "source": np.array(sources, dtype=np.bytes_),
+        "destination": np.array(destinations, dtype=np.bytes_),
+        "start_time": np.array(start_times, dtype=np.int64),
+        "end_time": np.array(end_times, dtype=np.int64),
+        "duration": np.array(durations, dtype=np.int64),
+        "billable_minutes": np.array(billable_minutes, dtype=np.int32),
+        "price": np.array(prices, dtype=np.int64),
+        "source_null": np.array(source_nulls, dtype=np.bool_),
+        "destination_null": np.array(destination_nulls, dtype=np.bool_),
+    }
+    order = np.lexsort((columns["id"], columns["start_time"], columns["source"]))
+    return {field: column[order] for field, column in columns.items()}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as column_file:
+        for chunk in iter(lambda: column_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_archive(directory, period_start, columns):
+    """
+    Write `columns` as one `.npy` file each, with a manifest holding their
+    checksums, the row count and the total price.
+
+    The files are written next to `directory` and moved into place once
+    complete, so an interrupted write leaves no archive behind.
+    """
+    partial = f"{directory}.partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+
+    files = {}
+    for field, column in columns.items():
+        path = os.path.join(partial, f"{field}.npy")
+        np.save(path, column)
+        files[field] = {"dtype": column.dtype.str, "sha256": file_sha256(path)}
+
+    manifest = {
+        "format": ARCHIVE_FORMAT,
+        "period": period_start.strftime("%Y-%m"),
+        "rows": len(columns["id"]),
+        "total_price": str(cents_price(columns["price"].sum())),
+        "columns": files,
+    }
+    with open(os.path.join(partial, MANIFEST), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+    os.replace(partial, directory)
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as manifest_file:
+        return json.load(manifest_file)
+
+
+def verify_archive(directory, columns=None):
+    """
+    Check the column files of an archive against the checksums, row count
+    and total price of its manifest and, when given, against the `columns`
+    it was written from. Raises ArchiveError on the first mismatch.
+    """
+    manifest = read_manifest(directory)
+    if set(manifest["columns"]) != set(ARCHIVE_COLUMNS):
+        raise ArchiveError(f"{directory}: unexpected columns {sorted(manifest['columns'])}.")
+
+    for field, expected in manifest["columns"].items():
+        path = os.path.join(directory, f"{field}.npy")
+        if file_sha256(path) != expected["sha256"]:
+            raise ArchiveError(f"{path}: checksum mismatch.")
+
+        column = np.load(path, mmap_mode="r")
+        if column.dtype.str != expected["dtype"] or len(column) != manifest["rows"]:
+            raise ArchiveError(f"{path}: expected {manifest['rows']} values of {expected['dtype']}.")
+        if columns is not None and not np.array_equal(column, columns[field]):
+            raise ArchiveError(f"{path}: does not match the archived calls.")
+
+    total_price = cents_price(np.load(os.path.join(directory, "price.npy"), mmap_mode="r").sum())
+    if total_price != Decimal(manifest["total_price"]):
+        raise ArchiveError(f"{directory}: total price {total_price} instead of {manifest['total_price']}.")
+    return manifest
+
+
+class ArchivedPeriod:
+    """
+    The memory-mapped columns of an archived period. Only the pages of the
+    calls that are read are loaded from disk.
+    """
+    __slots__ = ("columns",)
+
+    def __init__(self, directory):
+        self.columns = {
+            field: np.load(os.path.join(directory, f"{field}.npy"), mmap_mode="r")
+            for field in ARCHIVE_COLUMNS
+        }
+
+    def bill_rows(self, phone_number):
+        """
+        Return the call rows of the bill of `phone_number`, as (id,
+        destination, start_time, duration, price) tuples ordered by
+        (start_time, id), and its total price.
+        """
+        sources = self.columns["source"]
+        key = phone_number.encode()
+        first = int(np.searchsorted(sources, key, side="left"))
+        last = int(np.searchsorted(sources, key, side="right"))
+
+        prices = self.columns["price"][first:last]
+        rows = [
+            (
+                row_id,
+                None if destination_null else destination.decode(),
+                EPOCH + timedelta(microseconds=start_time),
+                timedelta(microseconds=duration),
+                cents_price(price),
+            )
+            for row_id, destination, destination_null, start_time, duration, price in zip(
+                self.columns["id"][first:last].tolist(),
+                self.columns["destination"][first:last].tolist(),
+                self.columns["destination_null"][first:last].tolist(),
+                self.columns["start_time"][first:last].tolist(),
+                self.columns["duration"][first:last].tolist(),
+                prices.tolist(),
+            )
+        ]
+        return rows, cents_price(prices.sum())
+
+
+@lru_cache(maxsize=ARCHIVE_CACHE_SIZE)
+def open_archived_period(directory):
+    return ArchivedPeriod(directory)
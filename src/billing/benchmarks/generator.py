@@ -0,0 +1,72 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from billing.models import CallRecord
+
+
+DEFAULT_PERIOD_START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# Local hours of the reduced (night) tariff, from 22:00 to 06:00
+NIGHT_HOURS = [22, 23, 0, 1, 2, 3, 4, 5]
+DAY_HOURS = list(range(6, 22))
+
+
+def subscriber_numbers(count):
+    """
+    Return `count` distinct phone numbers in the AAXXXXXXXXX format.
+    """
+    return [f"11{900000000 + index:09d}" for index in range(count)]
+
+
+def generate_call_records(
+    subscribers,
+    calls_per_subscriber,
+    period_start,
+    days=30,
+    mean_duration=180,
+    night_ratio=0.2,
+    outlier_ratio=0.0,
+    seed=0,
+):
+    """
+    Yield unsaved start and end `CallRecord` pairs of synthetic traffic.
+
+    Calls start on a random day of the `days` days from `period_start`, at
+    night with probability `night_ratio` and during the standard tariff
+    otherwise. Durations follow an exponential distribution around
+    `mean_duration` seconds, except for a `outlier_ratio` share of stuck
+    calls lasting from one to five days.
+    """
+    rng = random.Random(seed)
+    sources = subscriber_numbers(subscribers)
+
+    call_number = 0
+    for _ in range(calls_per_subscriber):
+        for source in sources:
+            hours = NIGHT_HOURS if rng.random() < night_ratio else DAY_HOURS
+            start_time = period_start + timedelta(
+                days=rng.randrange(days),
+                hours=rng.choice(hours),
+                seconds=rng.randrange(3600),
+            )
+
+            if rng.random() < outlier_ratio:
+                duration = rng.randrange(24 * 3600, 5 * 24 * 3600)
+            else:
+                duration = max(int(rng.expovariate(1 / mean_duration)), 1)
+
+            call_id = f"bench-{call_number}"
+            call_number += 1
+
+            yield CallRecord(
+                call_id=call_id,
+                type="start",
+                timestamp=start_time,
+                source=source,
+                destination=rng.choice(sources),
+            )
+            yield CallRecord(
+                call_id=call_id,
+                type="end",
+                timestamp=start_time + timedelta(seconds=duration),
+            )
@@ -0,0 +1,70 @@
+import time
+import statistics
+from datetime import timedelta
+
+from django.db import connection
+
+from billing.models import CallRecord
+from billing.reaper import unmatched_records
+
+
+# Single-column indexes CallRecord had before the billing-specific ones
+LEGACY_INDEXES = {
+    "bench_legacy_call_id_idx": "call_id",
+    "bench_legacy_type_idx": "type",
+    "bench_legacy_timestamp_idx": "timestamp",
+}
+
+
+def billing_queries(period_start, call_ids):
+    """
+    Return the call record queries the billing code runs, by name.
+    """
+    return {
+        # Pairing an ingested batch with the other halves of its calls
+        "pair_lookup": CallRecord.objects.filter(call_id__in=call_ids),
+        # The end records of the calls rerated with a new tariff
+        "rerate_end_records": CallRecord.objects.filter(call_id__in=call_ids, type="end"),
+        # The records the reaper quarantines for a cutoff
+        "unmatched_records": unmatched_records(period_start + timedelta(days=7)).order_by("timestamp", "id"),
+    }
+
+
+def measure_query(queryset, repeat):
+    """
+    Return the query plan and the timings, in milliseconds, of running the
+    query `repeat` times.
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        list(queryset.all())
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    return {
+        "plan": queryset.explain(),
+        "min_ms": min(timings),
+        "median_ms": statistics.median(timings),
+    }
+
+
+def analyze_call_records():
+    """
+    Refresh the planner statistics of the call record table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {CallRecord._meta.db_table}")
+
+
+def use_legacy_indexes():
+    """
+    Replace the call record indexes with the legacy single-column ones.
+    Run inside a transaction that is rolled back to restore the schema.
+    """
+    table = CallRecord._meta.db_table
+    with connection.cursor() as cursor:
+        for index in CallRecord._meta.indexes:
+            cursor.execute(f"DROP INDEX {index.name}")
+        for name, column in LEGACY_INDEXES.items():
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({column})")
+    analyze_call_records()
@@ -0,0 +1,70 @@
+import json
+import time
+import statistics
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def call_record_payloads(records, prefix):
+    """
+    Return generated call records as POST bodies, with call ids made
+    unique by `prefix` so repeated runs do not collide.
+    """
+    payloads = []
+    for record in records:
+        payload = {
+            "call_id": f"{prefix}-{record.call_id}",
+            "type": record.type,
+            "timestamp": record.timestamp.isoformat(),
+        }
+        if record.type == "start":
+            payload["source"] = record.source
+            payload["destination"] = record.destination
+        payloads.append(json.dumps(payload).encode())
+    return payloads
+
+
+def post_payloads(url, token, payloads, concurrency):
+    """
+    POST every payload to `url` from `concurrency` threads. Returns the
+    latency in seconds of each request, the number of failed requests and
+    the wall time of the run.
+    """
+    def post(payload):
+        request = urllib.request.Request(url, data=payload, method="POST", headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        })
+        started_at = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                failed = response.status >= 400
+        except urllib.error.HTTPError:
+            failed = True
+        return time.perf_counter() - started_at, failed
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(post, payloads))
+    elapsed = time.perf_counter() - started_at
+
+    return [latency for latency, _ in results], sum(failed for _, failed in results), elapsed
+
+
+def latency_summary(latencies, elapsed):
+    """
+    Summarize request latencies as throughput and percentiles in
+    milliseconds.
+    """
+    milliseconds = sorted(latency * 1000 for latency in latencies)
+    quantiles = statistics.quantiles(milliseconds, n=100, method="inclusive")
+    return {
+        "requests_per_second": len(milliseconds) / elapsed,
+        "mean_ms": statistics.fmean(milliseconds),
+        "p50_ms": quantiles[49],
+        "p95_ms": quantiles[94],
+        "p99_ms": quantiles[98],
+        "max_ms": milliseconds[-1],
+    }
@@ -0,0 +1,190 @@
+import json
+import time
+import statistics
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from billing.cache import get_bill_cache
+from billing.models import CallRecord
+from billing.pairing import complete_calls
+from billing.utils import calculate_call_price, calculate_call_prices, clear_price_cache
+from billing.views import CallRecordView, PhoneBillView
+
+
+SEED_BATCH_SIZE = 10_000
+
+# Cache alias the bills of a benchmark are stored in
+BENCHMARK_CACHE_ALIAS = "benchmark-bills"
+
+
+class Rollback(Exception):
+    """
+    Raised to roll back the transaction holding a benchmark workload.
+    """
+
+
+def isolated_bill_cache():
+    """
+    Return a context in which bills are cached in a cache of their own, so
+    a benchmark neither serves nor clears or invalidates the bills cached
+    for the API.
+    """
+    return override_settings(
+        CACHES={
+            **settings.CACHES,
+            BENCHMARK_CACHE_ALIAS: {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": BENCHMARK_CACHE_ALIAS,
+            },
+        },
+        BILL_CACHE_ALIAS=BENCHMARK_CACHE_ALIAS,
+    )
+
+
+def seed_call_records(records):
+    """
+    Store generated call records and their completed calls in batches.
+    Returns the number of records stored.
+    """
+    seeded = 0
+    while batch := list(islice(records, SEED_BATCH_SIZE)):
+        complete_calls(CallRecord.objects.bulk_create(batch))
+        seeded += len(batch)
+    return seeded
+
+
+def bench_calculate_call_price(intervals, repeat):
+    """
+    Time `calculate_call_price` over a list of (start, end) intervals.
+
+    Each repeat starts from an empty price memoization, so the cold pass
+    measures the pricing, and then prices the intervals again to measure
+    the memoized lookups separately.
+    """
+    cold_timings, warm_timings = [], []
+    for _ in range(repeat):
+        clear_price_cache()
+        for timings in (cold_timings, warm_timings):
+            started_at = time.perf_counter()
+            for start_time, end_time in intervals:
+                calculate_call_price(start_time, end_time)
+            timings.append(time.perf_counter() - started_at)
+
+    return {
+        "calls_per_second": len(intervals) / min(cold_timings),
+        "cached_calls_per_second": len(intervals) / min(warm_timings),
+    }
+
+
+def bench_calculate_call_prices(intervals, repeat):
+    """
+    Time `calculate_call_prices` pricing a list of (start, end) intervals
+    in one call.
+    """
+    start_times = [start_time for start_time, _ in intervals]
+    end_times = [end_time for _, end_time in intervals]
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        calculate_call_prices(start_times, end_times)
+        timings.append(time.perf_counter() - started_at)
+
+    best = min(timings)
+    return {"calls_per_second": len(intervals) / best}
+
+
+def bench_phone_bill_view(phone_number, period, repeat):
+    """
+    Time uncached `PhoneBillView.get` requests and count their queries.
+    """
+    factory = APIRequestFactory()
+    user = User(username="benchmark")
+    view = PhoneBillView.as_view()
+
+    timings = []
+    with isolated_bill_cache():
+        for _ in range(repeat):
+            get_bill_cache().clear()
+            request = factory.get("/api/phone-bills/", {"phone_number": phone_number, "period": period})
+            force_authenticate(request, user=user)
+
+            with CaptureQueriesContext(connection) as queries:
+                started_at = time.perf_counter()
+                response = view(request)
+                response.render()
+                timings.append((time.perf_counter() - started_at) * 1000)
+
+    return {
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "queries": len(queries),
+        "call_records": len(response.data["call_records"]),
+    }
+
+
+def bench_call_record_post(records):
+    """
+    Time one `CallRecordView.post` request per call record.
+    """
+    factory = APIRequestFactory()
+    user = User(username="benchmark")
+    view = CallRecordView.as_view()
+
+    started_at = time.perf_counter()
+    for record in records:
+        request = factory.post("/api/call-records/", {
+            "call_id": record.call_id,
+            "type": record.type,
+            "timestamp": record.timestamp.isoformat(),
+            "source": record.source,
+            "destination": record.destination,
+        }, format="json")
+        force_authenticate(request, user=user)
+        view(request)
+    elapsed = time.perf_counter() - started_at
+
+    return {"records_per_second": len(records) / elapsed}
+
+
+def flatten_results(results):
+    """
+    Flatten {"section": {"metric": value}} results into "section.metric" keys.
+    """
+    return {
+        f"{section}.{metric}": value
+        for section, metrics in results.items()
+        for metric, value in metrics.items()
+    }
+
+
+def compare_to_baseline(metrics, baseline, tolerance):
+    """
+    Return the regressions of `metrics` against `baseline` as
+    (metric, baseline value, value) tuples.
+
+    Throughputs (`*_per_second`) regress when they drop by more than
+    `tolerance`; timings and query counts when they grow by more than it.
+    Counts that only describe the workload are not compared.
+    """
+    regressions = []
+    for metric, value in metrics.items():
+        if metric not in baseline or metric.endswith(".call_records"):
+            continue
+        expected = baseline[metric]
+        if metric.endswith("_per_second"):
+            regressed = value < expected * (1 - tolerance)
+        else:
+            regressed = value > expected * (1 + tolerance)
+        if regressed:
+            regressions.append((metric, expected, value))
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)["metrics"]
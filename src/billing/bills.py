@@ -0,0 +1,398 @@
+import os
+from typing import NamedTuple
+from decimal import Decimal
+from bisect import bisect_right
+from itertools import groupby, islice
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils.timezone import make_aware, get_current_timezone, now
+
+from .archive import (
+    ARCHIVE_FIELDS,
+    ArchiveError,
+    archive_path,
+    call_columns,
+    is_archived,
+    open_archived_period,
+    verify_archive,
+    write_archive,
+)
+from .cache import invalidate_bills
+from .models import CallRecord, CompletedCall, PhoneBill, CallDetail
+from .pairing import complete_calls, paired_calls, paired_calls_by_source
+from .routers import reading_from_primary, reading_from_replica
+from .totals import call_period_start, get_period_total
+
+
+def get_period_bounds(period_start):
+    """
+    Return the timezone-aware [start, end) datetimes of the monthly billing
+    period beginning on the `period_start` date.
+    """
+    current_tz = get_current_timezone()
+    start = make_aware(datetime.combine(period_start, datetime.min.time()), current_tz)
+    end = make_aware(datetime.combine(
+        (period_start + timedelta(days=31)).replace(day=1), datetime.min.time()
+    ), current_tz)
+    return start, end
+
+
+def is_period_closed(period_start):
+    """
+    A period is closed once its last instant is in the past.
+    """
+    return get_period_bounds(period_start)[1] <= now()
+
+
+INVALID_PERIOD_MESSAGE = "Invalid period format. Use YYYY-MM."
+
+
+def parse_period(period, default=None):
+    """
+    Return the first day of the billing period `period`, given in YYYY-MM
+    format. An empty period is the `default` date, or the previous month if
+    there is none. Raises ValidationError for other formats.
+    """
+    if not period:
+        if default is not None:
+            return default
+        today = datetime.today()
+        return (today.replace(day=1) - timedelta(days=1)).replace(day=1).date()
+    try:
+        return datetime.strptime(period, "%Y-%m").date()
+    except ValueError:
+        raise ValidationError(INVALID_PERIOD_MESSAGE)
+
+
+def bill_reads(period_start):
+    """
+    Route the reads of a bill or report up to the period beginning on the
+    `period_start` date to the read replica once that period is closed.
+    Open periods change with every call record, so they are read from the
+    primary, where callers see the records they just posted.
+    """
+    if is_period_closed(period_start):
+        return reading_from_replica()
+    return reading_from_primary()
+
+
+def period_total_data(phone_number, period_start):
+    """
+    Build the `PeriodTotalSerializer` input from the running totals of
+    `phone_number` for the period beginning on the `period_start` date.
+    """
+    period_total = get_period_total(phone_number, period_start)
+    return {
+        "phone_number": phone_number,
+        "period": period_start.strftime("%Y-%m"),
+        "call_count": period_total.call_count if period_total else 0,
+        "billable_minutes": period_total.billable_minutes if period_total else 0,
+        "total_price": f"R$ {period_total.total_price if period_total else Decimal('0.00'):.2f}",
+    }
+
+
+class BillCalls(NamedTuple):
+    """
+    The calls of a bill as a queryset of (id, destination, start_time,
+    duration, price) tuples ordered by (start_time, id), or a list of them
+    for archived periods, and the bill total when it is already known from
+    the archive, the materialized bill or the running totals.
+    """
+    rows: object
+    total_price: Decimal = None
+
+
+BILL_CALL_FIELDS = ["id", "destination", "start_time", "duration", "price"]
+
+
+def get_bill_calls(phone_number, period_start, running_total=True):
+    """
+    Return the `BillCalls` of `phone_number` for the period beginning on the
+    `period_start` date, read from the archive or the materialized bill of
+    closed periods. The total of other periods is read from the running
+    totals, unless `running_total` is false.
+    """
+    if is_period_closed(period_start):
+        if is_archived(period_start):
+            return BillCalls(*open_archived_period(archive_path(period_start)).bill_rows(phone_number))
+
+        phone_bill = PhoneBill.objects.filter(
+            phone_number=phone_number,
+            period_start=period_start,
+        ).first()
+        if phone_bill is not None:
+            rows = phone_bill.call_details.order_by("start_time", "id").values_list(*BILL_CALL_FIELDS)
+            return BillCalls(rows, phone_bill.total_price)
+
+    start, end = get_period_bounds(period_start)
+    rows = paired_calls(phone_number, start, end).values_list(*BILL_CALL_FIELDS)
+    if not running_total:
+        return BillCalls(rows)
+    period_total = get_period_total(phone_number, period_start)
+    return BillCalls(rows, period_total.total_price if period_total else None)
+
+
+# Phone numbers a batch of bills is fetched for at most, kept under the
+# 999 parameters SQLite allows in the `IN (...)` filters
+MAX_BATCH_PHONE_NUMBERS = 500
+
+
+def get_batch_bill_calls(phone_numbers, period_start):
+    """
+    Return the call rows, in the format of `BillCalls`, and the total price
+    of the bill of each of `phone_numbers` for the period beginning on the
+    `period_start` date, as a dict of (rows, total_price) by number.
+
+    The bills of the whole set are read from the archive of archived
+    periods, or in at most three queries, from the materialized bills of
+    closed periods and from the completed calls of the numbers without one.
+    """
+    if is_period_closed(period_start) and is_archived(period_start):
+        archived = open_archived_period(archive_path(period_start))
+        return {phone_number: archived.bill_rows(phone_number) for phone_number in phone_numbers}
+
+    bills = {phone_number: ([], Decimal("0.00")) for phone_number in phone_numbers}
+    live_numbers = set(bills)
+
+    if is_period_closed(period_start):
+        phone_bills = PhoneBill.objects.filter(phone_number__in=live_numbers, period_start=period_start)
+        for phone_number, total_price in phone_bills.values_list("phone_number", "total_price"):
+            bills[phone_number] = ([], total_price)
+            live_numbers.discard(phone_number)
+
+        closed_numbers = bills.keys() - live_numbers
+        if closed_numbers:
+            details = CallDetail.objects.filter(
+                phone_bill__phone_number__in=closed_numbers,
+                phone_bill__period_start=period_start,
+            ).order_by("start_time", "id").values_list("phone_bill__phone_number", *BILL_CALL_FIELDS)
+            for phone_number, *row in details:
+                bills[phone_number][0].append(row)
+
+    if live_numbers:
+        start, end = get_period_bounds(period_start)
+        calls = paired_calls_by_source(start, end).filter(source__in=live_numbers)
+        for phone_number, *row in calls.values_list("source", *BILL_CALL_FIELDS):
+            rows, total_price = bills[phone_number]
+            rows.append(row)
+            bills[phone_number] = (rows, total_price + row[-1])
+
+    return bills
+
+
+# Periods a statement covers at most
+MAX_STATEMENT_PERIODS = 24
+
+
+def get_statement_calls(phone_number, first_period, last_period):
+    """
+    Return the call rows of `phone_number`, in the format of `BillCalls`,
+    for every period from the one beginning on the `first_period` date to
+    the one beginning on `last_period`, as (period_start, rows) pairs.
+
+    Archived periods are read from their archive, and the others in a
+    single range scan, where each call goes to the period of its end, like
+    in the bill of that period.
+    """
+    periods = {}
+    live_periods = []
+    period_start = first_period
+    while period_start <= last_period:
+        if is_period_closed(period_start) and is_archived(period_start):
+            periods[period_start], _ = open_archived_period(archive_path(period_start)).bill_rows(phone_number)
+        else:
+            periods[period_start] = []
+            live_periods.append(period_start)
+        period_start = (period_start + timedelta(days=31)).replace(day=1)
+
+    if live_periods:
+        start, _ = get_period_bounds(live_periods[0])
+        _, end = get_period_bounds(live_periods[-1])
+        calls = paired_calls(phone_number, start, end).values_list(*BILL_CALL_FIELDS, "end_time")
+        for *row, end_time in calls:
+            period_start = call_period_start(end_time)
+            if period_start in live_periods:
+                periods[period_start].append(row)
+    return list(periods.items())
+
+
+def rows_after(bill_calls, start_time, row_id):
+    """
+    Return the rows of `bill_calls` that come after the (start_time, id) key.
+    """
+    if isinstance(bill_calls.rows, list):
+        index = bisect_right(bill_calls.rows, (start_time, row_id), key=lambda row: (row[2], row[0]))
+        return bill_calls.rows[index:]
+    return bill_calls.rows.filter(
+        Q(start_time__gt=start_time) | Q(start_time=start_time, id__gt=row_id)
+    )
+
+
+def iterate_rows(bill_calls, chunk_size):
+    """
+    Iterate over the rows of `bill_calls`, fetching `chunk_size` rows at a
+    time from the database.
+    """
+    if isinstance(bill_calls.rows, list):
+        return iter(bill_calls.rows)
+    return bill_calls.rows.iterator(chunk_size=chunk_size)
+
+
+def bill_total_price(bill_calls):
+    """
+    Return the total price of `bill_calls`.
+    """
+    if bill_calls.total_price is not None:
+        return bill_calls.total_price
+    return bill_calls.rows.aggregate(total_price=Sum("price"))["total_price"] or Decimal("0.00")
+
+
+CLOSE_BATCH_SIZE = 5000
+
+
+def close_period(period_start, sources=None):
+    """
+    Materialize the `PhoneBill` and `CallDetail` rows of every subscriber,
+    or of the given `sources` only, for the period beginning on the
+    `period_start` date.
+
+    Bills are written in bulk, in batches of about `CLOSE_BATCH_SIZE` calls.
+    Bills already written for the period are replaced, so closing the same
+    period again is safe. Returns the number of bills written.
+    """
+    start, end = get_period_bounds(period_start)
+    period_end = end.date() - timedelta(days=1)
+
+    calls = paired_calls_by_source(start, end)
+    if sources is not None:
+        calls = calls.filter(source__in=sources)
+
+    bill_count = 0
+    bills = []
+    batch_calls = 0
+
+    for phone_number, subscriber_calls in groupby(calls.iterator(), key=lambda call: call.source):
+        subscriber_calls = list(subscriber_calls)
+        bills.append((phone_number, subscriber_calls))
+        batch_calls += len(subscriber_calls)
+
+        if batch_calls >= CLOSE_BATCH_SIZE:
+            bill_count += write_bills(period_start, period_end, bills)
+            bills = []
+            batch_calls = 0
+
+    if bills:
+        bill_count += write_bills(period_start, period_end, bills)
+    return bill_count
+
+
+def write_bills(period_start, period_end, bills):
+    """
+    Replace the bills of the period for a list of (phone_number, calls)
+    in a single transaction. Returns the number of bills written.
+    """
+    with transaction.atomic():
+        PhoneBill.objects.filter(
+            phone_number__in=[phone_number for phone_number, _ in bills],
+            period_start=period_start,
+        ).delete()
+
+        phone_bills = PhoneBill.objects.bulk_create([
+            PhoneBill(
+                phone_number=phone_number,
+                period_start=period_start,
+                period_end=period_end,
+                total_price=sum(call.price for call in calls),
+            )
+            for phone_number, calls in bills
+        ])
+
+        CallDetail.objects.bulk_create([
+            CallDetail(
+                phone_bill=phone_bill,
+                destination=call.destination,
+                start_time=call.start_time,
+                end_time=call.end_time,
+                duration=call.duration,
+                price=call.price,
+            )
+            for phone_bill, (_, calls) in zip(phone_bills, bills)
+            for call in calls
+        ], batch_size=CLOSE_BATCH_SIZE)
+
+    return len(phone_bills)
+
+
+RERATE_BATCH_SIZE = 5000
+
+
+def rerate_period(period_start):
+    """
+    Price the calls that ended in the period beginning on the
+    `period_start` date again, with the tariff versions published now.
+
+    Calls are paired again in batches of `RERATE_BATCH_SIZE`, which updates
+    their price, the running totals and the cached bills, and the bills of
+    the period are written again if it was closed. Returns the number of
+    calls priced.
+    """
+    start, end = get_period_bounds(period_start)
+    call_ids = iter(list(
+        CompletedCall.objects.filter(end_time__gte=start, end_time__lt=end)
+        .order_by("id").values_list("call_id", flat=True)
+    ))
+
+    call_count = 0
+    while batch := list(islice(call_ids, RERATE_BATCH_SIZE)):
+        records = list(CallRecord.objects.filter(call_id__in=batch, type="end"))
+        call_count += len(complete_calls(records))
+        invalidate_bills(records)
+
+    if PhoneBill.objects.filter(period_start=period_start).exists():
+        close_period(period_start)
+    return call_count
+
+
+# Archived calls deleted from the database per transaction
+ARCHIVE_DELETE_BATCH_SIZE = 1000
+
+
+def archive_period(period_start):
+    """
+    Move the completed calls that ended in the closed period beginning on
+    the `period_start` date to an archive on disk, then delete them, their
+    call records and the materialized bills of the period from the
+    database.
+
+    Nothing is deleted before the archive is written and verified. Running
+    it again after an interruption verifies the existing archive and
+    finishes the deletion. Returns the number of calls archived.
+    """
+    if not is_period_closed(period_start):
+        raise ArchiveError(f"Period {period_start:%Y-%m} is not closed yet.")
+
+    directory = archive_path(period_start)
+    if is_archived(period_start):
+        manifest = verify_archive(directory)
+    else:
+        start, end = get_period_bounds(period_start)
+        calls = CompletedCall.objects.filter(end_time__gte=start, end_time__lt=end).order_by("id")
+        columns = call_columns(calls.values_list(*ARCHIVE_FIELDS).iterator(chunk_size=CLOSE_BATCH_SIZE))
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        write_archive(directory, period_start, columns)
+        manifest = verify_archive(directory, columns)
+
+    archived = open_archived_period(directory)
+    ids = archived.columns["id"]
+    call_ids = archived.columns["call_id"]
+    for offset in range(0, len(ids), ARCHIVE_DELETE_BATCH_SIZE):
+        batch = slice(offset, offset + ARCHIVE_DELETE_BATCH_SIZE)
+        with transaction.atomic():
+            CallRecord.objects.filter(call_id__in=[call_id.decode() for call_id in call_ids[batch].tolist()]).delete()
+            CompletedCall.objects.filter(id__in=ids[batch].tolist()).delete()
+
+    PhoneBill.objects.filter(period_start=period_start).delete()
+    return manifest["rows"]
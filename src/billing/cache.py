@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.timezone import localtime
+
+from .models import CompletedCall
+from .routers import replica_alias
+
+
+# Cached in place of a bill changed by a write, for as long as the read
+# replica may lag behind the primary
+RECENTLY_WRITTEN = "recently-written"
+
+
+def get_bill_cache():
+    """
+    Return the cache backend storing serialized phone bills.
+    """
+    return caches[settings.BILL_CACHE_ALIAS]
+
+
+def bill_cache_key(phone_number, period_start):
+    return f"phone-bill:{phone_number}:{period_start:%Y-%m}"
+
+
+def get_cached_bill(phone_number, period_start):
+    """
+    Return the serialized bill of `phone_number` for the period beginning
+    on the `period_start` date, or None if it is not cached.
+    """
+    return get_bill_cache().get(bill_cache_key(phone_number, period_start))
+
+
+def cache_bill(phone_number, period_start, data):
+    get_bill_cache().set(bill_cache_key(phone_number, period_start), data)
+
+
+def invalidate_bills(records):
+    """
+    Drop the cached bills affected by newly saved call records.
+
+    A record only changes a bill once both halves of its call exist, so the
+    bill of the calling number for the period of the call end is invalidated
+    for every completed call among the records. With a read replica, the
+    bills are marked `RECENTLY_WRITTEN` until the replica has the write.
+    """
+    call_ids = {record.call_id for record in records}
+    if not call_ids:
+        return
+
+    keys = {
+        bill_cache_key(source, localtime(end_time))
+        for source, end_time in CompletedCall.objects.filter(
+            call_id__in=call_ids,
+        ).values_list("source", "end_time")
+    }
+    if replica_alias() is None:
+        get_bill_cache().delete_many(keys)
+    else:
+        get_bill_cache().set_many(dict.fromkeys(keys, RECENTLY_WRITTEN), settings.BILLING_REPLICA_LAG_SECONDS)
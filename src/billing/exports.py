@@ -0,0 +1,49 @@
+import csv
+
+from rest_framework.renderers import JSONRenderer
+
+from .bills import iterate_rows
+from .serializers import CallDetailSerializer, call_detail_representation
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """
+    File-like object that returns what is written, for `csv.writer`.
+    """
+    def write(self, value):
+        return value
+
+
+def stream_ndjson(bill_calls, phone_number, period_start):
+    """
+    Yield the call details of a bill as NDJSON lines followed by a summary
+    line with the bill total, without holding the call list in memory.
+    """
+    renderer = JSONRenderer()
+    total_price = 0
+
+    for row in iterate_rows(bill_calls, EXPORT_CHUNK_SIZE):
+        total_price += row[-1]
+        yield renderer.render(call_detail_representation(row)) + b"\n"
+
+    yield renderer.render({
+        "phone_number": phone_number,
+        "period": period_start.strftime("%Y-%m"),
+        "total_price": f"R$ {total_price:.2f}",
+    }) + b"\n"
+
+
+def stream_csv(bill_calls):
+    """
+    Yield the call details of a bill as CSV lines, header first.
+    """
+    writer = csv.writer(_Echo())
+    fields = list(CallDetailSerializer().fields)
+
+    yield writer.writerow(fields)
+    for row in iterate_rows(bill_calls, EXPORT_CHUNK_SIZE):
+        call_detail = call_detail_representation(row)
+        yield writer.writerow([call_detail[field] for field in fields])
@@ -0,0 +1,143 @@
+import io
+import csv
+import json
+
+from django.db import connection, transaction
+from django.core.exceptions import ValidationError
+
+from .models import CallRecord, phone_regex
+from .pairing import complete_calls
+from .partitions import skip_duplicate_records
+
+
+CDR_FIELDS = ["call_id", "type", "timestamp", "source", "destination"]
+
+
+def iter_cdr_file(path, file_format, offset=0, line_number=0):
+    """
+    Stream the records of a CSV or NDJSON CDR dump one line at a time.
+
+    Yields (line_number, next_offset, row) where `next_offset` is the byte
+    offset right after the line, so an import can resume from it. CSV files
+    must start with a header naming the `CDR_FIELDS` columns. Lines that
+    cannot be parsed are yielded with the parse error as `row`.
+    """
+    with open(path, "rb") as cdr_file:
+        header = None
+
+        if file_format == "csv":
+            header = next(csv.reader([cdr_file.readline().decode("utf-8")]))
+            line_number = max(line_number, 1)
+
+        if offset > cdr_file.tell():
+            cdr_file.seek(offset)
+
+        for line in iter(cdr_file.readline, b""):
+            line_number += 1
+            text = line.decode("utf-8").strip()
+            if not text:
+                continue
+
+            if file_format == "csv":
+                row = dict(zip(header, next(csv.reader([text]))))
+            else:
+                try:
+                    row = json.loads(text)
+                except ValueError as exc:
+                    row = exc
+            yield line_number, cdr_file.tell(), row
+
+
+def build_call_record(row):
+    """
+    Build a `CallRecord` from a parsed CDR row, applying the model
+    validation rules. Raises ValidationError for invalid rows.
+    """
+    if not isinstance(row, dict):
+        raise ValidationError(f"Invalid JSON: {row}")
+
+    record = CallRecord(**{field: row.get(field) or None for field in CDR_FIELDS})
+    record.full_clean(validate_unique=False)
+
+    for field in ("source", "destination"):
+        value = getattr(record, field)
+        if value is not None:
+            try:
+                phone_regex(value)
+            except ValidationError as exc:
+                raise ValidationError({field: exc.messages})
+    return record
+
+
+def existing_keys(records):
+    """
+    Return the (call_id, type) keys of `records` that are already stored.
+    """
+    return set(
+        CallRecord.objects.filter(
+            call_id__in={record.call_id for record in records},
+        ).values_list("call_id", "type")
+    )
+
+
+def _copy_records(cursor, records):
+    """
+    Load `records` into the call record table through PostgreSQL `COPY`,
+    staging them in a temporary table so duplicate keys are skipped.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow([
+            record.call_id,
+            record.type,
+            record.timestamp.isoformat(),
+            record.source,
+            record.destination,
+        ])
+    buffer.seek(0)
+
+    table = CallRecord._meta.db_table
+    columns = ", ".join(CDR_FIELDS)
+    copy_sql = f"COPY cdr_import ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE cdr_import ON COMMIT DROP AS "
+        f"SELECT {columns} FROM {table} WITH NO DATA"
+    )
+    if hasattr(cursor, "copy_expert"):
+        # psycopg2
+        cursor.copy_expert(copy_sql, buffer)
+    else:
+        # psycopg 3
+        with cursor.copy(copy_sql) as copy:
+            copy.write(buffer.read())
+    cursor.execute(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM cdr_import "
+        f"ON CONFLICT DO NOTHING"
+    )
+    written = cursor.rowcount
+    # ON COMMIT only drops the table when this is the outermost transaction
+    cursor.execute("DROP TABLE cdr_import")
+    return written
+
+
+def write_records(records, use_copy=None):
+    """
+    Insert a batch of validated records in a single transaction, pair them
+    into completed calls and return the number of rows written. PostgreSQL
+    uses `COPY` unless `use_copy` is False; other databases fall back to
+    `bulk_create`.
+    """
+    if use_copy is None:
+        use_copy = connection.vendor == "postgresql"
+
+    with transaction.atomic():
+        skip_duplicate_records()
+        if use_copy:
+            with connection.cursor() as cursor:
+                written = _copy_records(cursor, records)
+        else:
+            written = len(CallRecord.objects.bulk_create(records, ignore_conflicts=True))
+        complete_calls(records)
+    return written
@@ -0,0 +1,332 @@
+import os
+import json
+import fcntl
+import asyncio
+import contextvars
+import logging
+import threading
+from itertools import islice
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection
+
+from .cache import invalidate_bills
+from .importing import CDR_FIELDS, build_call_record, write_records
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying a batch the database rejected
+RETRY_DELAY = 1
+
+# File in the log directory collecting the rows of batches that could not be
+# written in `INGEST_MAX_ATTEMPTS` attempts
+DEAD_LETTER_FILE = "dead-letter.ndjson"
+
+
+class BufferFull(Exception):
+    """
+    Raised when the ingest buffer cannot take more records.
+    """
+
+
+class WriteAheadLog:
+    """
+    Append-only NDJSON file holding CDR rows accepted by an ingest buffer
+    until they are written to the database. A buffer logs to a sequence of
+    these segments and removes each one once its rows are written.
+
+    The file is locked for as long as it is open, so logs left behind by a
+    process that died are the ones no other process holds.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def append(self, rows):
+        """
+        Append `rows` and fsync the file, so they survive a crash once this
+        returns.
+        """
+        data = "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+        with self._lock:
+            os.write(self._fd, data)
+            os.fsync(self._fd)
+
+    def replay(self):
+        """
+        Yield the rows in the log, reading it line by line. A torn last line
+        left by a crash in the middle of a write is skipped, its rows were
+        never acknowledged.
+        """
+        with open(self.path, "rb") as log_file:
+            for line in log_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def remove(self):
+        with self._lock:
+            os.unlink(self.path)
+            os.close(self._fd)
+
+    def close(self):
+        with self._lock:
+            os.close(self._fd)
+
+
+def orphaned_logs(directory):
+    """
+    Return the write-ahead logs in `directory` that no running process holds.
+    """
+    logs = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".wal"):
+            try:
+                logs.append(WriteAheadLog(os.path.join(directory, name)))
+            except OSError:
+                continue
+    return logs
+
+
+def dead_letter(directory, rows):
+    """
+    Append `rows` to the dead-letter file of `directory` and fsync it.
+    """
+    data = "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+    fd = os.open(os.path.join(directory, DEAD_LETTER_FILE), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def take(rows, count):
+    return list(islice(rows, count))
+
+
+def record_row(record):
+    """
+    Return a validated `CallRecord` as a JSON-serializable CDR row.
+    """
+    row = {field: getattr(record, field) for field in CDR_FIELDS}
+    row["timestamp"] = record.timestamp.isoformat()
+    return row
+
+
+def validate_rows(rows):
+    """
+    Build the call records of `rows`. Returns the records and the errors of
+    each row, aligned with the input.
+    """
+    records = []
+    errors = []
+    for row in rows:
+        try:
+            records.append(build_call_record(row))
+        except ValidationError as exc:
+            errors.append(exc.message_dict if hasattr(exc, "error_dict") else {"non_field_errors": exc.messages})
+        else:
+            errors.append({})
+    return records, errors
+
+
+def write_batch(records):
+    """
+    Write a batch of buffered records. Records that already exist are
+    skipped, so replaying the log after a crash is safe.
+    """
+    if not connection.in_atomic_block:
+        # Drop a connection the database closed while the buffer was idle
+        close_old_connections()
+    written = write_records(records)
+    invalidate_bills(records)
+    return written
+
+
+class IngestBuffer:
+    """
+    Bounded in-memory queue of call records drained into the database by a
+    background task running on the event loop that created the buffer.
+
+    Records are logged to the current write-ahead log segment before they
+    are queued. The drainer starts a new segment whenever it takes a batch
+    holding records of the current one, and removes a segment once all of
+    its records are in the database, so the logs only hold the records that
+    are still queued. Capacity is reserved before logging, so a full buffer
+    rejects new records instead of growing.
+
+    A batch the database rejects `max_attempts` times is moved to the
+    dead-letter file, so it does not hold its share of the capacity forever.
+    """
+    def __init__(self, wal_dir, capacity, batch_size, max_attempts):
+        self.wal_dir = wal_dir
+        self.wal = None
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.queue = asyncio.Queue(maxsize=capacity)
+        self.loop = asyncio.get_running_loop()
+        self.pending = 0
+        # Records logged to each open segment and not yet written
+        self.unwritten = {}
+        self._log_prefix = f"ingest-{os.getpid()}-{uuid4().hex[:8]}"
+        self._segments = 0
+        self._started = None
+        self._drainer = None
+
+    async def start(self):
+        """
+        Replay the records left in the logs of dead processes, open the log
+        of this buffer and start the drainer. Safe to await from concurrent
+        requests.
+        """
+        if self._started is None:
+            self._started = self._create_task(self._start())
+        try:
+            await asyncio.shield(self._started)
+        except Exception:
+            self._started = None
+            raise
+
+    async def _start(self):
+        os.makedirs(self.wal_dir, exist_ok=True)
+        for log in await sync_to_async(orphaned_logs, thread_sensitive=False)(self.wal_dir):
+            rows = log.replay()
+            while chunk := await sync_to_async(take, thread_sensitive=False)(rows, self.batch_size):
+                records, _ = validate_rows(chunk)
+                await self._write(records)
+            await sync_to_async(log.remove, thread_sensitive=False)()
+
+        await self._rotate()
+        self._drainer = self._create_task(self._drain())
+
+    def _create_task(self, coro):
+        # Run outside of the context of the request that started the buffer,
+        # so its writes are not attributed to that request
+        return contextvars.Context().run(self.loop.create_task, coro)
+
+    async def _rotate(self):
+        """
+        Log the records put from now on to a new segment.
+        """
+        self._segments += 1
+        path = os.path.join(self.wal_dir, f"{self._log_prefix}-{self._segments:08d}.wal")
+        self.wal = await sync_to_async(WriteAheadLog, thread_sensitive=False)(path)
+        self.unwritten[self.wal] = 0
+
+    async def put(self, records):
+        """
+        Durably log `records` and queue them for writing. Raises BufferFull
+        when the queue has no room for all of them.
+        """
+        if self.pending + len(records) > self.queue.maxsize:
+            raise BufferFull()
+
+        wal = self.wal
+        self.pending += len(records)
+        self.unwritten[wal] += len(records)
+        try:
+            await sync_to_async(wal.append, thread_sensitive=False)(
+                [record_row(record) for record in records]
+            )
+        except BaseException:
+            self.pending -= len(records)
+            self.unwritten[wal] -= len(records)
+            raise
+
+        for record in records:
+            self.queue.put_nowait((wal, record))
+
+    async def join(self):
+        """
+        Wait until every queued record is in the database.
+        """
+        await self.queue.join()
+
+    async def _write(self, records):
+        """
+        Write a batch, retrying failures up to `max_attempts` times before
+        moving its rows to the dead-letter file.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await sync_to_async(write_batch)(records)
+                return
+            except Exception:
+                logger.exception(
+                    "Failed to write %d buffered call records (attempt %d of %d)",
+                    len(records), attempt, self.max_attempts,
+                )
+            if attempt < self.max_attempts:
+                await asyncio.sleep(RETRY_DELAY)
+
+        await sync_to_async(dead_letter, thread_sensitive=False)(
+            self.wal_dir, [record_row(record) for record in records]
+        )
+        logger.error("Moved %d buffered call records to %s", len(records), DEAD_LETTER_FILE)
+
+    async def _drain(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            segments = {wal for wal, _ in batch}
+            if self.wal in segments:
+                await self._rotate()
+
+            await self._write([record for _, record in batch])
+
+            self.pending -= len(batch)
+            for wal, _ in batch:
+                self.unwritten[wal] -= 1
+            for wal in segments:
+                # Records reserve their segment before they are logged, so
+                # a segment no longer logged to is done once none are left
+                if wal is not self.wal and self.unwritten[wal] == 0:
+                    del self.unwritten[wal]
+                    await sync_to_async(wal.remove, thread_sensitive=False)()
+            for _ in batch:
+                self.queue.task_done()
+
+    def close(self):
+        """
+        Close the open log segments, leaving them to be replayed.
+        """
+        for wal in self.unwritten:
+            wal.close()
+        self.unwritten = {}
+
+
+_buffer = None
+
+
+async def get_ingest_buffer():
+    """
+    Return the started ingest buffer of the running event loop.
+    """
+    global _buffer
+    if _buffer is None or _buffer.loop is not asyncio.get_running_loop():
+        if _buffer is not None:
+            # The loop of the previous buffer is gone, so its unwritten
+            # records are replayed from its logs by the new buffer
+            _buffer.close()
+        _buffer = IngestBuffer(
+            settings.INGEST_WAL_DIR,
+            capacity=settings.INGEST_QUEUE_SIZE,
+            batch_size=settings.INGEST_BATCH_SIZE,
+            max_attempts=settings.INGEST_MAX_ATTEMPTS,
+        )
+    await _buffer.start()
+    return _buffer
@@ -0,0 +1,137 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# Upper bounds, in milliseconds, of the request latency histogram buckets
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+SECTIONS = ["db", "pricing", "serialization"]
+
+_request_metrics = ContextVar("billing_request_metrics", default=None)
+
+
+class RequestMetrics:
+    """
+    Query count and time spent per section while serving one request.
+    """
+    __slots__ = ("queries", "timings")
+
+    def __init__(self):
+        self.queries = 0
+        self.timings = dict.fromkeys(SECTIONS, 0.0)
+
+
+@contextmanager
+def collect_request_metrics():
+    """
+    Collect the metrics of the code run inside the block.
+    """
+    metrics = RequestMetrics()
+    token = _request_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _request_metrics.reset(token)
+
+
+@contextmanager
+def timed(section):
+    """
+    Add the time spent inside the block to `section` of the current
+    request metrics. Does nothing outside of an instrumented request.
+    """
+    metrics = _request_metrics.get()
+    if metrics is None:
+        yield
+        return
+
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[section] += time.perf_counter() - started_at
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting queries and their time.
+    """
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.timings["db"] += time.perf_counter() - started_at
+
+
+class MetricsRegistry:
+    """
+    Per-view aggregates of request metrics, kept for the process lifetime.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, duration, metrics):
+        bucket = bisect_left(LATENCY_BUCKETS_MS, duration * 1000)
+        with self._lock:
+            aggregate = self._views.get(view)
+            if aggregate is None:
+                aggregate = self._views[view] = {
+                    "requests": 0,
+                    "queries": 0,
+                    "seconds": dict.fromkeys(["total", *SECTIONS], 0.0),
+                    "latency_buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            aggregate["requests"] += 1
+            aggregate["queries"] += metrics.queries
+            aggregate["seconds"]["total"] += duration
+            for section, elapsed in metrics.timings.items():
+                aggregate["seconds"][section] += elapsed
+            aggregate["latency_buckets"][bucket] += 1
+
+    def snapshot(self):
+        """
+        Return the aggregates with cumulative latency histograms, keyed by
+        bucket upper bound in milliseconds.
+        """
+        with self._lock:
+            views = {
+                view: {**aggregate, "seconds": dict(aggregate["seconds"])}
+                for view, aggregate in self._views.items()
+            }
+            for aggregate in views.values():
+                histogram = {}
+                count = 0
+                for bound, bucket_count in zip([*LATENCY_BUCKETS_MS, "+Inf"], aggregate.pop("latency_buckets")):
+                    count += bucket_count
+                    histogram[str(bound)] = count
+                aggregate["latency_histogram_ms"] = histogram
+        return views
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(duration, metrics):
+    """
+    Format request metrics as a Server-Timing header value.
+    """
+    timings = [f'db;dur={metrics.timings["db"] * 1000:.2f};desc="{metrics.queries} queries"']
+    timings += [
+        f"{section};dur={metrics.timings[section] * 1000:.2f}"
+        for section in SECTIONS[1:]
+    ]
+    timings.append(f"total;dur={duration * 1000:.2f}")
+    return ", ".join(timings)
@@ -0,0 +1,34 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.archive import ArchiveError, archive_path
+from billing.bills import archive_period, parse_period
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the completed calls of a closed billing period to a columnar archive on disk "
+        "and delete them from the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            required=True,
+            help="Billing period in YYYY-MM format.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            period_start = parse_period(options["period"])
+        except ValidationError as error:
+            raise CommandError(error.message)
+
+        try:
+            call_count = archive_period(period_start)
+        except ArchiveError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived period {period_start:%Y-%m}: {call_count} calls written to {archive_path(period_start)}."
+        ))
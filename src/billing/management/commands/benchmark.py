@@ -0,0 +1,123 @@
+import json
+import platform
+from itertools import islice
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.benchmarks.generator import DEFAULT_PERIOD_START, generate_call_records, subscriber_numbers
+from billing.benchmarks.suite import (
+    Rollback,
+    bench_calculate_call_price,
+    bench_calculate_call_prices,
+    bench_call_record_post,
+    bench_phone_bill_view,
+    compare_to_baseline,
+    flatten_results,
+    isolated_bill_cache,
+    load_baseline,
+    seed_call_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the billing hot paths on a synthetic workload and compare the "
+        "results to a stored baseline. The workload is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=1000)
+        parser.add_argument("--calls-per-subscriber", type=int, default=100)
+        parser.add_argument("--mean-duration", type=int, default=180, help="Mean call duration in seconds.")
+        parser.add_argument("--night-ratio", type=float, default=0.2, help="Share of calls started at night.")
+        parser.add_argument("--outlier-ratio", type=float, default=0.001, help="Share of multi-day calls.")
+        parser.add_argument("--posts", type=int, default=500, help="Call records posted one at a time.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument("--baseline", help="Results file to compare against.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Relative change from the baseline reported as a regression.",
+        )
+
+    def handle(self, *args, **options):
+        if options["subscribers"] < 1 or options["calls_per_subscriber"] < 1:
+            raise CommandError("Generate at least one call and one subscriber.")
+
+        config = {
+            key: options[key]
+            for key in (
+                "subscribers", "calls_per_subscriber", "mean_duration", "night_ratio",
+                "outlier_ratio", "posts", "repeat", "seed",
+            )
+        }
+        workload = {
+            "subscribers": options["subscribers"],
+            "calls_per_subscriber": options["calls_per_subscriber"],
+            "period_start": DEFAULT_PERIOD_START,
+            "mean_duration": options["mean_duration"],
+            "night_ratio": options["night_ratio"],
+            "outlier_ratio": options["outlier_ratio"],
+        }
+
+        # Posted records invalidate the bills of their numbers
+        try:
+            with isolated_bill_cache(), transaction.atomic():
+                results = self.run(workload, options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+        metrics = flatten_results(results)
+        for metric, value in metrics.items():
+            self.stdout.write(f"{metric}: {value:.2f}")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({
+                    "config": config,
+                    "environment": {
+                        "python": platform.python_version(),
+                        "database": connection.vendor,
+                    },
+                    "metrics": metrics,
+                }, output, indent=2)
+
+        if options["baseline"]:
+            regressions = compare_to_baseline(
+                metrics, load_baseline(options["baseline"]), options["tolerance"]
+            )
+            for metric, expected, value in regressions:
+                self.stderr.write(f"Regression in {metric}: {expected:.2f} -> {value:.2f}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} metrics regressed against the baseline.")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def run(self, workload, options):
+        seeded = seed_call_records(generate_call_records(seed=options["seed"], **workload))
+        self.stdout.write(f"Seeded {seeded} call records.")
+
+        intervals = []
+        records = generate_call_records(seed=options["seed"], **workload)
+        for start_record, end_record in islice(zip(records, records), 10_000):
+            intervals.append((start_record.timestamp, end_record.timestamp))
+
+        # Posted records use call ids of their own so they do not collide
+        posted = list(islice(generate_call_records(seed=options["seed"] + 1, **workload), options["posts"]))
+        for record in posted:
+            record.call_id = f"post-{record.call_id}"
+
+        return {
+            "calculate_call_price": bench_calculate_call_price(intervals, options["repeat"]),
+            "calculate_call_prices": bench_calculate_call_prices(intervals, options["repeat"]),
+            "phone_bill_view": bench_phone_bill_view(
+                subscriber_numbers(1)[0],
+                DEFAULT_PERIOD_START.strftime("%Y-%m"),
+                options["repeat"],
+            ),
+            "call_record_post": bench_call_record_post(posted),
+        }
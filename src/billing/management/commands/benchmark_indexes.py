@@ -0,0 +1,73 @@
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.benchmarks.generator import DEFAULT_PERIOD_START, generate_call_records
+from billing.benchmarks.indexes import analyze_call_records, billing_queries, measure_query, use_legacy_indexes
+from billing.benchmarks.suite import Rollback
+from billing.models import CallRecord
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic call records and report the query plans and timings of the "
+        "billing queries. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2_000_000, help="Number of call records to seed.")
+        parser.add_argument("--subscribers", type=int, default=10_000, help="Number of calling numbers.")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query.")
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help="Also measure the queries with the legacy single-column indexes.",
+        )
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        if options["rows"] < 2 or options["subscribers"] < 1:
+            raise CommandError("Seed at least one call and one subscriber.")
+
+        self.results = {}
+        try:
+            with transaction.atomic():
+                self.seed(options["rows"], options["subscribers"])
+                self.run("current", options)
+                if options["compare"]:
+                    use_legacy_indexes()
+                    self.run("legacy", options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(self.results, output, indent=2)
+
+    def seed(self, rows, subscribers):
+        calls_per_subscriber = max(rows // 2 // subscribers, 1)
+        records = generate_call_records(subscribers, calls_per_subscriber, DEFAULT_PERIOD_START)
+
+        seeded = 0
+        while batch := list(islice(records, 10_000)):
+            CallRecord.objects.bulk_create(batch)
+            seeded += len(batch)
+        analyze_call_records()
+        self.stdout.write(f"Seeded {seeded} call records.")
+
+    def run(self, indexes, options):
+        queries = billing_queries(
+            DEFAULT_PERIOD_START,
+            [f"bench-{call_number}" for call_number in range(0, 100_000, 1000)],
+        )
+
+        self.results[indexes] = {}
+        for name, queryset in queries.items():
+            result = measure_query(queryset, options["repeat"])
+            self.results[indexes][name] = result
+            self.stdout.write(self.style.MIGRATE_HEADING(f"[{indexes}] {name}"))
+            self.stdout.write(result["plan"])
+            self.stdout.write(f"min {result['min_ms']:.2f} ms, median {result['median_ms']:.2f} ms\n")
@@ -0,0 +1,12 @@
+from billing.management.commands.run_billing import Command as RunBillingCommand
+
+
+class Command(RunBillingCommand):
+    help = (
+        "Write the phone bills of every subscriber for a closed billing period in "
+        "this process. The same as run_billing --workers 1."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(workers=1)
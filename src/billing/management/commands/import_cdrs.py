@@ -0,0 +1,123 @@
+import os
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.exceptions import ValidationError
+
+from billing.cache import invalidate_bills
+from billing.importing import build_call_record, existing_keys, iter_cdr_file, write_records
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or NDJSON dump of call detail records into the call records table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file to import.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="File format. Defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of records inserted per transaction.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File storing the offset of the last committed batch, used to resume the import.",
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Insert with bulk_create even on PostgreSQL instead of COPY.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if file_format not in ("csv", "ndjson"):
+            raise CommandError("Unknown file format. Use --format csv or --format ndjson.")
+        if options["batch_size"] < 1:
+            raise CommandError("The batch size must be positive.")
+
+        self.checkpoint_path = options["checkpoint"]
+        self.use_copy = False if options["no_copy"] else None
+        checkpoint = self.read_checkpoint(path)
+
+        self.inserted = 0
+        self.rejected = 0
+        started_at = time.monotonic()
+
+        batch = []
+        batch_keys = set()
+        offset, line_number = checkpoint["offset"], checkpoint["line"]
+
+        for line_number, next_offset, row in iter_cdr_file(path, file_format, offset, line_number):
+            try:
+                record = build_call_record(row)
+            except ValidationError as exc:
+                self.reject(line_number, exc.messages)
+            else:
+                key = (record.call_id, record.type)
+                if key in batch_keys:
+                    self.reject(line_number, ["Duplicate call_id and type."])
+                else:
+                    batch.append((line_number, record))
+                    batch_keys.add(key)
+
+            if len(batch) >= options["batch_size"]:
+                self.flush(batch, path, next_offset, line_number)
+                batch, batch_keys = [], set()
+            offset = next_offset
+
+        self.flush(batch, path, offset, line_number)
+
+        elapsed = time.monotonic() - started_at
+        throughput = (self.inserted + self.rejected) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.inserted} records, rejected {self.rejected} lines "
+            f"in {elapsed:.1f}s ({throughput:.0f} lines/s)."
+        ))
+
+    def reject(self, line_number, messages):
+        self.rejected += 1
+        self.stderr.write(f"Line {line_number}: {' '.join(messages)}")
+
+    def flush(self, batch, path, offset, line_number):
+        """
+        Write a batch, skipping records already stored, then save the checkpoint.
+        """
+        if batch:
+            stored_keys = existing_keys([record for _, record in batch])
+            records = []
+            for record_line, record in batch:
+                if (record.call_id, record.type) in stored_keys:
+                    self.reject(record_line, ["Duplicate call_id and type."])
+                else:
+                    records.append(record)
+            if records:
+                self.inserted += write_records(records, use_copy=self.use_copy)
+                invalidate_bills(records)
+        self.write_checkpoint(path, offset, line_number)
+
+    def read_checkpoint(self, path):
+        checkpoint = {"path": os.path.abspath(path), "offset": 0, "line": 0}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as checkpoint_file:
+                saved = json.load(checkpoint_file)
+            if saved.get("path") != checkpoint["path"]:
+                raise CommandError(f"Checkpoint {self.checkpoint_path} belongs to another file.")
+            checkpoint.update(saved)
+            self.stdout.write(f"Resuming from line {checkpoint['line']}.")
+        return checkpoint
+
+    def write_checkpoint(self, path, offset, line_number):
+        if not self.checkpoint_path:
+            return
+        temporary_path = f"{self.checkpoint_path}.tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            json.dump({"path": os.path.abspath(path), "offset": offset, "line": line_number}, checkpoint_file)
+        os.replace(temporary_path, self.checkpoint_path)
@@ -0,0 +1,65 @@
+import json
+import uuid
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from billing.benchmarks.generator import DEFAULT_PERIOD_START, generate_call_records
+from billing.benchmarks.load import call_record_payloads, latency_summary, post_payloads
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running server by posting call records concurrently, and "
+        "report the request latencies. Run it once per database connection "
+        "setting to compare them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://localhost:8000/api/call-records/",
+            help="Call record endpoint of the server under test.",
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--username", default="loadtest", help="User the requests authenticate as.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2 or options["concurrency"] < 1:
+            raise CommandError("Send at least two requests from at least one thread.")
+
+        user, _ = User.objects.get_or_create(username=options["username"])
+        token = str(RefreshToken.for_user(user).access_token)
+
+        records = generate_call_records(
+            subscribers=100,
+            calls_per_subscriber=options["requests"],
+            period_start=DEFAULT_PERIOD_START,
+            seed=options["seed"],
+        )
+        payloads = call_record_payloads(islice(records, options["requests"]), uuid.uuid4().hex[:8])
+
+        latencies, failures, elapsed = post_payloads(
+            options["url"], token, payloads, options["concurrency"]
+        )
+        summary = latency_summary(latencies, elapsed)
+        for metric, value in summary.items():
+            self.stdout.write(f"{metric}: {value:.2f}")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({
+                    "config": {
+                        key: options[key] for key in ("url", "requests", "concurrency", "seed")
+                    },
+                    "failures": failures,
+                    "metrics": summary,
+                }, output, indent=2)
+
+        if failures:
+            raise CommandError(f"{failures} of {len(payloads)} requests failed.")
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import localdate
+
+from billing.partitions import (
+    PARTITIONS_AHEAD,
+    create_partitions,
+    detach_partitions,
+    is_partitioned,
+    partition_months,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly call record partitions of the coming months, "
+        "and detach or drop the partitions of old months."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=PARTITIONS_AHEAD,
+            help=f"Months to create partitions for after the current one. Defaults to {PARTITIONS_AHEAD}.",
+        )
+        parser.add_argument(
+            "--detach",
+            action="append",
+            default=[],
+            metavar="YYYY-MM",
+            help="Detach the partition of a month from the call record table. Can be repeated.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop the detached partitions and release their call record keys.",
+        )
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError("Call records are not partitioned. Partitioning requires PostgreSQL.")
+
+        try:
+            detach_months = [datetime.strptime(month, "%Y-%m").date() for month in options["detach"]]
+        except ValueError:
+            raise CommandError("Invalid period format. Use YYYY-MM.")
+        if any(month >= localdate().replace(day=1) for month in detach_months):
+            raise CommandError("Only the partitions of past months can be detached.")
+
+        with transaction.atomic():
+            created = create_partitions(partition_months(localdate().replace(day=1), options["ahead"]))
+            detached = detach_partitions(detach_months, drop=options["drop"])
+
+        self.stdout.write(f"Created partitions: {', '.join(created) or 'none'}")
+        if detach_months:
+            action = "Dropped" if options["drop"] else "Detached"
+            self.stdout.write(f"{action} partitions: {', '.join(detached) or 'none'}")
+        self.stdout.write(self.style.SUCCESS("Call record partitions are up to date."))
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from billing.reaper import REAP_CHUNK_SIZE, quarantine_counts, reap_unmatched_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the call records whose other half never arrived to the quarantine "
+        "table, once they are older than a given age."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=7,
+            help="Age in days after which an unmatched record is quarantined. Defaults to 7.",
+        )
+        parser.add_argument(
+            "--lookback",
+            type=int,
+            help=(
+                "Only search the records of this many days before the age limit. By default "
+                "every older record is searched."
+            ),
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=REAP_CHUNK_SIZE,
+            help=f"Records moved per transaction. Defaults to {REAP_CHUNK_SIZE}.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the unmatched records without moving them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 1:
+            raise CommandError("The age must be at least one day.")
+        if options["lookback"] is not None and options["lookback"] < 1:
+            raise CommandError("The lookback must be at least one day.")
+        if options["chunk_size"] < 1:
+            raise CommandError("The chunk size must be at least 1.")
+
+        cutoff = now() - timedelta(days=options["older_than"])
+        lookback = timedelta(days=options["lookback"]) if options["lookback"] else None
+        counts = reap_unmatched_records(cutoff, options["chunk_size"], options["dry_run"], lookback)
+
+        verb = "Would quarantine" if options["dry_run"] else "Quarantined"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {counts['start']} unmatched start and {counts['end']} unmatched end records "
+            f"older than {cutoff:%Y-%m-%d %H:%M}."
+        ))
+        totals = quarantine_counts()
+        self.stdout.write(f"Quarantine: {totals['start']} start and {totals['end']} end records.")
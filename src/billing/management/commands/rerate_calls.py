@@ -0,0 +1,26 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.bills import parse_period, rerate_period
+
+
+class Command(BaseCommand):
+    help = "Price the calls of a billing period again with the tariff versions published now."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            required=True,
+            help="Billing period in YYYY-MM format.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            period_start = parse_period(options["period"])
+        except ValidationError as error:
+            raise CommandError(error.message)
+
+        call_count = rerate_period(period_start)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rerated period {period_start:%Y-%m}: {call_count} calls priced."
+        ))
@@ -0,0 +1,61 @@
+import os
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.bills import is_period_closed, parse_period
+from billing.runs import SHARD_SIZE, run_billing
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the phone bills of every subscriber for a closed billing period, "
+        "sharding subscribers across a pool of worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            help="Billing period in YYYY-MM format. Defaults to the previous month.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Worker processes. 1 runs in this process. Defaults to the number of CPUs.",
+        )
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=SHARD_SIZE,
+            help=f"Subscribers per task. Defaults to {SHARD_SIZE}.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            period_start = parse_period(options["period"])
+        except ValidationError as error:
+            raise CommandError(error.message)
+
+        if not is_period_closed(period_start):
+            raise CommandError(f"Period {period_start:%Y-%m} is not closed yet.")
+        if options["shard_size"] < 1:
+            raise CommandError("The shard size must be at least 1.")
+
+        started_at = time.perf_counter()
+
+        def progress(done, total, bill_count):
+            self.stdout.write(f"{done}/{total} subscribers, {bill_count} bills written")
+
+        bill_count = run_billing(
+            period_start,
+            workers=options["workers"],
+            shard_size=options["shard_size"],
+            progress=progress,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Closed period {period_start:%Y-%m}: {bill_count} bills written "
+            f"in {time.perf_counter() - started_at:.2f}s."
+        ))
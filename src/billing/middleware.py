@@ -0,0 +1,51 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import collect_request_metrics, registry, server_timing
+
+
+class BillingInstrumentationMiddleware:
+    """
+    Measures the query count, DB time, pricing time and serialization time
+    of requests to the instrumented billing views.
+
+    The numbers are returned in a Server-Timing header and aggregated per
+    view for the metrics endpoint. Queries are counted by the execute
+    wrapper every connection gets when it is opened, so they are counted in
+    whichever thread the view runs.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(settings.BILLING_INSTRUMENTED_VIEWS)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        started_at = time.perf_counter()
+        with collect_request_metrics() as metrics:
+            response = self.get_response(request)
+        return self.report(request, response, started_at, metrics)
+
+    async def __acall__(self, request):
+        started_at = time.perf_counter()
+        with collect_request_metrics() as metrics:
+            response = await self.get_response(request)
+        return self.report(request, response, started_at, metrics)
+
+    def report(self, request, response, started_at, metrics):
+        resolver_match = request.resolver_match
+        view = resolver_match.url_name if resolver_match else None
+        if view in self.views:
+            duration = time.perf_counter() - started_at
+            registry.record(view, duration, metrics)
+            response["Server-Timing"] = server_timing(duration, metrics)
+        return response
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calldetail',
+            index=models.Index(fields=['destination'], name='billing_cal_destina_fb19fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calldetail',
+            index=models.Index(fields=['start_time', 'end_time'], name='billing_cal_start_t_5a1c7e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='callrecord',
+            index=models.Index(fields=['call_id'], name='billing_cal_call_id_3dcc43_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='callrecord',
+            index=models.Index(fields=['type'], name='billing_cal_type_2f6d8e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='callrecord',
+            index=models.Index(fields=['timestamp'], name='billing_cal_timesta_14a46c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phonebill',
+            index=models.Index(fields=['phone_number'], name='billing_pho_phone_n_2d4385_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='phonebill',
+            index=models.Index(fields=['period_start', 'period_end'], name='billing_pho_period__a383d9_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='phonebill',
+            constraint=models.UniqueConstraint(fields=('phone_number', 'period_start'), name='unique_phone_bill_period'),
+        ),
+    ]
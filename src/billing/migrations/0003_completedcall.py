@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_phonebill_period_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompletedCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('call_id', models.CharField(max_length=50, unique=True)),
+                ('source', models.CharField(blank=True, max_length=11, null=True)),
+                ('destination', models.CharField(blank=True, max_length=11, null=True)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('duration', models.DurationField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source', 'end_time'], name='billing_com_source_ef2754_idx')],
+            },
+        ),
+    ]
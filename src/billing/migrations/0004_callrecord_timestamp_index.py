@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_completedcall'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='callrecord',
+            name='billing_cal_call_id_3dcc43_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='callrecord',
+            name='billing_cal_type_2f6d8e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='callrecord',
+            name='billing_cal_timesta_14a46c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='callrecord',
+            index=models.Index(fields=['timestamp'], name='callrecord_timestamp_idx'),
+        ),
+    ]
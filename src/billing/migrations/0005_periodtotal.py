@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_callrecord_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=11)),
+                ('period_start', models.DateField()),
+                ('call_count', models.PositiveIntegerField(default=0)),
+                ('billable_minutes', models.PositiveBigIntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('phone_number', 'period_start'), name='unique_period_total')],
+            },
+        ),
+    ]
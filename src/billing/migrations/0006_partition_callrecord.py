@@ -0,0 +1,190 @@
+from datetime import date, datetime
+
+from django.db import migrations
+from django.utils.timezone import get_current_timezone, localdate, localtime, make_aware
+
+
+# The partitioned table as first created. billing.partitions adds the
+# monthly partitions from then on and may change without changing it
+TABLE = 'billing_callrecord'
+DEFAULT_PARTITION = f'{TABLE}_default'
+ID_SEQUENCE = f'{TABLE}_partitioned_id_seq'
+KEY_TABLE = 'billing_callrecordkey'
+KEY_CONSTRAINT = f'{KEY_TABLE}_pkey'
+SKIP_DUPLICATES_SETTING = 'billing.skip_duplicate_records'
+PARTITIONS_AHEAD = 3
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_months(first_month):
+    """
+    Return the first day of every month from `first_month` to
+    `PARTITIONS_AHEAD` months after the current one.
+    """
+    current_month = localdate().replace(day=1)
+    month = min(first_month, current_month)
+    last_month = add_months(current_month, PARTITIONS_AHEAD)
+    months = []
+    while month <= last_month:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_sql(month):
+    current_tz = get_current_timezone()
+    start = make_aware(datetime.combine(month, datetime.min.time()), current_tz)
+    end = make_aware(datetime.combine(add_months(month, 1), datetime.min.time()), current_tz)
+    return (
+        f"CREATE TABLE {TABLE}_y{month:%Y}m{month:%m} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def convert_table_sql(months):
+    """
+    Return the statements turning the call record table into a table
+    partitioned by month on `timestamp`, with one partition per month in
+    `months` and a default partition for records outside of them.
+    """
+    unpartitioned = f'{TABLE}_unpartitioned'
+    columns = 'id, type, timestamp, call_id, source, destination'
+    return [
+        f'ALTER TABLE {TABLE} RENAME TO {unpartitioned}',
+        f'CREATE SEQUENCE {ID_SEQUENCE} AS integer',
+        f"""
+        CREATE TABLE {TABLE} (
+            id integer NOT NULL DEFAULT nextval('{ID_SEQUENCE}'),
+            type varchar(5) NOT NULL,
+            "timestamp" timestamp with time zone NOT NULL,
+            call_id varchar(50) NOT NULL,
+            source varchar(11) NULL,
+            destination varchar(11) NULL,
+            CONSTRAINT {TABLE}_partitioned_pkey PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+        """,
+        f'ALTER SEQUENCE {ID_SEQUENCE} OWNED BY {TABLE}.id',
+        f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT',
+        *(partition_sql(month) for month in months),
+        f'INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {unpartitioned}',
+        f"SELECT setval('{ID_SEQUENCE}', COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}",
+        f"""
+        CREATE TABLE {KEY_TABLE} (
+            call_id varchar(50) NOT NULL,
+            type varchar(5) NOT NULL,
+            CONSTRAINT {KEY_CONSTRAINT} PRIMARY KEY (call_id, type)
+        )
+        """,
+        f'INSERT INTO {KEY_TABLE} (call_id, type) SELECT call_id, type FROM {TABLE}',
+        f'DROP TABLE {unpartitioned}',
+        f'CREATE INDEX callrecord_timestamp_idx ON {TABLE} ("timestamp")',
+        f'CREATE INDEX {TABLE}_call_id_type_idx ON {TABLE} (call_id, type)',
+        f"""
+        CREATE FUNCTION {TABLE}_claim_key() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO {KEY_TABLE} (call_id, type) VALUES (NEW.call_id, NEW.type)
+            ON CONFLICT DO NOTHING;
+            IF FOUND THEN
+                RETURN NEW;
+            END IF;
+            IF current_setting('{SKIP_DUPLICATES_SETTING}', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            RAISE unique_violation USING
+                MESSAGE = 'duplicate key value violates unique constraint "{KEY_CONSTRAINT}"',
+                DETAIL = format('Key (call_id, type)=(%s, %s) already exists.', NEW.call_id, NEW.type),
+                CONSTRAINT = '{KEY_CONSTRAINT}';
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE TRIGGER {TABLE}_claim_key BEFORE INSERT ON {TABLE}
+        FOR EACH ROW EXECUTE FUNCTION {TABLE}_claim_key()
+        """,
+        f"""
+        CREATE FUNCTION {TABLE}_clear_keys() RETURNS trigger AS $$
+        BEGIN
+            TRUNCATE {KEY_TABLE};
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE TRIGGER {TABLE}_clear_keys AFTER TRUNCATE ON {TABLE}
+        FOR EACH STATEMENT EXECUTE FUNCTION {TABLE}_clear_keys()
+        """,
+    ]
+
+
+def partition_call_records(apps, schema_editor):
+    """
+    Partition the call record table by month on PostgreSQL, with partitions
+    from the month of the oldest record to a few months ahead.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MIN("timestamp") FROM billing_callrecord')
+        oldest = cursor.fetchone()[0]
+        first_month = localtime(oldest).date().replace(day=1) if oldest else localtime().date()
+
+        for statement in convert_table_sql(partition_months(first_month)):
+            cursor.execute(statement)
+
+
+# Turns the partitioned table back into the plain table of 0005, with its
+# identity key, unique (call_id, type) constraint and indexes
+UNPARTITION_SQL = [
+    "ALTER TABLE billing_callrecord RENAME TO billing_callrecord_partitioned",
+    """
+    CREATE TABLE billing_callrecord (
+        id integer NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+        type varchar(5) NOT NULL,
+        "timestamp" timestamp with time zone NOT NULL,
+        call_id varchar(50) NOT NULL,
+        source varchar(11) NULL,
+        destination varchar(11) NULL,
+        CONSTRAINT billing_callrecord_call_id_type_6fc21206_uniq UNIQUE (call_id, type)
+    )
+    """,
+    """
+    INSERT INTO billing_callrecord (id, type, "timestamp", call_id, source, destination)
+    SELECT id, type, "timestamp", call_id, source, destination FROM billing_callrecord_partitioned
+    """,
+    """
+    SELECT setval(pg_get_serial_sequence('billing_callrecord', 'id'), COALESCE(MAX(id), 0) + 1, false)
+    FROM billing_callrecord
+    """,
+    "DROP TABLE billing_callrecord_partitioned",
+    "DROP TABLE billing_callrecordkey",
+    "DROP FUNCTION billing_callrecord_claim_key()",
+    "DROP FUNCTION billing_callrecord_clear_keys()",
+    'CREATE INDEX callrecord_timestamp_idx ON billing_callrecord ("timestamp")',
+]
+
+
+def unpartition_call_records(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        for statement in UNPARTITION_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_periodtotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_call_records, unpartition_call_records),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:14
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_partition_callrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tariff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='completedcall',
+            name='billable_minutes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='SubscriberTariff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=11, unique=True, validators=[django.core.validators.RegexValidator(message='Phone number must be in the format AAXXXXXXXXX.', regex='^\\d{2}\\d{8,9}$')])),
+                ('tariff', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='subscribers', to='billing.tariff')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TariffVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('effective_from', models.DateTimeField()),
+                ('fixed_rate', models.DecimalField(decimal_places=4, max_digits=8)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('tariff', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='billing.tariff')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TariffWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_type', models.CharField(choices=[('weekday', 'Weekday'), ('saturday', 'Saturday'), ('sunday', 'Sunday')], max_length=8)),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('rate_per_minute', models.DecimalField(decimal_places=4, max_digits=8)),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='windows', to='billing.tariffversion')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tariffversion',
+            constraint=models.UniqueConstraint(fields=('tariff', 'effective_from'), name='unique_tariff_version'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_tariffs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuarantinedCallRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_id', models.IntegerField()),
+                ('type', models.CharField(choices=[('start', 'Start'), ('end', 'End')], max_length=5)),
+                ('timestamp', models.DateTimeField()),
+                ('call_id', models.CharField(max_length=50)),
+                ('source', models.CharField(blank=True, max_length=11, null=True)),
+                ('destination', models.CharField(blank=True, max_length=11, null=True)),
+                ('quarantined_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['call_id'], name='billing_qua_call_id_5d662b_idx')],
+            },
+        ),
+    ]
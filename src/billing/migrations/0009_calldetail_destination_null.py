@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_quarantinedcallrecord'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='calldetail',
+            name='destination',
+            field=models.CharField(blank=True, max_length=11, null=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+
+# Deleting call records releases their claimed (call_id, type) keys, so a
+# deleted record can be posted again
+RELEASE_KEYS_SQL = [
+    """
+    CREATE FUNCTION billing_callrecord_release_keys() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM billing_callrecordkey AS keys USING deleted
+        WHERE keys.call_id = deleted.call_id AND keys.type = deleted.type;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER billing_callrecord_release_keys AFTER DELETE ON billing_callrecord
+    REFERENCING OLD TABLE AS deleted
+    FOR EACH STATEMENT EXECUTE FUNCTION billing_callrecord_release_keys()
+    """,
+]
+
+DROP_RELEASE_KEYS_SQL = [
+    "DROP TRIGGER billing_callrecord_release_keys ON billing_callrecord",
+    "DROP FUNCTION billing_callrecord_release_keys()",
+]
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'billing_callrecord'::regclass")
+        return cursor.fetchone() is not None
+
+
+def run_on_partitioned_table(statements):
+    def run(apps, schema_editor):
+        if not is_partitioned(schema_editor.connection):
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0009_calldetail_destination_null'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_partitioned_table(RELEASE_KEYS_SQL),
+            run_on_partitioned_table(DROP_RELEASE_KEYS_SQL),
+        ),
+    ]
@@ -0,0 +1,162 @@
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import datetime, time, timezone
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+from django.utils.timezone import get_current_timezone, localtime, make_aware, now
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+# The rates calls were priced with before tariffs were added. They are
+# seeded as the "standard" tariff, and the existing calls are priced with
+# them here rather than with billing.utils, which later versions change
+FIXED_RATE = Decimal('0.36')
+RATE_PER_MINUTE = Decimal('0.09')
+DAY_TYPES = ('weekday', 'saturday', 'sunday')
+
+# Calls are charged per minute only inside the standard tariff window
+STANDARD_TARIFF_START = time(6, 0)
+STANDARD_TARIFF_END = time(22, 0)
+STANDARD_TARIFF_DAY_MINUTES = 16 * 60
+
+
+def standard_tariff_window(day, current_tz):
+    return (
+        make_aware(datetime.combine(day, STANDARD_TARIFF_START), current_tz),
+        make_aware(datetime.combine(day, STANDARD_TARIFF_END), current_tz),
+    )
+
+
+def whole_minutes(start, end):
+    if end <= start:
+        return 0
+    return int((end - start).total_seconds() // 60)
+
+
+def calculate_billable_minutes(start_time, end_time, current_tz):
+    """
+    Return the whole minutes of a call inside the standard tariff window of
+    each day it spans.
+    """
+    if end_time <= start_time:
+        return 0
+
+    start_time = start_time.astimezone(current_tz)
+    end_time = end_time.astimezone(current_tz)
+
+    first_day_start, first_day_end = standard_tariff_window(start_time.date(), current_tz)
+
+    if start_time.date() == end_time.date():
+        return whole_minutes(max(start_time, first_day_start), min(end_time, first_day_end))
+
+    last_day_start, last_day_end = standard_tariff_window(end_time.date(), current_tz)
+    full_days = (end_time.date() - start_time.date()).days - 1
+
+    return (
+        whole_minutes(max(start_time, first_day_start), first_day_end)
+        + full_days * STANDARD_TARIFF_DAY_MINUTES
+        + whole_minutes(last_day_start, min(end_time, last_day_end))
+    )
+
+
+def seed_standard_tariff(apps, schema_editor):
+    """
+    Store the rates priced so far as the published "standard" tariff.
+    """
+    Tariff = apps.get_model('billing', 'Tariff')
+    TariffVersion = apps.get_model('billing', 'TariffVersion')
+    TariffWindow = apps.get_model('billing', 'TariffWindow')
+    db_alias = schema_editor.connection.alias
+
+    tariff = Tariff.objects.using(db_alias).create(name='standard')
+    version = TariffVersion.objects.using(db_alias).create(
+        tariff=tariff,
+        effective_from=datetime(1970, 1, 1, tzinfo=timezone.utc),
+        fixed_rate=FIXED_RATE,
+        published_at=now(),
+    )
+    TariffWindow.objects.using(db_alias).bulk_create([
+        TariffWindow(
+            version=version,
+            day_type=day_type,
+            start_time=STANDARD_TARIFF_START,
+            end_time=STANDARD_TARIFF_END,
+            rate_per_minute=RATE_PER_MINUTE,
+        )
+        for day_type in DAY_TYPES
+    ])
+
+
+def backfill_completed_calls(apps, schema_editor):
+    """
+    Pair the existing start and end call records into completed calls,
+    priced with the standard tariff, and sum them into running totals.
+    """
+    CallRecord = apps.get_model('billing', 'CallRecord')
+    CompletedCall = apps.get_model('billing', 'CompletedCall')
+    PeriodTotal = apps.get_model('billing', 'PeriodTotal')
+    db_alias = schema_editor.connection.alias
+    current_tz = get_current_timezone()
+
+    end_records = CallRecord.objects.using(db_alias).filter(
+        type='end',
+        call_id=OuterRef('call_id'),
+    ).values('timestamp')[:1]
+    start_records = (
+        CallRecord.objects.using(db_alias).filter(type='start')
+        .annotate(end_timestamp=Subquery(end_records))
+        .filter(end_timestamp__isnull=False)
+        .values_list('call_id', 'source', 'destination', 'timestamp', 'end_timestamp')
+    )
+
+    totals = {}
+    batch = []
+    for call_id, source, destination, start_time, end_time in start_records.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        billable_minutes = calculate_billable_minutes(start_time, end_time, current_tz)
+        price = (FIXED_RATE + billable_minutes * RATE_PER_MINUTE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        batch.append(CompletedCall(
+            call_id=call_id,
+            source=source,
+            destination=destination,
+            start_time=start_time,
+            end_time=end_time,
+            duration=end_time - start_time,
+            billable_minutes=billable_minutes,
+            price=price,
+        ))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            CompletedCall.objects.using(db_alias).bulk_create(batch, ignore_conflicts=True)
+            batch = []
+
+        if source is not None:
+            total = totals.setdefault((source, localtime(end_time).date().replace(day=1)), [0, 0, Decimal('0.00')])
+            total[0] += 1
+            total[1] += billable_minutes
+            total[2] += price
+    CompletedCall.objects.using(db_alias).bulk_create(batch, ignore_conflicts=True)
+
+    PeriodTotal.objects.using(db_alias).bulk_create(
+        [
+            PeriodTotal(
+                phone_number=phone_number,
+                period_start=period_start,
+                call_count=call_count,
+                billable_minutes=billable_minutes,
+                total_price=total_price,
+            )
+            for (phone_number, period_start), (call_count, billable_minutes, total_price) in totals.items()
+        ],
+        batch_size=BACKFILL_BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0010_callrecord_release_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_standard_tariff, migrations.RunPython.noop),
+        migrations.RunPython(backfill_completed_calls, migrations.RunPython.noop),
+    ]
@@ -23,10 +23,10 @@ class CallRecord(models.Model):
     destination = models.CharField(max_length=11, null=True, blank=True)
 
     class Meta:
+        # Lookups by call_id (pairing, rerating, archival) are served by the
+        # unique (call_id, type) index, the reaper's window by this one
         indexes = [
-            models.Index(fields=["call_id"]),
-            models.Index(fields=["type"]),
-            models.Index(fields=["timestamp"]),
+            models.Index(fields=["timestamp"], name="callrecord_timestamp_idx"),
         ]
         unique_together = ("call_id", "type")
 
@@ -40,6 +40,145 @@ class CallRecord(models.Model):
         return f"Call {self.call_id} - {self.type}"
 
 
+class QuarantinedCallRecord(models.Model):
+    """
+    A call record whose other half never arrived, moved out of the call
+    record table by the reaper.
+    """
+    record_id = models.IntegerField()
+    type = models.CharField(max_length=5, choices=CallRecord.RECORD_TYPE_CHOICES)
+    timestamp = models.DateTimeField()
+    call_id = models.CharField(max_length=50)
+    source = models.CharField(max_length=11, null=True, blank=True)
+    destination = models.CharField(max_length=11, null=True, blank=True)
+    quarantined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["call_id"]),
+        ]
+
+    def __str__(self):
+        return f"Unmatched call {self.call_id} - {self.type}"
+
+
+class CompletedCall(models.Model):
+    """
+    A call whose start and end records were both received, paired at
+    ingest time so bills read a single table.
+    """
+    call_id = models.CharField(max_length=50, unique=True)
+    source = models.CharField(max_length=11, null=True, blank=True)
+    destination = models.CharField(max_length=11, null=True, blank=True)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    duration = models.DurationField()
+    billable_minutes = models.PositiveIntegerField(default=0)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["source", "end_time"]),
+        ]
+
+    def __str__(self):
+        return f"Call {self.call_id} from {self.source}"
+
+
+class Tariff(models.Model):
+    """
+    A pricing plan. Its rates are kept in effective-dated versions.
+    """
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class TariffVersion(models.Model):
+    """
+    The rates of a tariff for calls starting from `effective_from`.
+
+    Versions are only used for pricing once published, and are not meant
+    to be edited afterwards: a price change is a new version.
+    """
+    tariff = models.ForeignKey(Tariff, related_name="versions", on_delete=models.CASCADE)
+    effective_from = models.DateTimeField()
+    fixed_rate = models.DecimalField(max_digits=8, decimal_places=4)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tariff", "effective_from"],
+                name="unique_tariff_version",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.tariff} from {self.effective_from:%Y-%m-%d %H:%M}"
+
+
+class TariffWindow(models.Model):
+    """
+    A per-minute rate applying between two times of a day type. An
+    `end_time` of 00:00 means midnight at the end of the day.
+    """
+    DAY_TYPE_CHOICES = [
+        ("weekday", "Weekday"),
+        ("saturday", "Saturday"),
+        ("sunday", "Sunday"),
+    ]
+
+    version = models.ForeignKey(TariffVersion, related_name="windows", on_delete=models.CASCADE)
+    day_type = models.CharField(max_length=8, choices=DAY_TYPE_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    rate_per_minute = models.DecimalField(max_digits=8, decimal_places=4)
+
+    def clean(self):
+        if self.end_time <= self.start_time and self.end_time.isoformat() != "00:00:00":
+            raise ValidationError("The end time must be after the start time.")
+        super().clean()
+
+    def __str__(self):
+        return f"{self.day_type} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class SubscriberTariff(models.Model):
+    """
+    The tariff a subscriber is priced with, instead of the default one.
+    """
+    phone_number = models.CharField(max_length=11, unique=True, validators=[phone_regex])
+    tariff = models.ForeignKey(Tariff, related_name="subscribers", on_delete=models.PROTECT)
+
+    def __str__(self):
+        return f"{self.phone_number} on {self.tariff}"
+
+
+class PeriodTotal(models.Model):
+    """
+    Running totals of the completed calls of a subscriber in a billing
+    period, updated as calls are completed.
+    """
+    phone_number = models.CharField(max_length=11)
+    period_start = models.DateField()
+    call_count = models.PositiveIntegerField(default=0)
+    billable_minutes = models.PositiveBigIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["phone_number", "period_start"],
+                name="unique_period_total",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Totals for {self.phone_number} - {self.period_start.strftime('%Y-%m')}"
+
+
 class PhoneBill(models.Model):
     phone_number = models.CharField(max_length=11)
     period_start = models.DateField()
@@ -51,6 +190,12 @@ class PhoneBill(models.Model):
             models.Index(fields=["phone_number"]),
             models.Index(fields=["period_start", "period_end"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["phone_number", "period_start"],
+                name="unique_phone_bill_period",
+            ),
+        ]
 
     def clean(self):
         """
@@ -66,7 +211,8 @@ class PhoneBill(models.Model):
 
 class CallDetail(models.Model):
     phone_bill = models.ForeignKey(PhoneBill, related_name="call_details", on_delete=models.CASCADE)
-    destination = models.CharField(max_length=11)
+    # Start records may come without a destination
+    destination = models.CharField(max_length=11, null=True, blank=True)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     duration = models.DurationField()
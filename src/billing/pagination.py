@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from django.core import signing
+from django.utils.dateparse import parse_datetime
+
+from .bills import bill_total_price, rows_after
+
+
+CURSOR_SALT = "billing.phone-bill-cursor"
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(phone_number, period_start, start_time, row_id, total_price):
+    """
+    Return a signed cursor pointing after the (start_time, id) key.
+
+    The bill total computed for the first page travels with the cursor, so
+    every page reports the same `total_price` without pricing the whole
+    bill again.
+    """
+    return signing.dumps(
+        {
+            "phone_number": phone_number,
+            "period": period_start.strftime("%Y-%m"),
+            "start_time": start_time.isoformat(),
+            "id": row_id,
+            "total_price": str(total_price),
+        },
+        salt=CURSOR_SALT,
+        compress=True,
+    )
+
+
+def decode_cursor(cursor, phone_number, period_start):
+    """
+    Return the (start_time, id, total_price) stored in a cursor issued for
+    the same bill. Raises InvalidCursor otherwise.
+    """
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor()
+
+    if data["phone_number"] != phone_number or data["period"] != period_start.strftime("%Y-%m"):
+        raise InvalidCursor()
+    return parse_datetime(data["start_time"]), data["id"], Decimal(data["total_price"])
+
+
+def paginate_bill_calls(bill_calls, phone_number, period_start, cursor, page_size):
+    """
+    Return one page of the call rows of a bill, keyed on (start time, id),
+    along with the bill total and the cursor of the next page or None.
+    """
+    rows = bill_calls.rows
+    if cursor:
+        start_time, row_id, total_price = decode_cursor(cursor, phone_number, period_start)
+        rows = rows_after(bill_calls, start_time, row_id)
+    else:
+        total_price = bill_total_price(bill_calls)
+
+    # One extra row tells whether there is a next page
+    rows = list(rows[:page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_next:
+        row_id, _, start_time, _, _ = rows[-1]
+        next_cursor = encode_cursor(phone_number, period_start, start_time, row_id, total_price)
+
+    return rows, total_price, next_cursor
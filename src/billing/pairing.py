@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.utils.timezone import get_current_timezone
+
+from .instrumentation import timed
+from .models import CallRecord, CompletedCall
+from .tariffs import get_tariff_book, subscriber_tariffs
+from .totals import update_period_totals
+
+
+COMPLETED_CALL_FIELDS = [
+    "source", "destination", "start_time", "end_time", "duration", "billable_minutes", "price",
+]
+
+
+def complete_calls(records):
+    """
+    Pair the given call records with their other half and write the
+    `CompletedCall` of every call that now has both a start and an end.
+
+    Both halves are fetched in a single query, so a late-arriving start
+    completes the call just like a late end does. Calls are priced with the
+    tariff version of their subscriber in effect when they started. Calls
+    written before are updated in place, and the running totals of their
+    subscriber periods are updated in the same transaction.
+
+    The call records of the completed calls are locked before the calls
+    written before are read, so concurrent completions of a call wait for
+    each other and each applies its change to the totals once. Returns the
+    completed calls.
+    """
+    call_ids = {record.call_id for record in records}
+    if not call_ids:
+        return []
+
+    start_records = {}
+    end_records = {}
+    for record in CallRecord.objects.filter(call_id__in=call_ids):
+        if record.type == "start":
+            start_records[record.call_id] = record
+        else:
+            end_records[record.call_id] = record
+
+    completed_call_ids = start_records.keys() & end_records.keys()
+    if not completed_call_ids:
+        return []
+
+    with timed("pricing"):
+        book = get_tariff_book()
+        tariff_names = subscriber_tariffs({start_records[call_id].source for call_id in completed_call_ids})
+        current_tz = get_current_timezone()
+        ratings = {}
+        for call_id in completed_call_ids:
+            start_time = start_records[call_id].timestamp
+            tariff = book.tariff_for(tariff_names.get(start_records[call_id].source), start_time)
+            ratings[call_id] = tariff.rate(start_time, end_records[call_id].timestamp, current_tz)
+
+    completed_calls = []
+    for call_id in completed_call_ids:
+        start_time = start_records[call_id].timestamp
+        end_time = end_records[call_id].timestamp
+        billable_minutes, price = ratings[call_id]
+        completed_calls.append(CompletedCall(
+            call_id=call_id,
+            source=start_records[call_id].source,
+            destination=start_records[call_id].destination,
+            start_time=start_time,
+            end_time=end_time,
+            duration=end_time - start_time,
+            billable_minutes=billable_minutes,
+            price=price,
+        ))
+
+    with transaction.atomic():
+        # Locked in a fixed order, so overlapping batches do not deadlock
+        list(
+            CallRecord.objects.select_for_update()
+            .filter(call_id__in=completed_call_ids)
+            .order_by("call_id", "type")
+            .values_list("id")
+        )
+        previous_calls = list(CompletedCall.objects.filter(call_id__in=completed_call_ids))
+        completed_calls = CompletedCall.objects.bulk_create(
+            completed_calls,
+            update_conflicts=True,
+            unique_fields=["call_id"],
+            update_fields=COMPLETED_CALL_FIELDS,
+        )
+        update_period_totals(previous_calls, completed_calls)
+    return completed_calls
+
+
+def paired_calls(source, period_start, period_end):
+    """
+    Return the completed calls made by `source` that ended within
+    [period_start, period_end), ordered by start time.
+
+    The (start, end) pairing is resolved at ingest time, so this is a single
+    range scan on the (source, end_time) index regardless of how much
+    traffic other subscribers have in the same period.
+    """
+    return CompletedCall.objects.filter(
+        source=source,
+        end_time__gte=period_start,
+        end_time__lt=period_end,
+    ).order_by("start_time", "id")
+
+
+def paired_calls_by_source(period_start, period_end):
+    """
+    Return the completed calls of every subscriber that ended in the period,
+    ordered by `source` so callers can group them while iterating.
+    """
+    return CompletedCall.objects.filter(
+        source__isnull=False,
+        end_time__gte=period_start,
+        end_time__lt=period_end,
+    ).order_by("source", "start_time", "id")
+
+
+def period_sources(period_start, period_end):
+    """
+    Return the distinct numbers that made a call ending in the period,
+    in order.
+    """
+    return CompletedCall.objects.filter(
+        source__isnull=False,
+        end_time__gte=period_start,
+        end_time__lt=period_end,
+    ).order_by("source").values_list("source", flat=True).distinct()
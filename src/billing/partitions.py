@@ -0,0 +1,175 @@
+from datetime import date
+
+from django.db import connection
+from django.utils.timezone import localdate
+
+from .bills import get_period_bounds
+from .models import CallRecord
+
+
+TABLE = CallRecord._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+# Partitioned tables cannot enforce a unique constraint that leaves out the
+# partition key, so the (call_id, type) keys are claimed in this table by a
+# trigger instead, set up by migration 0006
+KEY_TABLE = "billing_callrecordkey"
+
+# Set for the current transaction to skip duplicate records instead of
+# raising, like ON CONFLICT DO NOTHING does on the unpartitioned table
+SKIP_DUPLICATES_SETTING = "billing.skip_duplicate_records"
+
+# Months of partitions created ahead of the current one
+PARTITIONS_AHEAD = 3
+
+
+def add_months(month, months):
+    """
+    Return the first day of the month `months` after the one of `month`.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first_month, last_month):
+    """
+    Return the first day of every month from `first_month` to `last_month`.
+    """
+    months = []
+    month = first_month.replace(day=1)
+    while month <= last_month:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_months(first_month, ahead=PARTITIONS_AHEAD):
+    """
+    Return the months from `first_month` to `ahead` months after the current
+    one.
+    """
+    current_month = localdate().replace(day=1)
+    return months_between(min(first_month, current_month), add_months(current_month, ahead))
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month:%Y}m{month:%m}"
+
+
+def partition_bounds_sql(month):
+    """
+    Return the FOR VALUES clause of the partition holding the records of the
+    billing period beginning on the `month` date.
+    """
+    start, end = get_period_bounds(month)
+    return f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def create_partition_sql(month):
+    """
+    Return the statements adding the partition of `month`, moving the
+    records of that month out of the default partition first.
+    """
+    start, end = get_period_bounds(month)
+    partition = partition_name(month)
+    return [
+        f"CREATE TABLE {partition} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE "timestamp" >= '{start.isoformat()}' AND "timestamp" < '{end.isoformat()}'
+            RETURNING *
+        )
+        INSERT INTO {partition} SELECT * FROM moved
+        """,
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {partition} {partition_bounds_sql(month)}",
+    ]
+
+
+def detach_partition_sql(month, drop=False):
+    """
+    Return the statements detaching the partition of `month`. The keys of
+    its records are kept, so they are still rejected as duplicates, unless
+    the partition is dropped.
+    """
+    partition = partition_name(month)
+    statements = [f"ALTER TABLE {TABLE} DETACH PARTITION {partition}"]
+    if drop:
+        statements += [
+            f"""
+            DELETE FROM {KEY_TABLE} AS keys USING {partition} AS records
+            WHERE keys.call_id = records.call_id AND keys.type = records.type
+            """,
+            f"DROP TABLE {partition}",
+        ]
+    return statements
+
+
+def is_partitioned():
+    """
+    Return whether the call record table is partitioned.
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def existing_partitions():
+    """
+    Return the names of the partitions of the call record table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass",
+            [TABLE],
+        )
+        return {name for (name,) in cursor.fetchall()}
+
+
+def create_partitions(months):
+    """
+    Add the partitions of the given months that do not exist yet and
+    return their names.
+    """
+    partitions = existing_partitions()
+    created = []
+    with connection.cursor() as cursor:
+        for month in months:
+            if partition_name(month) in partitions:
+                continue
+            for statement in create_partition_sql(month):
+                cursor.execute(statement)
+            created.append(partition_name(month))
+    return created
+
+
+def detach_partitions(months, drop=False):
+    """
+    Detach the existing partitions of the given months and return their
+    names.
+    """
+    partitions = existing_partitions()
+    detached = []
+    with connection.cursor() as cursor:
+        for month in months:
+            if partition_name(month) not in partitions:
+                continue
+            for statement in detach_partition_sql(month, drop):
+                cursor.execute(statement)
+            detached.append(partition_name(month))
+    return detached
+
+
+def skip_duplicate_records():
+    """
+    Make the partitioned table skip records whose (call_id, type) key is
+    already taken until the current transaction ends.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config(%s, 'on', true)", [SKIP_DUPLICATES_SETTING])
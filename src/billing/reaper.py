@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .models import CallRecord, QuarantinedCallRecord
+
+
+# Call records moved to the quarantine per transaction
+REAP_CHUNK_SIZE = 1000
+
+QUARANTINE_FIELDS = ["type", "timestamp", "call_id", "source", "destination"]
+
+
+def unmatched_records(cutoff, lookback=None):
+    """
+    Return the call records from before `cutoff` whose other half does not
+    exist, only those of the `lookback` before it when given.
+
+    The lookback is a range of the timestamp index, and the other halves
+    are an anti-join on the (call_id, type) index, so a bounded query reads
+    only its window instead of the whole record history.
+    """
+    other_half = CallRecord.objects.filter(call_id=OuterRef("call_id")).exclude(type=OuterRef("type"))
+    records = CallRecord.objects.filter(timestamp__lt=cutoff)
+    if lookback is not None:
+        records = records.filter(timestamp__gte=cutoff - lookback)
+    return records.filter(~Exists(other_half))
+
+
+def reap_unmatched_records(cutoff, chunk_size=REAP_CHUNK_SIZE, dry_run=False, lookback=None):
+    """
+    Move the call records from before `cutoff`, or only those of the
+    `lookback` before it, that never got their other half to the
+    quarantine, `chunk_size` records per transaction.
+
+    Records are walked in (timestamp, id) order, so each chunk resumes
+    where the last one ended on the timestamp index instead of scanning the
+    window again. A record whose other half arrives while its chunk is
+    moved stays in place. Returns the number of records moved, or that
+    would be moved with `dry_run`, by record type.
+    """
+    counts = dict.fromkeys(("start", "end"), 0)
+    after = Q()
+
+    while True:
+        chunk = list(
+            unmatched_records(cutoff, lookback).filter(after).order_by("timestamp", "id")
+            .values_list("timestamp", "id")[:chunk_size]
+        )
+        if not chunk:
+            return counts
+        last_timestamp, last_id = chunk[-1]
+        after = Q(timestamp__gt=last_timestamp) | Q(timestamp=last_timestamp, id__gt=last_id)
+        chunk = [record_id for _, record_id in chunk]
+
+        if dry_run:
+            for record_type, count in (
+                CallRecord.objects.filter(id__in=chunk).values_list("type").annotate(count=Count("id")).order_by()
+            ):
+                counts[record_type] += count
+            continue
+
+        with transaction.atomic():
+            records = list(unmatched_records(cutoff, lookback).filter(id__in=chunk))
+            QuarantinedCallRecord.objects.bulk_create([
+                QuarantinedCallRecord(record_id=record.id, **{
+                    field: getattr(record, field) for field in QUARANTINE_FIELDS
+                })
+                for record in records
+            ])
+            CallRecord.objects.filter(id__in=[record.id for record in records]).delete()
+
+        for record in records:
+            counts[record.type] += 1
+
+
+def quarantine_counts():
+    """
+    Return the number of quarantined call records by record type.
+    """
+    counts = dict.fromkeys(("start", "end"), 0)
+    counts.update(QuarantinedCallRecord.objects.values_list("type").annotate(count=Count("id")).order_by())
+    return counts
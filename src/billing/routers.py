@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Database alias the reads of the current request or task are routed to,
+# None for the primary
+_read_database = ContextVar("billing_read_database", default=None)
+
+
+def replica_alias():
+    """
+    Return the alias of the read replica, or None if none is configured.
+    """
+    alias = settings.BILLING_REPLICA_ALIAS
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_database.set(alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def reading_from_replica():
+    """
+    Route the reads of the block to the read replica, when one is
+    configured. Writes still go to the primary.
+    """
+    return reading_from(replica_alias())
+
+
+def reading_from_primary():
+    """
+    Route the reads of the block to the primary, so they see the writes
+    the replica may not have received yet.
+    """
+    return reading_from(DEFAULT_DB_ALIAS)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the database chosen with `reading_from_replica` or
+    `reading_from_primary`, the primary outside of them, and all writes to
+    the primary.
+    """
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
@@ -0,0 +1,80 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.db import connection, connections
+
+from .bills import close_period, get_period_bounds
+from .pairing import period_sources
+
+
+# Subscribers closed per task. Kept under the 999 parameters SQLite allows
+# in the `source IN (...)` filter of a shard.
+SHARD_SIZE = 500
+
+
+def shard_sources(sources, shard_size=SHARD_SIZE):
+    """
+    Split an ordered list of numbers into consecutive shards.
+    """
+    return [sources[index:index + shard_size] for index in range(0, len(sources), shard_size)]
+
+
+def init_worker():
+    """
+    Set Django up in a pool process started with the spawn method. Each
+    worker opens its own database connection on its first query.
+    """
+    django.setup()
+
+
+def close_shard(period_start, sources):
+    """
+    Close the period for one shard of subscribers in a pool process.
+    Returns the shard size and the number of bills written.
+    """
+    return len(sources), close_period(period_start, sources)
+
+
+def run_billing(period_start, workers=1, shard_size=SHARD_SIZE, progress=None):
+    """
+    Write the bills of every subscriber for the period beginning on the
+    `period_start` date, closing shards of subscribers in `workers`
+    processes. Runs inline when `workers` is 1, and on SQLite, which only
+    allows one writer at a time.
+
+    `progress` is called with (subscribers done, subscribers, bills written)
+    after each shard. Re-running replaces the bills of the period. Returns
+    the number of bills written.
+    """
+    start, end = get_period_bounds(period_start)
+    shards = shard_sources(list(period_sources(start, end)), shard_size)
+    subscriber_count = sum(len(shard) for shard in shards)
+
+    done = 0
+    bill_count = 0
+
+    if workers <= 1 or connection.vendor == "sqlite":
+        for shard in shards:
+            bill_count += close_period(period_start, shard)
+            done += len(shard)
+            if progress:
+                progress(done, subscriber_count, bill_count)
+        return bill_count
+
+    # Close the connections and connection pools before forking, so no
+    # worker inherits their sockets
+    connections.close_all()
+    for pooled_connection in connections.all():
+        if hasattr(pooled_connection, "close_pool"):
+            pooled_connection.close_pool()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = [executor.submit(close_shard, period_start, shard) for shard in shards]
+        for future in as_completed(futures):
+            shard_subscribers, shard_bills = future.result()
+            done += shard_subscribers
+            bill_count += shard_bills
+            if progress:
+                progress(done, subscriber_count, bill_count)
+
+    return bill_count
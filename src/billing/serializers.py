@@ -1,16 +1,84 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator
+
+from .bills import MAX_BATCH_PHONE_NUMBERS
+from .models import CallRecord, phone_regex
+from .pairing import complete_calls
+from .utils import format_duration
+
+
+class CallRecordListSerializer(serializers.ListSerializer):
+    """
+    Validates and stores a batch of call records.
+
+    Invalid items do not reject the whole batch: their errors are kept in
+    `item_errors`, aligned with the input, and only the valid items are saved.
+    """
+    duplicate_message = "The fields call_id, type must make a unique set."
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Duplicates are checked for the whole batch at once instead of per item
+        self.child.validators = [
+            validator for validator in self.child.validators
+            if not isinstance(validator, UniqueTogetherValidator)
+        ]
+        self.item_errors = []
+
+    def run_child_validation(self, data):
+        try:
+            validated = super().run_child_validation(data)
+        except serializers.ValidationError as exc:
+            self.item_errors.append(exc.detail)
+            return None
+        self.item_errors.append({})
+        return validated
+
+    def to_internal_value(self, data):
+        self.item_errors = []
+        validated_data = super().to_internal_value(data)
+
+        call_ids = {attrs["call_id"] for attrs in validated_data if attrs is not None}
+        existing_keys = set(
+            CallRecord.objects.filter(call_id__in=call_ids).values_list("call_id", "type")
+        )
 
-from .models import CallRecord
+        for index, attrs in enumerate(validated_data):
+            if attrs is None:
+                continue
+            key = (attrs["call_id"], attrs["type"])
+            if key in existing_keys:
+                self.item_errors[index] = {
+                    api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_message]
+                }
+                validated_data[index] = None
+            existing_keys.add(key)
+
+        return [attrs for attrs in validated_data if attrs is not None]
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            records = CallRecord.objects.bulk_create(
+                [CallRecord(**attrs) for attrs in validated_data]
+            )
+            # bulk_create does not send post_save, so pair the records here
+            complete_calls(records)
+        return records
 
 
 class CallRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = CallRecord
         fields = ["id", "call_id", "type", "timestamp", "source", "destination"]
+        list_serializer_class = CallRecordListSerializer
 
 
 class CallDetailSerializer(serializers.Serializer):
-    destination = serializers.CharField(max_length=11)
+    destination = serializers.CharField(max_length=11, allow_null=True)
     call_start_date = serializers.DateField()
     call_start_time = serializers.TimeField()
     duration = serializers.CharField()
@@ -21,4 +89,92 @@ class PhoneBillSerializer(serializers.Serializer):
     phone_number = serializers.CharField(max_length=11)
     period = serializers.CharField()
     total_price = serializers.CharField()
-    call_records = CallDetailSerializer(many=True)
\ No newline at end of file
+    call_records = CallDetailSerializer(many=True)
+
+
+class PhoneBillPageSerializer(PhoneBillSerializer):
+    next_cursor = serializers.CharField(allow_null=True)
+
+
+def call_detail_representation(row):
+    """
+    Return the `CallDetailSerializer` output of a (id, destination,
+    start_time, duration, price) row, formatting the fields directly
+    instead of going through the serializer fields.
+    """
+    _, destination, start_time, duration, price = row
+    return {
+        "destination": destination,
+        "call_start_date": start_time.date().isoformat(),
+        "call_start_time": start_time.time().isoformat(),
+        "duration": format_duration(duration),
+        "price": f"R$ {price:.2f}",
+    }
+
+
+def phone_bill_representation(phone_number, period_start, rows, total_price):
+    """
+    Return the `PhoneBillSerializer` output of a bill from its call rows,
+    rendering to the same JSON as the serializer.
+    """
+    return {
+        "phone_number": phone_number,
+        "period": period_start.strftime("%Y-%m"),
+        "total_price": f"R$ {total_price:.2f}",
+        "call_records": [call_detail_representation(row) for row in rows],
+    }
+
+
+class PhoneBillBatchRequestSerializer(serializers.Serializer):
+    phone_numbers = serializers.ListField(
+        child=serializers.CharField(max_length=11, validators=[phone_regex]),
+        allow_empty=False,
+        max_length=MAX_BATCH_PHONE_NUMBERS,
+    )
+    period = serializers.CharField(required=False, help_text="Billing period in YYYY-MM format.")
+
+
+class PhoneBillBatchSerializer(serializers.Serializer):
+    bills = PhoneBillSerializer(many=True)
+
+
+class StatementPeriodSerializer(serializers.Serializer):
+    period = serializers.CharField()
+    total_price = serializers.CharField()
+    call_records = CallDetailSerializer(many=True)
+
+
+class PhoneBillStatementSerializer(serializers.Serializer):
+    phone_number = serializers.CharField(max_length=11)
+    total_price = serializers.CharField()
+    periods = StatementPeriodSerializer(many=True)
+
+
+class PeriodTotalSerializer(serializers.Serializer):
+    phone_number = serializers.CharField(max_length=11)
+    period = serializers.CharField()
+    call_count = serializers.IntegerField()
+    billable_minutes = serializers.IntegerField()
+    total_price = serializers.CharField()
+
+
+def statement_representation(phone_number, periods):
+    """
+    Return the `PhoneBillStatementSerializer` output of the (period_start,
+    rows) pairs of a statement, with the subtotal of each period.
+    """
+    total_price = Decimal("0.00")
+    statement_periods = []
+    for period_start, rows in periods:
+        period_total = sum((row[-1] for row in rows), Decimal("0.00"))
+        total_price += period_total
+        statement_periods.append({
+            "period": period_start.strftime("%Y-%m"),
+            "total_price": f"R$ {period_total:.2f}",
+            "call_records": [call_detail_representation(row) for row in rows],
+        })
+    return {
+        "phone_number": phone_number,
+        "total_price": f"R$ {total_price:.2f}",
+        "periods": statement_periods,
+    }
@@ -0,0 +1,31 @@
+from django.dispatch import receiver
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+
+from .instrumentation import query_timer
+from .models import CallRecord
+from .pairing import complete_calls
+
+
+@receiver(post_save, sender=CallRecord)
+def complete_call_on_save(sender, instance, **kwargs):
+    """
+    Write the completed call once the second half of a pair is saved.
+
+    `bulk_create` does not send this signal, so bulk writers call
+    `complete_calls` themselves.
+    """
+    complete_calls([instance])
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    """
+    Count the queries of instrumented requests on every connection.
+
+    Under ASGI sync views run in a worker thread with connections of their
+    own, so the timer is installed where connections are opened instead of
+    by the middleware.
+    """
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
@@ -0,0 +1,160 @@
+import time
+from bisect import bisect_right
+from threading import Lock
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.timezone import now
+
+from .models import SubscriberTariff, TariffVersion
+from .utils import DAY_TYPES, STANDARD_TARIFF, CompiledTariff
+
+
+# Tariff subscribers are priced with unless they have their own
+DEFAULT_TARIFF = "standard"
+
+# Seconds a process trusts its compiled tariffs before checking whether
+# another process published a new version
+TARIFF_RECHECK_SECONDS = 30
+
+
+def window_seconds(moment):
+    return moment.hour * 3600 + moment.minute * 60 + moment.second
+
+
+def compile_tariff(fixed_rate, windows):
+    """
+    Compile a fixed rate and (day_type, start_time, end_time,
+    rate_per_minute) windows into a `CompiledTariff`. Raises ValueError for
+    invalid or overlapping windows.
+    """
+    day_windows = {day_type: [] for day_type in DAY_TYPES}
+    for day_type, start_time, end_time, rate_per_minute in windows:
+        # A window ending at 00:00 runs until the end of the day
+        end = window_seconds(end_time) or 24 * 3600
+        day_windows[day_type].append((window_seconds(start_time), end, rate_per_minute))
+    return CompiledTariff(fixed_rate, day_windows)
+
+
+def compile_tariff_version(version):
+    """
+    Compile a `TariffVersion` and its windows into a `CompiledTariff`.
+    """
+    return compile_tariff(version.fixed_rate, [
+        (window.day_type, window.start_time, window.end_time, window.rate_per_minute)
+        for window in version.windows.all()
+    ])
+
+
+class TariffBook:
+    """
+    The compiled published versions of every tariff, with the start of
+    the effective range of each version sorted per tariff.
+    """
+    __slots__ = ("versions", "state")
+
+    def __init__(self, versions, state):
+        self.versions = versions
+        self.state = state
+
+    @classmethod
+    def load(cls):
+        versions = {}
+        published = (
+            TariffVersion.objects.filter(published_at__isnull=False)
+            .select_related("tariff")
+            .prefetch_related("windows")
+            .order_by("tariff__name", "effective_from")
+        )
+        for version in published:
+            effective_from, compiled = versions.setdefault(version.tariff.name, ([], []))
+            effective_from.append(version.effective_from)
+            compiled.append(compile_tariff_version(version))
+        return cls(versions, published_state())
+
+    def tariff_for(self, name, start_time):
+        """
+        Return the compiled version of tariff `name` in effect at
+        `start_time`, falling back to the default tariff and then to the
+        built-in standard tariff.
+        """
+        for tariff_name in (name, DEFAULT_TARIFF):
+            if tariff_name not in self.versions:
+                continue
+            effective_from, compiled = self.versions[tariff_name]
+            index = bisect_right(effective_from, start_time)
+            if index:
+                return compiled[index - 1]
+        return STANDARD_TARIFF
+
+
+def published_state():
+    """
+    Return a fingerprint of the published tariff versions, which changes
+    whenever a version is published.
+    """
+    state = TariffVersion.objects.filter(published_at__isnull=False).aggregate(
+        last_published_at=Max("published_at"),
+        count=Count("id"),
+    )
+    return state["last_published_at"], state["count"]
+
+
+_book = None
+_checked_at = 0.0
+_lock = Lock()
+
+
+def get_tariff_book():
+    """
+    Return the `TariffBook` of this process, reloading it when a tariff
+    version was published since it was compiled.
+    """
+    global _book, _checked_at
+
+    with _lock:
+        if _book is None:
+            _book = TariffBook.load()
+            _checked_at = time.monotonic()
+        elif time.monotonic() - _checked_at >= TARIFF_RECHECK_SECONDS:
+            if published_state() != _book.state:
+                _book = TariffBook.load()
+            _checked_at = time.monotonic()
+        return _book
+
+
+def clear_tariff_cache():
+    global _book
+
+    with _lock:
+        _book = None
+
+
+def publish_tariff_version(version):
+    """
+    Publish a tariff version, pricing calls started from its effective
+    date with it. Other processes pick it up within
+    `TARIFF_RECHECK_SECONDS`.
+
+    The version is compiled first, so one with invalid or overlapping
+    windows raises ValidationError instead of breaking the pricing of every
+    call once published.
+    """
+    try:
+        compile_tariff_version(version)
+    except ValueError as exc:
+        raise ValidationError(str(exc)) from exc
+
+    version.published_at = now()
+    version.save(update_fields=["published_at"])
+    clear_tariff_cache()
+
+
+def subscriber_tariffs(phone_numbers):
+    """
+    Return the tariff names of the given subscribers that are not on the
+    default tariff.
+    """
+    return dict(
+        SubscriberTariff.objects.filter(phone_number__in=phone_numbers).values_list("phone_number", "tariff__name")
+    )
@@ -0,0 +1,67 @@
+from decimal import Decimal
+from collections import defaultdict
+
+from django.db.models import F
+from django.utils.timezone import localtime
+
+from .models import PeriodTotal
+
+
+def call_period_start(end_time):
+    """
+    Return the first day of the billing period a call ending at `end_time`
+    is billed in.
+    """
+    return localtime(end_time).date().replace(day=1)
+
+
+def totals_deltas(previous_calls, completed_calls):
+    """
+    Return the change of the running totals, keyed by (phone_number,
+    period_start), from replacing `previous_calls` by `completed_calls`.
+    """
+    deltas = defaultdict(lambda: [0, 0, Decimal("0.00")])
+    for calls, sign in ((previous_calls, -1), (completed_calls, 1)):
+        for call in calls:
+            if call.source is None:
+                continue
+            delta = deltas[call.source, call_period_start(call.end_time)]
+            delta[0] += sign
+            delta[1] += sign * call.billable_minutes
+            delta[2] += sign * call.price
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def update_period_totals(previous_calls, completed_calls):
+    """
+    Apply the change from `previous_calls` to `completed_calls` to the
+    running totals with one atomic increment per subscriber and period, so
+    concurrent writers do not overwrite each other. Rewriting an unchanged
+    call leaves the totals as they are.
+
+    The deltas are only right if `previous_calls` were read under a lock
+    that keeps other writers from changing the calls until the transaction
+    ends, as `complete_calls` does.
+    """
+    deltas = totals_deltas(previous_calls, completed_calls)
+    if not deltas:
+        return
+
+    PeriodTotal.objects.bulk_create(
+        [PeriodTotal(phone_number=phone_number, period_start=period_start) for phone_number, period_start in deltas],
+        ignore_conflicts=True,
+    )
+    for (phone_number, period_start), (call_count, billable_minutes, total_price) in deltas.items():
+        PeriodTotal.objects.filter(phone_number=phone_number, period_start=period_start).update(
+            call_count=F("call_count") + call_count,
+            billable_minutes=F("billable_minutes") + billable_minutes,
+            total_price=F("total_price") + total_price,
+        )
+
+
+def get_period_total(phone_number, period_start):
+    """
+    Return the running totals of `phone_number` for the period beginning on
+    the `period_start` date, or None if it has no completed calls.
+    """
+    return PeriodTotal.objects.filter(phone_number=phone_number, period_start=period_start).first()
@@ -1,9 +1,22 @@
 from django.urls import path
 
-from .views import CallRecordView, PhoneBillView
+from .views import (
+    CallRecordIngestView,
+    CallRecordView,
+    MetricsView,
+    PhoneBillBatchView,
+    PhoneBillStatementView,
+    PhoneBillTotalsView,
+    PhoneBillView,
+)
 
 
 urlpatterns = [
     path("call-records/", CallRecordView.as_view(), name="call-records"),
+    path("call-records/ingest/", CallRecordIngestView.as_view(), name="call-records-ingest"),
     path("phone-bills/", PhoneBillView.as_view(), name="phone-bills"),
+    path("phone-bills/batch/", PhoneBillBatchView.as_view(), name="phone-bill-batch"),
+    path("phone-bills/statement/", PhoneBillStatementView.as_view(), name="phone-bill-statement"),
+    path("phone-bills/totals/", PhoneBillTotalsView.as_view(), name="phone-bill-totals"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
\ No newline at end of file
@@ -1,54 +1,274 @@
+import numpy as np
+
+from bisect import bisect_right
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime, time, timedelta
+from datetime import time
+from functools import lru_cache
 from django.utils.timezone import make_aware, get_current_timezone
 
 
-def calculate_call_price(start_time, end_time):
+FIXED_RATE = Decimal('0.36')
+RATE_PER_MINUTE = Decimal('0.09')
+
+# Calls are charged per minute only inside the standard tariff window
+STANDARD_TARIFF_START = time(6, 0)
+STANDARD_TARIFF_END = time(22, 0)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+MICROSECONDS = 1_000_000
+MICROSECONDS_PER_MINUTE = 60 * MICROSECONDS
+MICROSECONDS_PER_DAY = SECONDS_PER_DAY * MICROSECONDS
+
+
+# Day types a tariff defines rate windows for, and the day type of each
+# weekday from Monday on
+DAY_TYPES = ("weekday", "saturday", "sunday")
+WEEKDAY_DAY_TYPES = ("weekday",) * 5 + ("saturday", "sunday")
+
+# Rates are compiled to integer ten-thousandths of the currency unit
+RATE_SCALE = 10_000
+CENT = Decimal("0.01")
+CENT_UNITS = RATE_SCALE // 100
+
+
+class CompiledTariff:
+    """
+    Immutable rate table of a tariff version, compiled for pricing.
+
+    Every call pays `fixed_rate`, plus the whole minutes spent inside each
+    rate window times the rate of the window. Minutes outside of the
+    windows are free. For each weekday, the windows are kept as sorted
+    tuples of start and end microseconds since midnight and their rates,
+    and the billable minutes and cost of a full day are precomputed, so
+    only the first and last day of a call are looked up.
+    """
+    __slots__ = ("fixed_units", "days", "day_minutes", "day_units", "uniform")
+
+    def __init__(self, fixed_rate, windows):
+        """
+        `windows` maps each day type to (start, end, rate_per_minute) tuples,
+        with `start` and `end` in seconds since midnight. Raises ValueError
+        for overlapping windows.
+        """
+        day_types = {}
+        for day_type in DAY_TYPES:
+            starts, ends, units = [], [], []
+            for start, end, rate in sorted(windows.get(day_type, ())):
+                if not 0 <= start < end <= SECONDS_PER_DAY:
+                    raise ValueError(f"Invalid {day_type} rate window {start}-{end}.")
+                if ends and start * MICROSECONDS < ends[-1]:
+                    raise ValueError(f"Overlapping {day_type} rate windows.")
+                if rate:
+                    starts.append(start * MICROSECONDS)
+                    ends.append(end * MICROSECONDS)
+                    units.append(int(Decimal(rate) * RATE_SCALE))
+            day_types[day_type] = (tuple(starts), tuple(ends), tuple(units))
+
+        self.fixed_units = int(Decimal(fixed_rate) * RATE_SCALE)
+        self.days = tuple(day_types[day_type] for day_type in WEEKDAY_DAY_TYPES)
+        # Prices do not depend on the weekday when every day has the same windows
+        self.uniform = len(set(self.days)) == 1
+        full_days = [self._day_charge(weekday, 0, MICROSECONDS_PER_DAY) for weekday in range(7)]
+        self.day_minutes = tuple(minutes for minutes, _ in full_days)
+        self.day_units = tuple(units for _, units in full_days)
+
+    def _day_charge(self, weekday, start, end):
+        """
+        Return the billable minutes and cost, in ten-thousandths, of the
+        [start, end) microseconds since midnight of a day.
+        """
+        starts, ends, units = self.days[weekday]
+        minutes = cost = 0
+        index = bisect_right(ends, start)
+        while index < len(starts) and starts[index] < end:
+            window_minutes = (min(end, ends[index]) - max(start, starts[index])) // MICROSECONDS_PER_MINUTE
+            minutes += window_minutes
+            cost += window_minutes * units[index]
+            index += 1
+        return minutes, cost
+
+    def rate(self, start_time, end_time, current_tz=None):
+        """
+        Return the billable minutes and the price of a call. Naive datetimes
+        are taken in the current time zone, which callers pricing many calls
+        can look up once and pass as `current_tz`.
+
+        Prices only depend on the shape of a call in local time, its weekday,
+        offset from midnight and length, so they are memoized on that shape.
+        """
+        return _rate_shape(self, *self.shape(start_time, end_time, current_tz))
+
+    def shape(self, start_time, end_time, current_tz=None):
+        """
+        Return the (weekday, start, length) shape of a call in local time,
+        the arguments of `rate_shape`.
+        """
+        if current_tz is None:
+            current_tz = get_current_timezone()
+
+        # Make both start_time and end_time timezone-aware if they are not already
+        if start_time.tzinfo is None:
+            start_time = make_aware(start_time, current_tz)
+        if end_time.tzinfo is None:
+            end_time = make_aware(end_time, current_tz)
+
+        if end_time <= start_time:
+            return 0, 0, 0
+
+        start_time = start_time.astimezone(current_tz)
+        end_time = end_time.astimezone(current_tz)
+        start = _microseconds_since_midnight(start_time)
+        # Wall-clock length, which is what the windows of each local day see
+        length = (
+            (end_time.toordinal() - start_time.toordinal()) * MICROSECONDS_PER_DAY
+            + _microseconds_since_midnight(end_time) - start
+        )
+        weekday = 0 if self.uniform else start_time.weekday()
+        return weekday, start, max(length, 0)
+
+    def rate_shape(self, weekday, start, length):
+        """
+        Return the billable minutes and the price of a call starting on
+        `weekday` at `start` microseconds since midnight and lasting `length`
+        microseconds of wall-clock time.
+        """
+        end = start + length
+        end_days, end = divmod(end, MICROSECONDS_PER_DAY)
+
+        if not end_days:
+            minutes, cost = self._day_charge(weekday, start, end)
+        else:
+            minutes, cost = self._day_charge(weekday, start, MICROSECONDS_PER_DAY)
+            last_minutes, last_cost = self._day_charge((weekday + end_days) % 7, 0, end)
+            minutes += last_minutes
+            cost += last_cost
+
+            # Full days in between, a week at a time
+            weeks, days = divmod(end_days - 1, 7)
+            minutes += weeks * sum(self.day_minutes)
+            cost += weeks * sum(self.day_units)
+            for offset in range(1, days + 1):
+                minutes += self.day_minutes[(weekday + offset) % 7]
+                cost += self.day_units[(weekday + offset) % 7]
+
+        price = (Decimal(self.fixed_units + cost) / RATE_SCALE).quantize(CENT, rounding=ROUND_HALF_UP)
+        return minutes, price
+
+    def _day_charges(self, weekdays, starts, ends):
+        """
+        Return the billable minutes and costs, in ten-thousandths, of the
+        [starts, ends) microseconds since midnight of days on `weekdays`, as
+        arrays.
+        """
+        minutes = np.zeros(len(weekdays), dtype=np.int64)
+        costs = np.zeros(len(weekdays), dtype=np.int64)
+        for weekday, (window_starts, window_ends, window_units) in enumerate(self.days[:1] if self.uniform else self.days):
+            # Every day has the same windows in a uniform tariff
+            on_weekday = True if self.uniform else weekdays == weekday
+            for window_start, window_end, units in zip(window_starts, window_ends, window_units):
+                overlap = np.minimum(ends, window_end) - np.maximum(starts, window_start)
+                window_minutes = np.where(on_weekday, np.maximum(overlap, 0) // MICROSECONDS_PER_MINUTE, 0)
+                minutes += window_minutes
+                costs += window_minutes * units
+        return minutes, costs
+
+    def rate_shapes(self, weekdays, starts, lengths):
+        """
+        Return the billable minutes and the prices, in integer cents, of
+        calls given as arrays of the arguments of `rate_shape`. The windows
+        are applied to all the calls at once with NumPy array arithmetic.
+        """
+        weekdays = np.asarray(weekdays, dtype=np.int64)
+        starts = np.asarray(starts, dtype=np.int64)
+        end_days, ends = np.divmod(starts + np.asarray(lengths, dtype=np.int64), MICROSECONDS_PER_DAY)
+
+        # The first day up to the end of the call or of the day, and the
+        # last day from midnight for calls that end on another day
+        minutes, costs = self._day_charges(weekdays, starts, np.where(end_days, MICROSECONDS_PER_DAY, ends))
+        last_minutes, last_costs = self._day_charges(
+            (weekdays + end_days) % 7, np.zeros_like(starts), np.where(end_days, ends, 0)
+        )
+        minutes += last_minutes
+        costs += last_costs
+
+        # Full days in between, a week at a time and the remaining days
+        # from sums of the charges of consecutive days over two weeks
+        weeks, days = np.divmod(np.maximum(end_days - 1, 0), 7)
+        day_minutes = np.cumsum((0,) + self.day_minutes * 2)
+        day_units = np.cumsum((0,) + self.day_units * 2)
+        minutes += weeks * day_minutes[7] + day_minutes[weekdays + days + 1] - day_minutes[weekdays + 1]
+        costs += weeks * day_units[7] + day_units[weekdays + days + 1] - day_units[weekdays + 1]
+
+        # Half a cent and up rounds up, like the ROUND_HALF_UP of `rate_shape`
+        cents = (self.fixed_units + costs + CENT_UNITS // 2) // CENT_UNITS
+        return minutes, cents
+
+
+# Distinct call shapes whose price is kept, across all tariffs
+PRICE_CACHE_SIZE = 65_536
+
+
+@lru_cache(maxsize=PRICE_CACHE_SIZE)
+def _rate_shape(tariff, weekday, start, length):
+    return tariff.rate_shape(weekday, start, length)
+
+
+def price_cache_stats():
+    """
+    Return the hit and miss counts and the size of the price memoization.
+    """
+    info = _rate_shape.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+def clear_price_cache():
+    _rate_shape.cache_clear()
+
+
+def _microseconds_since_midnight(moment):
+    return ((moment.hour * 60 + moment.minute) * 60 + moment.second) * MICROSECONDS + moment.microsecond
+
+
+def _time_seconds(moment):
+    return moment.hour * 3600 + moment.minute * 60
+
+
+# The built-in tariff, used when no tariff version applies
+STANDARD_TARIFF = CompiledTariff(FIXED_RATE, {
+    day_type: [(_time_seconds(STANDARD_TARIFF_START), _time_seconds(STANDARD_TARIFF_END), RATE_PER_MINUTE)]
+    for day_type in DAY_TYPES
+})
+
+
+def calculate_billable_minutes(start_time, end_time, tariff=STANDARD_TARIFF):
+    """
+    Calculate the number of minutes of a call charged at a per-minute rate.
+    """
+    return tariff.rate(start_time, end_time)[0]
+
+
+def calculate_call_price(start_time, end_time, tariff=STANDARD_TARIFF):
     """
     Calculate the price of a call based on start and end times.
     Ensures that all datetime objects are timezone-aware.
     """
-    current_tz = get_current_timezone()
+    return tariff.rate(start_time, end_time)[1]
 
-    # Make both start_time and end_time timezone-aware if they are not already
-    if start_time.tzinfo is None:
-        start_time = make_aware(start_time, current_tz)
-    if end_time.tzinfo is None:
-        end_time = make_aware(end_time, current_tz)
-
-    fixed_rate = Decimal('0.36')
-    rate_per_minute = Decimal('0.09')
-    total_price = fixed_rate
-    total_billable_minutes = 0
-
-    current_time = start_time
-
-    while current_time < end_time:
-        if time(6, 0) <= current_time.time() < time(22, 0):
-            # Calculate the end of the standard tariff period
-            end_of_standard_tariff = datetime.combine(
-                current_time.date(), time(22, 0)
-            ).astimezone(current_tz)
-            period_end = min(end_of_standard_tariff, end_time)
-            duration_seconds = (period_end - current_time).total_seconds()
-            minutes = int(duration_seconds // 60)
-            total_billable_minutes += minutes
-            current_time = period_end
-        else:
-            # Calculate the start of the next standard tariff period
-            if current_time.time() >= time(22, 0):
-                next_standard_tariff = datetime.combine(
-                    current_time.date() + timedelta(days=1), time(6, 0)
-                ).astimezone(current_tz)
-            else:
-                next_standard_tariff = datetime.combine(
-                    current_time.date(), time(6, 0)
-                ).astimezone(current_tz)
-            current_time = min(next_standard_tariff, end_time)
-
-    total_price += total_billable_minutes * rate_per_minute
-    total_price = total_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-    return total_price
+
+def calculate_call_prices(start_times, end_times, tariff=STANDARD_TARIFF):
+    """
+    Calculate the prices of many calls at once, in integer cents, equal to
+    `calculate_call_price` of each (start_time, end_time) pair.
+
+    Only the local-time shape of each call is computed per call; the
+    tariff windows are then applied to all of them with NumPy array
+    arithmetic, so re-rating jobs can price a whole period in one pass.
+    """
+    current_tz = get_current_timezone()
+    shapes = [tariff.shape(start_time, end_time, current_tz) for start_time, end_time in zip(start_times, end_times)]
+    weekdays, starts, lengths = np.array(shapes, dtype=np.int64).reshape(-1, 3).T
+    return tariff.rate_shapes(weekdays, starts, lengths)[1]
 
 
 def format_duration(duration):
@@ -56,4 +276,4 @@ def format_duration(duration):
     hours = total_seconds // 3600
     minutes = (total_seconds % 3600) // 60
     seconds = total_seconds % 60
-    return f"{hours}h{minutes}m{seconds}s"
\ No newline at end of file
+    return f"{hours}h{minutes}m{seconds}s"
@@ -1,36 +1,212 @@
+import json
+
+from asgiref.sync import sync_to_async
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.utils.timezone import make_aware, get_current_timezone
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.timezone import localdate
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from datetime import datetime, timedelta
+from decimal import Decimal
+from datetime import datetime
 
-from .models import CallRecord
-from .utils import calculate_call_price, format_duration
-from .serializers import CallRecordSerializer, PhoneBillSerializer
+from .bills import (
+    MAX_STATEMENT_PERIODS,
+    bill_reads,
+    get_batch_bill_calls,
+    get_bill_calls,
+    get_statement_calls,
+    parse_period,
+    period_total_data,
+)
+from .cache import RECENTLY_WRITTEN, cache_bill, get_cached_bill, invalidate_bills
+from .exports import stream_csv, stream_ndjson
+from .ingest import BufferFull, get_ingest_buffer, validate_rows, write_batch
+from .instrumentation import registry, timed
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, paginate_bill_calls
+from .parsers import NDJSONParser
+from .reaper import quarantine_counts
+from .routers import reading_from_primary
+from .serializers import (
+    CallRecordListSerializer,
+    CallRecordSerializer,
+    PeriodTotalSerializer,
+    PhoneBillBatchRequestSerializer,
+    PhoneBillBatchSerializer,
+    PhoneBillPageSerializer,
+    PhoneBillStatementSerializer,
+    phone_bill_representation,
+    statement_representation,
+)
+from .utils import price_cache_stats
 
 
 class CallRecordView(APIView):
     """
     View to create call records (start and end).
+
+    A JSON array or an NDJSON body creates a batch of records at once.
     """
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser]
+    max_batch_size = 5000
+
     @swagger_auto_schema(
-        operation_description="Create a call record (start or end).",
+        operation_description=(
+            "Create a call record (start or end), or a batch of records "
+            "when the body is a JSON array or NDJSON."
+        ),
         request_body=CallRecordSerializer,
         responses={
             201: CallRecordSerializer,
+            207: "Batch partially created, with errors per item.",
             400: "Invalid data provided.",
+            409: "Batch conflicts with concurrently created records.",
         },
     )
     def post(self, request):
+        if isinstance(request.data, list):
+            return self.create_batch(request.data)
+
         serializer = CallRecordSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        with timed("serialization"):
+            is_valid = serializer.is_valid()
+        if is_valid:
+            try:
+                with transaction.atomic():
+                    record = serializer.save()
+            except IntegrityError:
+                # Created concurrently after the serializer checked it
+                return Response(
+                    {api_settings.NON_FIELD_ERRORS_KEY: [CallRecordListSerializer.duplicate_message]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            invalidate_bills([record])
+            with timed("serialization"):
+                data = serializer.data
+            return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def create_batch(self, data):
+        serializer = CallRecordSerializer(data=data, many=True, max_length=self.max_batch_size)
+        with timed("serialization"):
+            is_valid = serializer.is_valid()
+        if not is_valid:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created = serializer.save()
+        except IntegrityError:
+            return Response(
+                {"error": "Call records were created concurrently. Retry the batch."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        invalidate_bills(created)
+
+        errors = [
+            {"index": index, "errors": item_errors}
+            for index, item_errors in enumerate(serializer.item_errors)
+            if item_errors
+        ]
+
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+
+        return Response(
+            {"created": len(created), "errors": errors},
+            status=response_status,
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class CallRecordIngestView(View):
+    """
+    Asynchronous view to ingest call records through a write-behind buffer.
+
+    Records are acknowledged with 202 once they are in the write-ahead log
+    and written to the database in batches by a background task. The buffer
+    needs an ASGI server; under WSGI the records are written before the
+    response.
+    """
+    max_batch_size = 5000
+
+    async def post(self, request):
+        try:
+            authenticated = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed as exc:
+            authenticated = None
+            detail = exc.detail
+        else:
+            detail = "Authentication credentials were not provided."
+        if authenticated is None:
+            return JsonResponse({"detail": detail}, status=status.HTTP_401_UNAUTHORIZED)
+
+        rows = self.parse(request)
+        if rows is None:
+            return JsonResponse({"error": "Invalid JSON."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_batch_size:
+            return JsonResponse(
+                {"error": f"Ensure this field has no more than {self.max_batch_size} elements."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        records, item_errors = validate_rows(rows)
+        errors = [
+            {"index": index, "errors": row_errors}
+            for index, row_errors in enumerate(item_errors)
+            if row_errors
+        ]
+
+        if not records:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif not isinstance(request, ASGIRequest):
+            await sync_to_async(write_batch)(records)
+            response_status = status.HTTP_201_CREATED
+        else:
+            buffer = await get_ingest_buffer()
+            try:
+                await buffer.put(records)
+            except BufferFull:
+                response = JsonResponse(
+                    {"error": "The ingest buffer is full. Retry later."},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+                response["Retry-After"] = "1"
+                return response
+            response_status = status.HTTP_202_ACCEPTED
+
+        if errors and records:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return JsonResponse({"accepted": len(records), "errors": errors}, status=response_status)
+
+    def parse(self, request):
+        """
+        Return the CDR rows of a JSON object, a JSON array or an NDJSON body,
+        or None if the body cannot be parsed.
+        """
+        try:
+            body = request.body.decode("utf-8")
+            if request.content_type == NDJSONParser.media_type:
+                return [json.loads(line) for line in body.splitlines() if line.strip()]
+            data = json.loads(body)
+        except ValueError:
+            return None
+        return data if isinstance(data, list) else [data]
+
 
 class PhoneBillView(APIView):
     """
@@ -54,9 +230,34 @@ class PhoneBillView(APIView):
                 type=openapi.TYPE_STRING,
                 required=False,
             ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description=(
+                    "Number of calls per page. Paginates the calls by start time, "
+                    f"up to {MAX_PAGE_SIZE} per page."
+                ),
+                type=openapi.TYPE_INTEGER,
+                required=False,
+            ),
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="The next_cursor returned by the previous page.",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+            openapi.Parameter(
+                'export',
+                openapi.IN_QUERY,
+                description="Stream the calls as 'ndjson' or 'csv' instead of a JSON bill.",
+                type=openapi.TYPE_STRING,
+                enum=["ndjson", "csv"],
+                required=False,
+            ),
         ],
         responses={
-            200: PhoneBillSerializer,
+            200: PhoneBillPageSerializer,
             400: "Bad request or invalid parameters.",
         },
     )
@@ -70,79 +271,292 @@ class PhoneBillView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Determine the period
-        if period:
-            try:
-                period_start = datetime.strptime(period, "%Y-%m").date()
-            except ValueError:
-                return Response(
-                    {"error": "Invalid period format. Use YYYY-MM."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        try:
+            period_start = parse_period(period)
+        except ValidationError as error:
+            return Response({"error": error.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        with bill_reads(period_start):
+            return self.bill(request, phone_number, period_start)
+
+    def bill(self, request, phone_number, period_start):
+        export = request.query_params.get("export")
+        if export:
+            return self.export(export, phone_number, period_start)
+
+        cursor = request.query_params.get("cursor")
+        page_size = request.query_params.get("page_size")
+        if cursor or page_size:
+            return self.paginate(phone_number, period_start, cursor, page_size)
+
+        cached_bill = get_cached_bill(phone_number, period_start)
+        if cached_bill == RECENTLY_WRITTEN:
+            # The replica may not have the write yet, and a bill read from it
+            # must not be cached
+            with reading_from_primary():
+                data = self.bill_data(phone_number, period_start)
+            return Response(data, status=status.HTTP_200_OK)
+        if cached_bill is not None:
+            return Response(cached_bill, status=status.HTTP_200_OK)
+
+        data = self.bill_data(phone_number, period_start)
+        cache_bill(phone_number, period_start, data)
+        return Response(data, status=status.HTTP_200_OK)
+
+    def bill_data(self, phone_number, period_start):
+        # Closed periods are immutable and served from the materialized bill
+        bill_calls = get_bill_calls(phone_number, period_start, running_total=False)
+        rows = list(bill_calls.rows)
+        total_price = bill_calls.total_price
+        if total_price is None:
+            total_price = sum((row[-1] for row in rows), Decimal("0.00"))
+
+        with timed("serialization"):
+            return phone_bill_representation(phone_number, period_start, rows, total_price)
+
+    def paginate(self, phone_number, period_start, cursor, page_size):
+        try:
+            page_size = int(page_size or DEFAULT_PAGE_SIZE)
+        except ValueError:
+            page_size = 0
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            return Response(
+                {"error": f"Invalid page size. Use a number from 1 to {MAX_PAGE_SIZE}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            rows, total_price, next_cursor = paginate_bill_calls(
+                get_bill_calls(phone_number, period_start),
+                phone_number,
+                period_start,
+                cursor,
+                page_size,
+            )
+        except InvalidCursor:
+            return Response(
+                {"error": "Invalid cursor."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with timed("serialization"):
+            data = phone_bill_representation(phone_number, period_start, rows, total_price)
+        data["next_cursor"] = next_cursor
+        return Response(data, status=status.HTTP_200_OK)
+
+    def export(self, export, phone_number, period_start):
+        bill_calls = get_bill_calls(phone_number, period_start)
+        if not isinstance(bill_calls.rows, list):
+            # The rows are streamed after the view returns, so they are
+            # bound to the database the bill is read from now
+            bill_calls = bill_calls._replace(rows=bill_calls.rows.using(bill_calls.rows.db))
+        filename = f"{phone_number}-{period_start:%Y-%m}"
+
+        if export == "ndjson":
+            response = StreamingHttpResponse(
+                stream_ndjson(bill_calls, phone_number, period_start),
+                content_type="application/x-ndjson",
+            )
+        elif export == "csv":
+            response = StreamingHttpResponse(stream_csv(bill_calls), content_type="text/csv")
         else:
-            today = datetime.today()
-            period_start = (today.replace(day=1) - timedelta(days=1)).replace(day=1).date()
-
-        # Add timezone awareness
-        current_tz = get_current_timezone()
-        period_start = make_aware(datetime.combine(period_start, datetime.min.time()), current_tz)
-        period_end = make_aware(datetime.combine(
-            (period_start + timedelta(days=31)).replace(day=1), datetime.min.time()
-        ), current_tz)
-
-        # Fetch all end call records that ended in the period
-        end_records = CallRecord.objects.filter(
-            type="end",
-            timestamp__gte=period_start,
-            timestamp__lt=period_end,
-        )
+            return Response(
+                {"error": "Invalid export format. Use ndjson or csv."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        response["Content-Disposition"] = f'attachment; filename="{filename}.{export}"'
+        return response
+
+
+class PhoneBillBatchView(APIView):
+    """
+    View to retrieve the phone bills of many phone numbers for the same
+    billing period at once.
+    """
+    @swagger_auto_schema(
+        operation_description=(
+            "Retrieve the phone bill of each of a list of phone numbers for a period, "
+            "in the order of the list. The bills are read in a fixed number of queries."
+        ),
+        request_body=PhoneBillBatchRequestSerializer,
+        responses={
+            200: PhoneBillBatchSerializer,
+            400: "Bad request or invalid parameters.",
+        },
+    )
+    def post(self, request):
+        serializer = PhoneBillBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        phone_numbers = list(dict.fromkeys(serializer.validated_data["phone_numbers"]))
+        period = serializer.validated_data.get("period")
+
+        try:
+            period_start = parse_period(period)
+        except ValidationError as error:
+            return Response({"error": error.message}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_price = 0
-        call_details = []
-
-        for end_record in end_records:
-            # Find the corresponding start record
-            start_record = CallRecord.objects.filter(
-                type="start",
-                call_id=end_record.call_id,
-            ).first()
-
-            if not start_record:
-                continue  # Skip if no start record
-
-            # Ensure the call was made by the phone_number
-            if start_record.source != phone_number:
-                continue
-
-            start_time = start_record.timestamp
-            end_time = end_record.timestamp
-
-            # Ensure start_time and end_time are aware
-            if start_time.tzinfo is None:
-                start_time = make_aware(start_time, current_tz)
-            if end_time.tzinfo is None:
-                end_time = make_aware(end_time, current_tz)
-
-            duration = end_time - start_time
-            price = calculate_call_price(start_time, end_time)
-            duration_str = format_duration(duration)
-
-            call_details.append({
-                "destination": start_record.destination,
-                "call_start_date": start_time.date(),
-                "call_start_time": start_time.time(),
-                "duration": duration_str,
-                "price": f"R$ {price:.2f}",
-            })
-
-            total_price += price
-
-        phone_bill = {
-            "phone_number": phone_number,
-            "period": period_start.strftime("%Y-%m"),
-            "total_price": f"R$ {total_price:.2f}",
-            "call_records": call_details,
-        }
-
-        serializer = PhoneBillSerializer(phone_bill)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        with bill_reads(period_start):
+            bills = get_batch_bill_calls(phone_numbers, period_start)
+        with timed("serialization"):
+            data = {
+                "bills": [
+                    phone_bill_representation(phone_number, period_start, *bills[phone_number])
+                    for phone_number in phone_numbers
+                ],
+            }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class PhoneBillStatementView(APIView):
+    """
+    View to retrieve the calls of a phone number over a range of billing
+    periods, with the subtotal of each period.
+    """
+    @swagger_auto_schema(
+        operation_description=(
+            "Retrieve the calls and subtotals of a phone number for every period "
+            f"from one period to another, up to {MAX_STATEMENT_PERIODS} periods."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'phone_number',
+                openapi.IN_QUERY,
+                description="Phone number to fetch the statement for.",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                'from',
+                openapi.IN_QUERY,
+                description="First billing period in YYYY-MM format.",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                'to',
+                openapi.IN_QUERY,
+                description="Last billing period in YYYY-MM format.",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+        ],
+        responses={
+            200: PhoneBillStatementSerializer,
+            400: "Bad request or invalid parameters.",
+        },
+    )
+    def get(self, request):
+        phone_number = request.query_params.get("phone_number")
+
+        if not phone_number:
+            return Response(
+                {"error": "Phone number is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            first_period = datetime.strptime(request.query_params.get("from", ""), "%Y-%m").date()
+            last_period = datetime.strptime(request.query_params.get("to", ""), "%Y-%m").date()
+        except ValueError:
+            return Response(
+                {"error": "Invalid period format. Use from and to in YYYY-MM format."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if first_period > last_period:
+            return Response(
+                {"error": "The from period must not be after the to period."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        period_count = (last_period.year - first_period.year) * 12 + last_period.month - first_period.month + 1
+        if period_count > MAX_STATEMENT_PERIODS:
+            return Response(
+                {"error": f"A statement covers at most {MAX_STATEMENT_PERIODS} periods."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with bill_reads(last_period):
+            periods = get_statement_calls(phone_number, first_period, last_period)
+        with timed("serialization"):
+            data = statement_representation(phone_number, periods)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class PhoneBillTotalsView(APIView):
+    """
+    View to retrieve the running totals of a phone number in a billing
+    period without reading its calls.
+    """
+    @swagger_auto_schema(
+        operation_description=(
+            "Retrieve the call count, billable minutes and total price of a "
+            "phone number in a period, month to date for the current period."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'phone_number',
+                openapi.IN_QUERY,
+                description="Phone number to fetch the totals for.",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                'period',
+                openapi.IN_QUERY,
+                description="Billing period in YYYY-MM format. Defaults to the current month.",
+                type=openapi.TYPE_STRING,
+                required=False,
+            ),
+        ],
+        responses={
+            200: PeriodTotalSerializer,
+            400: "Bad request or invalid parameters.",
+        },
+    )
+    def get(self, request):
+        phone_number = request.query_params.get("phone_number")
+        period = request.query_params.get("period")
+
+        if not phone_number:
+            return Response(
+                {"error": "Phone number is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            period_start = parse_period(period, default=localdate().replace(day=1))
+        except ValidationError as error:
+            return Response({"error": error.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        with bill_reads(period_start):
+            serializer = PeriodTotalSerializer(period_total_data(phone_number, period_start))
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    View to retrieve the request metrics aggregated per instrumented view
+    since the process started.
+    """
+    @swagger_auto_schema(
+        operation_description=(
+            "Retrieve, per instrumented view, the request count, query count, "
+            "seconds spent in total, in the database, pricing and serializing, "
+            "and a cumulative latency histogram in milliseconds, along with the "
+            "hits and misses of the price memoization and the number of "
+            "quarantined call records by type."
+        ),
+        responses={200: "Metrics per view, price memoization and quarantine statistics."},
+    )
+    def get(self, request):
+        return Response(
+            {
+                "views": registry.snapshot(),
+                "pricing_cache": price_cache_stats(),
+                "quarantine": quarantine_counts(),
+            },
+            status=status.HTTP_200_OK,
+        )
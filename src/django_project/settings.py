@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'billing.middleware.BillingInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -94,9 +95,85 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASSWORD"),
         "HOST": os.environ.get("DB_HOST"),
         "PORT": os.environ.get("DB_PORT"),
+        # Seconds a connection is reused across requests, 0 to close it at
+        # the end of each request. Connections are checked before reuse.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": str(os.environ.get("DB_CONN_HEALTH_CHECKS", "1")) == "1",
     }
 }
 
+# Connection pool of the PostgreSQL backend, which needs psycopg 3 with
+# psycopg-pool. Pooled connections go back to the pool at the end of each
+# request, so the pool replaces persistent connections.
+if os.environ.get("DB_POOL_MAX_SIZE"):
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ["DB_POOL_MAX_SIZE"]),
+            # Seconds a request waits for a free connection
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        },
+    }
+
+# Read replica of the primary. Bill and report reads of closed periods are
+# routed to it, while ingestion and the reads of open periods stay on the
+# primary.
+if os.environ.get("DB_REPLICA_HOST") or os.environ.get("DB_REPLICA_NAME"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.environ.get("DB_REPLICA_NAME", DATABASES["default"]["NAME"]),
+        "HOST": os.environ.get("DB_REPLICA_HOST", DATABASES["default"]["HOST"]),
+        "PORT": os.environ.get("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+    }
+
+BILLING_REPLICA_ALIAS = "replica"
+# Seconds the replica may lag behind: a bill changed by a write is read
+# from the primary for that long
+BILLING_REPLICA_LAG_SECONDS = int(os.environ.get("DB_REPLICA_MAX_LAG", 30))
+DATABASE_ROUTERS = ["billing.routers.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Serialized phone bills, e.g. FileBasedCache or DatabaseCache outside tests
+    "bills": {
+        "BACKEND": os.environ.get("BILL_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("BILL_CACHE_LOCATION", "phone-bills"),
+        "TIMEOUT": int(os.environ.get("BILL_CACHE_TIMEOUT", 24 * 60 * 60)),
+    },
+}
+
+BILL_CACHE_ALIAS = "bills"
+
+# URL names of the views whose query count, DB time, pricing time and
+# serialization time are reported in a Server-Timing header and aggregated
+# at /api/metrics/
+BILLING_INSTRUMENTED_VIEWS = [
+    "call-records",
+    "call-records-ingest",
+    "phone-bills",
+    "phone-bill-batch",
+    "phone-bill-statement",
+]
+
+# Write-behind buffer of the asynchronous ingest view: directory of the
+# write-ahead logs, maximum number of buffered records, records written per
+# batch and attempts to write a batch before it goes to the dead-letter file
+INGEST_WAL_DIR = os.environ.get("INGEST_WAL_DIR", os.path.join(BASE_DIR, "ingest-wal"))
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 50_000))
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 1000))
+INGEST_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", 5))
+
+# Directory of the archived billing periods, one subdirectory of column
+# files per period
+BILLING_ARCHIVE_DIR = os.environ.get("BILLING_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
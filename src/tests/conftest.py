@@ -0,0 +1,63 @@
+import pytest
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth.models import User
+
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from billing.archive import open_archived_period
+from billing.models import CallRecord
+from billing.tariffs import clear_tariff_cache
+
+
+def pytest_configure(config):
+    # Without a replica configured with DB_REPLICA_NAME or DB_REPLICA_HOST,
+    # the router tests get a second test database on the primary's server
+    # (SQLite test databases are in memory, one per alias)
+    if "replica" in settings.DATABASES:
+        return
+    default = settings.DATABASES["default"]
+    replica = {**default}
+    if default["ENGINE"] != "django.db.backends.sqlite3":
+        replica["TEST"] = {**default["TEST"], "NAME": f"test_{default['NAME']}_replica"}
+    settings.DATABASES["replica"] = replica
+
+
+@pytest.fixture(autouse=True)
+def read_from_primary(settings):
+    # Tests only read from the replica when they ask for the replica fixture
+    settings.BILLING_REPLICA_ALIAS = None
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    yield
+    for cache in caches.all():
+        cache.clear()
+    clear_tariff_cache()
+    open_archived_period.cache_clear()
+
+
+@pytest.fixture
+def api_client():
+    client = APIClient()
+    user = User.objects.create_user(username="testuser", password="password123")
+    refresh = RefreshToken.for_user(user)
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+    return client
+
+
+@pytest.fixture
+def create_call(db):
+    def create(call_id, source, start, end):
+        CallRecord.objects.create(
+            call_id=call_id,
+            type='start',
+            timestamp=start,
+            source=source,
+            destination='11912345678',
+        )
+        CallRecord.objects.create(call_id=call_id, type='end', timestamp=end)
+    return create
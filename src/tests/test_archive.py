@@ -0,0 +1,154 @@
+import os
+import pytest
+
+from decimal import Decimal
+from datetime import date
+from django.urls import reverse
+from django.db.models import Sum
+from django.core.management import call_command
+
+from rest_framework import status
+
+from billing.archive import (
+    ARCHIVE_FIELDS,
+    ArchiveError,
+    archive_path,
+    call_columns,
+    is_archived,
+    verify_archive,
+    write_archive,
+)
+from billing.bills import archive_period, close_period
+from billing.cache import get_bill_cache
+from billing.models import CallRecord, CompletedCall, PhoneBill
+
+
+@pytest.fixture
+def archive_dir(settings, tmp_path):
+    settings.BILLING_ARCHIVE_DIR = str(tmp_path / 'archive')
+    return tmp_path / 'archive'
+
+
+@pytest.fixture
+def october_calls(db, create_call):
+    # The first call starts in September and is billed in October
+    create_call('1', '11987654321', '2023-09-30T23:55:00Z', '2023-10-01T00:10:00Z')
+    create_call('2', '11987654321', '2023-10-11T21:57:13Z', '2023-10-11T22:17:53Z')
+    create_call('3', '11987654321', '2023-10-11T21:57:13Z', '2023-10-11T21:59:00Z')
+    create_call('4', '11987654322', '2023-10-12T08:00:00Z', '2023-10-12T08:03:00Z')
+    create_call('5', '11987654321', '2023-11-01T08:00:00Z', '2023-11-01T08:03:00Z')
+
+
+def get_bill(api_client, params):
+    response = api_client.get(reverse('phone-bills'), {'phone_number': '11987654321', 'period': '2023-10', **params})
+    assert response.status_code == status.HTTP_200_OK
+    return response
+
+
+def get_pages(api_client):
+    params = {'page_size': 2}
+    pages = []
+    while True:
+        data = get_bill(api_client, params).data
+        pages.append(data)
+        if data['next_cursor'] is None:
+            return pages
+        params['cursor'] = data['next_cursor']
+
+
+@pytest.mark.django_db
+def test_archived_period_is_billed_from_the_archive(api_client, archive_dir, october_calls):
+    close_period(date(2023, 10, 1))
+    bill = get_bill(api_client, {}).json()
+    csv_export = b''.join(get_bill(api_client, {'export': 'csv'}).streaming_content)
+    page_calls = [page['call_records'] for page in get_pages(api_client)]
+
+    assert archive_period(date(2023, 10, 1)) == 4
+    assert is_archived(date(2023, 10, 1))
+
+    assert set(CallRecord.objects.values_list('call_id', flat=True)) == {'5'}
+    assert list(CompletedCall.objects.values_list('call_id', flat=True)) == ['5']
+    assert not PhoneBill.objects.exists()
+
+    get_bill_cache().clear()
+    assert get_bill(api_client, {}).json() == bill
+    assert b''.join(get_bill(api_client, {'export': 'csv'}).streaming_content) == csv_export
+    pages = get_pages(api_client)
+    assert [page['call_records'] for page in pages] == page_calls
+    assert {page['total_price'] for page in pages} == {bill['total_price']}
+
+    response = api_client.get(reverse('phone-bills'), {'phone_number': '11900000000', 'period': '2023-10'})
+    assert response.data['call_records'] == []
+    assert response.data['total_price'] == 'R$ 0.00'
+
+
+@pytest.mark.django_db
+def test_archive_keeps_null_and_empty_destinations(api_client, archive_dir, october_calls):
+    CallRecord.objects.create(call_id='6', type='start', timestamp='2023-10-13T08:00:00Z', source='11987654321')
+    CallRecord.objects.create(call_id='6', type='end', timestamp='2023-10-13T08:01:00Z')
+    CallRecord.objects.create(
+        call_id='7', type='start', timestamp='2023-10-14T08:00:00Z', source='11987654321', destination='',
+    )
+    CallRecord.objects.create(call_id='7', type='end', timestamp='2023-10-14T08:01:00Z')
+    close_period(date(2023, 10, 1))
+    bill = get_bill(api_client, {}).json()
+    assert [call['destination'] for call in bill['call_records']][-2:] == [None, '']
+
+    archive_period(date(2023, 10, 1))
+    get_bill_cache().clear()
+
+    assert get_bill(api_client, {}).json() == bill
+
+
+@pytest.mark.django_db
+def test_archived_period_batch_and_statement_bills(api_client, archive_dir, october_calls):
+    close_period(date(2023, 10, 1))
+    batch_request = {'phone_numbers': ['11987654321', '11987654322', '11900000000'], 'period': '2023-10'}
+    statement_params = {'phone_number': '11987654321', 'from': '2023-09', 'to': '2023-11'}
+    batch = api_client.post(reverse('phone-bill-batch'), batch_request, format='json').json()
+    statement = api_client.get(reverse('phone-bill-statement'), statement_params).json()
+    assert [bill['total_price'] for bill in batch['bills']] == ['R$ 1.35', 'R$ 0.63', 'R$ 0.00']
+    assert [len(period['call_records']) for period in statement['periods']] == [0, 3, 1]
+
+    archive_period(date(2023, 10, 1))
+    get_bill_cache().clear()
+
+    response = api_client.post(reverse('phone-bill-batch'), batch_request, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == batch
+
+    response = api_client.get(reverse('phone-bill-statement'), statement_params)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == statement
+
+
+@pytest.mark.django_db
+def test_archive_period_is_verified_before_rows_are_deleted(archive_dir, october_calls):
+    with pytest.raises(ArchiveError):
+        archive_period(date(2099, 1, 1))
+
+    # A run interrupted after writing the archive
+    directory = archive_path(date(2023, 10, 1))
+    calls = CompletedCall.objects.exclude(call_id='5')
+    archive_dir.mkdir()
+    write_archive(directory, date(2023, 10, 1), call_columns(calls.values_list(*ARCHIVE_FIELDS)))
+    assert Decimal(verify_archive(directory)['total_price']) == calls.aggregate(total=Sum('price'))['total']
+
+    with open(os.path.join(directory, 'price.npy'), 'r+b') as price_file:
+        price_file.seek(-1, os.SEEK_END)
+        price_file.write(b'\x7f')
+
+    with pytest.raises(ArchiveError, match='checksum mismatch'):
+        archive_period(date(2023, 10, 1))
+    assert CompletedCall.objects.count() == 5
+    assert CallRecord.objects.count() == 10
+
+
+@pytest.mark.django_db
+def test_archive_billing_period_command(archive_dir, october_calls, capsys):
+    call_command('archive_billing_period', period='2023-10')
+    assert 'Archived period 2023-10: 4 calls' in capsys.readouterr().out
+
+    call_command('archive_billing_period', period='2023-10')
+    assert 'Archived period 2023-10: 4 calls' in capsys.readouterr().out
+    assert CompletedCall.objects.count() == 1
@@ -0,0 +1,144 @@
+import io
+import json
+import pytest
+
+from datetime import date, timedelta
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from billing.benchmarks.generator import DEFAULT_PERIOD_START, generate_call_records
+from billing.benchmarks.load import call_record_payloads, latency_summary
+from billing.benchmarks.suite import bench_calculate_call_price, compare_to_baseline
+from billing.cache import cache_bill, get_cached_bill
+from billing.models import CallRecord
+from billing.utils import STANDARD_TARIFF, clear_price_cache, price_cache_stats
+
+
+@pytest.mark.django_db
+def test_benchmark_indexes_reports_plans_and_rolls_back(tmp_path):
+    output = tmp_path / 'indexes.json'
+    stdout = io.StringIO()
+
+    call_command(
+        'benchmark_indexes',
+        rows=4000,
+        subscribers=100,
+        repeat=1,
+        compare=True,
+        output=str(output),
+        stdout=stdout,
+    )
+
+    results = json.loads(output.read_text())
+    assert set(results) == {'current', 'legacy'}
+    assert set(results['current']) == {'pair_lookup', 'rerate_end_records', 'unmatched_records'}
+    assert all(result['plan'] for result in results['legacy'].values())
+    assert CallRecord.objects.count() == 0
+
+
+def test_generate_call_records_workload_mix():
+    records = list(generate_call_records(
+        subscribers=10,
+        calls_per_subscriber=100,
+        period_start=DEFAULT_PERIOD_START,
+        night_ratio=0.5,
+        outlier_ratio=0.1,
+    ))
+    start_records, end_records = records[::2], records[1::2]
+
+    assert len(start_records) == 1000
+    assert {record.type for record in start_records} == {'start'}
+    assert all(start.call_id == end.call_id for start, end in zip(start_records, end_records))
+
+    night_calls = sum(1 for record in start_records if not 6 <= record.timestamp.hour < 22)
+    outliers = sum(
+        1 for start, end in zip(start_records, end_records)
+        if end.timestamp - start.timestamp >= timedelta(days=1)
+    )
+    assert 400 < night_calls < 600
+    assert 50 < outliers < 150
+
+
+def test_calculate_call_price_benchmark_prices_every_repeat_cold():
+    records = list(generate_call_records(
+        seed=0,
+        subscribers=10,
+        calls_per_subscriber=20,
+        period_start=DEFAULT_PERIOD_START,
+    ))
+    intervals = [(start.timestamp, end.timestamp) for start, end in zip(records[::2], records[1::2])]
+    shapes = len({STANDARD_TARIFF.shape(start_time, end_time) for start_time, end_time in intervals})
+    clear_price_cache()
+
+    results = bench_calculate_call_price(intervals, repeat=3)
+
+    # The last repeat started from an empty memoization: its cold pass
+    # missed once per shape, and its warm pass hit on every call
+    stats = price_cache_stats()
+    assert stats['misses'] == shapes
+    assert stats['hits'] == 2 * len(intervals) - shapes
+    assert set(results) == {'calls_per_second', 'cached_calls_per_second'}
+
+
+def test_compare_to_baseline():
+    baseline = {
+        'calculate_call_price.calls_per_second': 1000,
+        'phone_bill_view.median_ms': 10,
+        'phone_bill_view.queries': 2,
+        'phone_bill_view.call_records': 50,
+    }
+    metrics = {
+        'calculate_call_price.calls_per_second': 700,
+        'phone_bill_view.median_ms': 11,
+        'phone_bill_view.queries': 3,
+        'phone_bill_view.call_records': 100,
+    }
+    assert compare_to_baseline(metrics, baseline, tolerance=0.2) == [
+        ('calculate_call_price.calls_per_second', 1000, 700),
+        ('phone_bill_view.queries', 2, 3),
+    ]
+
+
+@pytest.mark.django_db
+def test_benchmark_command_writes_results_and_detects_regressions(tmp_path):
+    output = tmp_path / 'results.json'
+    options = {'subscribers': 5, 'calls_per_subscriber': 4, 'posts': 10, 'repeat': 1}
+
+    cache_bill('11900000000', date(2024, 1, 1), {'call_records': []})
+
+    call_command('benchmark', output=str(output), stdout=io.StringIO(), **options)
+
+    results = json.loads(output.read_text())
+    assert results['config']['subscribers'] == 5
+    assert get_cached_bill('11900000000', date(2024, 1, 1)) == {'call_records': []}
+    assert results['metrics']['phone_bill_view.call_records'] == 4
+    assert results['metrics']['phone_bill_view.queries'] == 2
+    assert results['metrics']['calculate_call_prices.calls_per_second'] > 0
+    assert CallRecord.objects.count() == 0
+
+    results['metrics']['phone_bill_view.queries'] = 1
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(results))
+    with pytest.raises(CommandError):
+        call_command(
+            'benchmark',
+            baseline=str(baseline),
+            stdout=io.StringIO(),
+            stderr=io.StringIO(),
+            **options,
+        )
+
+
+def test_load_test_payloads_and_latency_summary():
+    records = list(generate_call_records(2, 1, DEFAULT_PERIOD_START))
+    payloads = [json.loads(payload) for payload in call_record_payloads(records, 'run1')]
+
+    assert payloads[0]['call_id'] == 'run1-bench-0'
+    assert set(payloads[0]) == {'call_id', 'type', 'timestamp', 'source', 'destination'}
+    assert set(payloads[1]) == {'call_id', 'type', 'timestamp'}
+
+    summary = latency_summary([index / 1000 for index in range(1, 101)], elapsed=2)
+    assert summary['requests_per_second'] == 50
+    assert summary['p50_ms'] == pytest.approx(50.5)
+    assert summary['p99_ms'] == pytest.approx(99.01)
+    assert summary['max_ms'] == pytest.approx(100)
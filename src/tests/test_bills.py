@@ -0,0 +1,127 @@
+import pytest
+
+from decimal import Decimal
+from datetime import date
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from billing.bills import bill_total_price, close_period, get_bill_calls, parse_period
+from billing.models import CallRecord, PhoneBill, CallDetail
+from billing.runs import run_billing, shard_sources
+from billing.serializers import phone_bill_representation
+
+
+def render_bill(phone_number, period_start):
+    bill_calls = get_bill_calls(phone_number, period_start)
+    return phone_bill_representation(phone_number, period_start, list(bill_calls.rows), bill_total_price(bill_calls))
+
+
+@pytest.fixture
+def october_calls(db, create_call):
+    create_call('1', '11987654321', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+    create_call('2', '11987654321', '2023-10-11T21:57:13Z', '2023-10-11T22:17:53Z')
+    create_call('3', '11987654322', '2023-10-12T08:00:00Z', '2023-10-12T08:03:00Z')
+    create_call('4', '11987654321', '2023-11-01T08:00:00Z', '2023-11-01T08:03:00Z')
+
+
+@pytest.mark.django_db
+def test_close_period_writes_one_bill_per_subscriber(october_calls):
+    assert close_period(date(2023, 10, 1)) == 2
+
+    phone_bill = PhoneBill.objects.get(phone_number='11987654321')
+    assert phone_bill.period_start == date(2023, 10, 1)
+    assert phone_bill.period_end == date(2023, 10, 31)
+    assert phone_bill.total_price == Decimal('1.80')
+    assert phone_bill.call_details.count() == 2
+    assert PhoneBill.objects.get(phone_number='11987654322').total_price == Decimal('0.63')
+
+
+@pytest.mark.django_db
+def test_close_period_keeps_calls_without_a_destination(october_calls):
+    CallRecord.objects.create(call_id='6', type='start', timestamp='2023-10-13T08:00:00Z', source='11987654322')
+    CallRecord.objects.create(call_id='6', type='end', timestamp='2023-10-13T08:01:00Z')
+
+    live_bill = render_bill('11987654322', date(2023, 10, 1))
+
+    assert close_period(date(2023, 10, 1)) == 2
+
+    phone_bill = PhoneBill.objects.get(phone_number='11987654322')
+    assert [detail.destination for detail in phone_bill.call_details.order_by('start_time')] == ['11912345678', None]
+    assert render_bill('11987654322', date(2023, 10, 1)) == live_bill
+
+
+@pytest.mark.django_db
+def test_close_period_is_idempotent(october_calls):
+    close_period(date(2023, 10, 1))
+    close_period(date(2023, 10, 1))
+
+    assert PhoneBill.objects.count() == 2
+    assert CallDetail.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_closed_phone_bill_matches_computed_bill(october_calls):
+    live_bill = render_bill('11987654321', date(2023, 10, 1))
+    assert len(live_bill['call_records']) == 2
+
+    call_command('close_billing_period', period='2023-10')
+
+    assert PhoneBill.objects.filter(phone_number='11987654321').exists()
+    assert render_bill('11987654321', date(2023, 10, 1)) == live_bill
+
+
+@pytest.mark.django_db
+def test_close_period_for_some_sources_keeps_other_bills(october_calls):
+    close_period(date(2023, 10, 1))
+
+    assert close_period(date(2023, 10, 1), sources=['11987654322']) == 1
+    assert PhoneBill.objects.count() == 2
+    assert CallDetail.objects.count() == 3
+
+
+def test_parse_period():
+    assert parse_period('2023-10') == date(2023, 10, 1)
+    assert parse_period(None, default=date(2024, 2, 1)) == date(2024, 2, 1)
+    assert parse_period('').day == 1
+    assert parse_period('') < date.today().replace(day=1)
+    for period in ('2023-13', '10-2023', '2023-10-01'):
+        with pytest.raises(ValidationError, match='Invalid period format'):
+            parse_period(period)
+
+
+@pytest.mark.django_db
+def test_close_billing_period_runs_billing_in_this_process(october_calls):
+    with pytest.raises(CommandError, match='Invalid period format'):
+        call_command('close_billing_period', period='2023-13')
+    with pytest.raises(CommandError, match='not closed yet'):
+        call_command('close_billing_period', period='2999-01')
+
+    call_command('close_billing_period', period='2023-10')
+
+    assert PhoneBill.objects.count() == 2
+    assert CallDetail.objects.count() == 3
+
+
+def test_shard_sources_splits_in_order():
+    assert shard_sources(['1', '2', '3', '4', '5'], 2) == [['1', '2'], ['3', '4'], ['5']]
+
+
+@pytest.mark.django_db
+def test_run_billing_reports_progress_per_shard(october_calls):
+    progress = []
+
+    bill_count = run_billing(date(2023, 10, 1), shard_size=1, progress=lambda *args: progress.append(args))
+
+    assert bill_count == 2
+    assert progress == [(1, 2, 1), (2, 2, 2)]
+    assert PhoneBill.objects.get(phone_number='11987654321').total_price == Decimal('1.80')
+
+
+@pytest.mark.django_db
+def test_run_billing_command_is_idempotent(october_calls):
+    call_command('run_billing', period='2023-10', workers=1)
+    call_command('run_billing', period='2023-10', workers=1)
+
+    assert PhoneBill.objects.count() == 2
+    assert CallDetail.objects.count() == 3
@@ -0,0 +1,66 @@
+import io
+import json
+import pytest
+
+from django.core.management import call_command
+
+from billing.models import CallRecord
+
+
+CSV_DUMP = (
+    "call_id,type,timestamp,source,destination\n"
+    "1,start,2023-10-10T15:00:00Z,11987654321,11912345678\n"
+    "1,end,2023-10-10T15:10:00Z,,\n"
+    "2,start,2023-10-10T16:00:00Z,,\n"
+    "3,start,2023-10-10T17:00:00Z,119876,11912345678\n"
+    "1,end,2023-10-10T15:11:00Z,,\n"
+    "4,start,invalid-timestamp,11987654321,11912345678\n"
+    "5,start,2023-10-10T18:00:00Z,11987654321,11912345678\n"
+)
+
+
+def import_cdrs(path, **options):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    call_command('import_cdrs', str(path), stdout=stdout, stderr=stderr, **options)
+    return stdout.getvalue(), stderr.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_cdrs_csv(tmp_path):
+    path = tmp_path / 'cdrs.csv'
+    path.write_text(CSV_DUMP)
+
+    stdout, stderr = import_cdrs(path, batch_size=2)
+
+    assert CallRecord.objects.count() == 3
+    assert 'Imported 3 records, rejected 4 lines' in stdout
+    assert 'Line 4: Source and destination are required' in stderr
+    assert 'Line 5:' in stderr and 'AAXXXXXXXXX' in stderr
+    assert 'Line 6: Duplicate call_id and type.' in stderr
+    assert 'Line 7:' in stderr
+
+
+@pytest.mark.django_db
+def test_import_cdrs_ndjson_resumes_from_checkpoint(tmp_path):
+    records = [
+        {'call_id': '1', 'type': 'start', 'timestamp': '2023-10-10T15:00:00Z',
+         'source': '11987654321', 'destination': '11912345678'},
+        {'call_id': '1', 'type': 'end', 'timestamp': '2023-10-10T15:10:00Z'},
+    ]
+    path = tmp_path / 'cdrs.ndjson'
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    checkpoint = tmp_path / 'checkpoint.json'
+
+    import_cdrs(path, checkpoint=str(checkpoint))
+    assert CallRecord.objects.count() == 2
+    assert json.loads(checkpoint.read_text())['line'] == 2
+
+    with path.open('a') as dump:
+        dump.write('not json\n')
+        dump.write(json.dumps({'call_id': '2', 'type': 'end', 'timestamp': '2023-10-11T15:10:00Z'}) + '\n')
+
+    stdout, stderr = import_cdrs(path, checkpoint=str(checkpoint))
+    assert 'Resuming from line 2.' in stdout
+    assert 'Imported 1 records, rejected 1 lines' in stdout
+    assert 'Line 3: Invalid JSON' in stderr
+    assert CallRecord.objects.count() == 3
@@ -0,0 +1,200 @@
+import os
+import json
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.urls import reverse
+from django.test import AsyncClient, Client
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from billing import ingest
+from billing.ingest import BufferFull, IngestBuffer, WriteAheadLog, orphaned_logs, validate_rows
+from billing.models import CallRecord, CompletedCall
+
+
+CALL_ROWS = [
+    {'call_id': '1', 'type': 'start', 'timestamp': '2023-10-10T15:00:00Z',
+     'source': '11987654321', 'destination': '11912345678'},
+    {'call_id': '1', 'type': 'end', 'timestamp': '2023-10-10T15:10:00Z'},
+]
+
+
+@pytest.fixture(autouse=True)
+def wal_dir(settings, tmp_path):
+    settings.INGEST_WAL_DIR = str(tmp_path)
+    yield str(tmp_path)
+    if ingest._buffer is not None:
+        ingest._buffer.close()
+    ingest._buffer = None
+
+
+@pytest.fixture
+def auth_headers(db):
+    user = User.objects.create_user(username="testuser", password="password123")
+    return {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+
+def test_write_ahead_log_skips_a_torn_last_line(tmp_path):
+    log = WriteAheadLog(str(tmp_path / "test.wal"))
+    log.append(CALL_ROWS)
+    os.write(os.open(log.path, os.O_WRONLY | os.O_APPEND), b'{"call_id": "2", "ty')
+
+    assert list(log.replay()) == CALL_ROWS
+    log.close()
+
+
+def test_orphaned_logs_skip_logs_held_by_a_process(tmp_path):
+    held = WriteAheadLog(str(tmp_path / "held.wal"))
+    WriteAheadLog(str(tmp_path / "orphan.wal")).close()
+
+    logs = orphaned_logs(str(tmp_path))
+
+    assert [log.path for log in logs] == [str(tmp_path / "orphan.wal")]
+    held.close()
+
+
+@pytest.mark.django_db
+def test_buffer_replays_orphaned_logs_and_drains_records(wal_dir):
+    orphan = WriteAheadLog(os.path.join(wal_dir, "orphan.wal"))
+    orphan.append(CALL_ROWS[:1])
+    orphan.close()
+    records, _ = validate_rows(CALL_ROWS[1:])
+
+    async def ingest_records():
+        buffer = IngestBuffer(wal_dir, capacity=10, batch_size=10, max_attempts=1)
+        await buffer.start()
+        await buffer.put(records)
+        await buffer.join()
+        return buffer
+
+    buffer = async_to_sync(ingest_records)()
+
+    assert CallRecord.objects.count() == 2
+    assert CompletedCall.objects.get().call_id == '1'
+    assert not os.path.exists(orphan.path)
+    assert list(buffer.wal.replay()) == []
+    buffer.close()
+
+
+@pytest.mark.django_db
+def test_buffer_rejects_records_beyond_its_capacity(wal_dir):
+    records, _ = validate_rows(CALL_ROWS)
+
+    async def overfill():
+        buffer = IngestBuffer(wal_dir, capacity=1, batch_size=10, max_attempts=1)
+        await buffer.start()
+        with pytest.raises(BufferFull):
+            await buffer.put(records)
+        return buffer
+
+    buffer = async_to_sync(overfill)()
+
+    assert buffer.pending == 0
+    assert list(buffer.wal.replay()) == []
+    buffer.close()
+
+
+@pytest.mark.django_db
+def test_buffer_removes_log_segments_once_written(wal_dir):
+    records, _ = validate_rows(CALL_ROWS)
+
+    async def ingest_records():
+        buffer = IngestBuffer(wal_dir, capacity=10, batch_size=1, max_attempts=1)
+        await buffer.start()
+        for record in records:
+            await buffer.put([record])
+        await buffer.join()
+        return buffer
+
+    buffer = async_to_sync(ingest_records)()
+
+    assert CompletedCall.objects.count() == 1
+    assert [name for name in os.listdir(wal_dir) if name.endswith('.wal')] == [os.path.basename(buffer.wal.path)]
+    assert list(buffer.wal.replay()) == []
+    buffer.close()
+
+
+@pytest.mark.django_db
+def test_buffer_moves_failing_batches_to_the_dead_letter_file(wal_dir, monkeypatch):
+    def fail(records):
+        raise ValueError("database unavailable")
+
+    monkeypatch.setattr(ingest, 'write_batch', fail)
+    monkeypatch.setattr(ingest, 'RETRY_DELAY', 0)
+    records, _ = validate_rows(CALL_ROWS)
+
+    async def ingest_records():
+        buffer = IngestBuffer(wal_dir, capacity=2, batch_size=10, max_attempts=2)
+        await buffer.start()
+        await buffer.put(records)
+        await buffer.join()
+        return buffer
+
+    buffer = async_to_sync(ingest_records)()
+
+    assert buffer.pending == 0
+    assert not CallRecord.objects.exists()
+    with open(os.path.join(wal_dir, ingest.DEAD_LETTER_FILE)) as dead_letters:
+        assert [json.loads(line)['call_id'] for line in dead_letters] == ['1', '1']
+    assert list(buffer.wal.replay()) == []
+    buffer.close()
+
+
+@pytest.mark.django_db
+def test_ingest_view_acknowledges_logged_records(auth_headers):
+    async def post():
+        response = await AsyncClient().post(
+            reverse('call-records-ingest'),
+            [*CALL_ROWS, {'call_id': '2', 'type': 'pause'}],
+            content_type='application/json',
+            headers=auth_headers,
+        )
+        await ingest._buffer.join()
+        return response
+
+    response = async_to_sync(post)()
+
+    assert response.status_code == 207
+    body = response.json()
+    assert body['accepted'] == 2
+    assert body['errors'][0]['index'] == 2
+    assert 'type' in body['errors'][0]['errors']
+    assert CompletedCall.objects.get().call_id == '1'
+
+
+@pytest.mark.django_db
+def test_ingest_view_returns_503_when_the_buffer_is_full(settings, auth_headers):
+    settings.INGEST_QUEUE_SIZE = 1
+
+    async def post():
+        return await AsyncClient().post(
+            reverse('call-records-ingest'),
+            CALL_ROWS,
+            content_type='application/json',
+            headers=auth_headers,
+        )
+
+    response = async_to_sync(post)()
+
+    assert response.status_code == 503
+    assert response['Retry-After'] == '1'
+    assert not CallRecord.objects.exists()
+
+
+@pytest.mark.django_db
+def test_ingest_view_writes_records_directly_under_wsgi(auth_headers):
+    client = Client(headers=auth_headers)
+    body = "\n".join(json.dumps(row) for row in CALL_ROWS)
+
+    response = client.post(reverse('call-records-ingest'), body, content_type='application/x-ndjson')
+
+    assert response.status_code == 201
+    assert response.json() == {'accepted': 2, 'errors': []}
+    assert CompletedCall.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_ingest_view_requires_authentication():
+    response = Client().post(reverse('call-records-ingest'), CALL_ROWS, content_type='application/json')
+    assert response.status_code == 401
@@ -0,0 +1,106 @@
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.urls import reverse
+from django.test import AsyncClient
+
+from rest_framework import status
+
+from billing.instrumentation import (
+    RequestMetrics,
+    collect_request_metrics,
+    registry,
+    timed,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+
+def test_timed_is_a_no_op_outside_of_a_request():
+    with timed("pricing"):
+        pass
+
+
+def test_timed_adds_to_the_current_request_metrics():
+    with collect_request_metrics() as metrics:
+        with timed("pricing"):
+            pass
+        with timed("pricing"):
+            pass
+
+    assert metrics.timings["pricing"] > 0
+    assert metrics.timings["serialization"] == 0
+
+
+def test_registry_builds_cumulative_latency_histograms():
+    registry.record("phone-bills", 0.003, RequestMetrics())
+    registry.record("phone-bills", 0.020, RequestMetrics())
+    registry.record("phone-bills", 60, RequestMetrics())
+
+    metrics = registry.snapshot()["phone-bills"]
+
+    assert metrics["requests"] == 3
+    assert metrics["latency_histogram_ms"]["5"] == 1
+    assert metrics["latency_histogram_ms"]["25"] == 2
+    assert metrics["latency_histogram_ms"]["5000"] == 2
+    assert metrics["latency_histogram_ms"]["+Inf"] == 3
+
+
+@pytest.mark.django_db
+def test_instrumented_views_report_server_timing(api_client):
+    for record in [
+        {'call_id': '1', 'type': 'start', 'timestamp': '2023-10-10T15:00:00Z',
+         'source': '11987654321', 'destination': '11912345678'},
+        {'call_id': '1', 'type': 'end', 'timestamp': '2023-10-10T15:10:00Z'},
+    ]:
+        response = api_client.post(reverse('call-records'), record, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+    assert 'pricing;dur=' in response['Server-Timing']
+
+    response = api_client.get(reverse('phone-bills'), {'phone_number': '11987654321', 'period': '2023-10'})
+    timings = response['Server-Timing']
+    assert timings.startswith('db;dur=')
+    assert 'serialization;dur=' in timings
+    assert 'total;dur=' in timings
+
+    response = api_client.get(reverse('metrics'))
+    assert response.status_code == status.HTTP_200_OK
+    assert 'Server-Timing' not in response
+
+    views = response.data['views']
+    assert views['call-records']['requests'] == 2
+    assert views['call-records']['seconds']['pricing'] > 0
+    assert views['phone-bills']['requests'] == 1
+    assert views['phone-bills']['queries'] > 0
+    assert views['phone-bills']['latency_histogram_ms']['+Inf'] == 1
+    assert set(response.data['pricing_cache']) == {'hits', 'misses', 'size', 'max_size'}
+    assert response.data['quarantine'] == {'start': 0, 'end': 0}
+
+
+# The sync view runs in another thread, with its own connection, than the
+# async middleware, so the test data has to be committed
+@pytest.mark.django_db(transaction=True)
+def test_instrumented_views_count_queries_under_asgi(api_client):
+    for record in [
+        {'call_id': '1', 'type': 'start', 'timestamp': '2023-10-10T15:00:00Z',
+         'source': '11987654321', 'destination': '11912345678'},
+        {'call_id': '1', 'type': 'end', 'timestamp': '2023-10-10T15:10:00Z'},
+    ]:
+        api_client.post(reverse('call-records'), record, format='json')
+
+    response = async_to_sync(AsyncClient().get)(
+        reverse('phone-bills'),
+        {'phone_number': '11987654321', 'period': '2023-10'},
+        headers={'Authorization': api_client._credentials['HTTP_AUTHORIZATION']},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()['call_records']) == 1
+    assert '"0 queries"' not in response['Server-Timing']
+    assert registry.snapshot()['phone-bills']['queries'] > 0
@@ -0,0 +1,81 @@
+import pytest
+
+from decimal import Decimal
+from datetime import datetime, timedelta
+from django.utils.timezone import make_aware
+
+from billing.models import CallRecord, CompletedCall
+from billing.pairing import complete_calls, paired_calls
+
+
+PERIOD_START = make_aware(datetime(2023, 10, 1))
+PERIOD_END = make_aware(datetime(2023, 11, 1))
+
+
+@pytest.mark.django_db
+def test_paired_calls_filters_by_source_and_end_timestamp(create_call):
+    create_call('1', '11987654321', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+    create_call('2', '11987654322', '2023-10-10T16:00:00Z', '2023-10-10T16:10:00Z')
+    # Started in the previous period, ended in this one
+    create_call('3', '11987654321', '2023-09-30T23:50:00Z', '2023-10-01T00:10:00Z')
+    # Ended in the next period
+    create_call('4', '11987654321', '2023-10-31T23:50:00Z', '2023-11-01T00:10:00Z')
+    # Start without an end
+    CallRecord.objects.create(
+        call_id='5',
+        type='start',
+        timestamp='2023-10-12T10:00:00Z',
+        source='11987654321',
+        destination='11912345678',
+    )
+
+    calls = list(paired_calls('11987654321', PERIOD_START, PERIOD_END))
+
+    assert [call.call_id for call in calls] == ['3', '1']
+    assert calls[1].end_time == make_aware(datetime(2023, 10, 10, 15, 10))
+    assert calls[1].duration == timedelta(minutes=10)
+    assert calls[1].price == Decimal('1.26')
+
+
+@pytest.mark.django_db
+def test_paired_calls_query_count_is_constant(django_assert_num_queries, create_call):
+    for i in range(20):
+        create_call(str(i), '11987654321', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+        create_call(f'other-{i}', '11987654322', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+
+    with django_assert_num_queries(1):
+        calls = list(paired_calls('11987654321', PERIOD_START, PERIOD_END))
+    assert len(calls) == 20
+
+
+@pytest.mark.django_db
+def test_late_start_record_completes_the_call():
+    CallRecord.objects.create(call_id='1', type='end', timestamp='2023-10-10T15:10:00Z')
+    assert not CompletedCall.objects.exists()
+
+    CallRecord.objects.create(
+        call_id='1',
+        type='start',
+        timestamp='2023-10-10T15:00:00Z',
+        source='11987654321',
+        destination='11912345678',
+    )
+    completed_call = CompletedCall.objects.get(call_id='1')
+    assert completed_call.source == '11987654321'
+    assert completed_call.start_time == make_aware(datetime(2023, 10, 10, 15, 0))
+
+
+@pytest.mark.django_db
+def test_complete_calls_pairs_bulk_created_records():
+    records = CallRecord.objects.bulk_create([
+        CallRecord(call_id='1', type='start', timestamp='2023-10-10T15:00:00Z',
+                   source='11987654321', destination='11912345678'),
+        CallRecord(call_id='1', type='end', timestamp='2023-10-10T15:10:00Z'),
+        CallRecord(call_id='2', type='end', timestamp='2023-10-10T15:10:00Z'),
+    ])
+    assert not CompletedCall.objects.exists()
+
+    completed_calls = complete_calls(records)
+
+    assert [call.call_id for call in completed_calls] == ['1']
+    assert CompletedCall.objects.get().price == Decimal('1.26')
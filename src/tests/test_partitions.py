@@ -0,0 +1,106 @@
+import pytest
+
+from datetime import date, datetime, timezone
+from django.db import IntegrityError, connection, transaction
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from billing.importing import write_records
+from billing.models import CallRecord
+from billing.partitions import (
+    add_months,
+    create_partitions,
+    existing_partitions,
+    create_partition_sql,
+    detach_partition_sql,
+    months_between,
+    partition_bounds_sql,
+    partition_name,
+)
+
+
+def test_add_months_crosses_years():
+    assert add_months(date(2023, 11, 15), 3) == date(2024, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+
+
+def test_months_between_includes_both_ends():
+    assert months_between(date(2023, 11, 20), date(2024, 2, 1)) == [
+        date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1),
+    ]
+
+
+def test_partition_covers_the_billing_period():
+    assert partition_name(date(2024, 2, 1)) == 'billing_callrecord_y2024m02'
+    assert partition_bounds_sql(date(2024, 2, 1)) == (
+        "FOR VALUES FROM ('2024-02-01T00:00:00+00:00') TO ('2024-03-01T00:00:00+00:00')"
+    )
+
+
+def test_create_partition_moves_records_out_of_the_default_partition():
+    statements = create_partition_sql(date(2024, 2, 1))
+
+    assert 'DELETE FROM billing_callrecord_default' in statements[1]
+    assert statements[-1].startswith('ALTER TABLE billing_callrecord ATTACH PARTITION billing_callrecord_y2024m02')
+
+
+def test_only_dropping_a_partition_releases_its_keys():
+    assert detach_partition_sql(date(2023, 1, 1)) == [
+        'ALTER TABLE billing_callrecord DETACH PARTITION billing_callrecord_y2023m01',
+    ]
+    statements = detach_partition_sql(date(2023, 1, 1), drop=True)
+    assert 'DELETE FROM billing_callrecordkey' in statements[1]
+    assert statements[2] == 'DROP TABLE billing_callrecord_y2023m01'
+
+
+postgresql_only = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='Call records are only partitioned on PostgreSQL.',
+)
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor == 'postgresql', reason='Call records are partitioned on PostgreSQL.')
+def test_partition_command_requires_a_partitioned_table():
+    with pytest.raises(CommandError):
+        call_command('partition_call_records')
+
+
+@postgresql_only
+@pytest.mark.django_db
+def test_partitioned_table_keeps_call_id_and_type_unique():
+    CallRecord.objects.create(call_id='1', type='end', timestamp='2023-10-10T15:10:00Z')
+
+    # Same key in another month, so in another partition
+    with pytest.raises(IntegrityError), transaction.atomic():
+        CallRecord.objects.create(call_id='1', type='end', timestamp='2024-10-10T15:10:00Z')
+
+    timestamp = datetime(2024, 10, 10, 15, 10, tzinfo=timezone.utc)
+    written = write_records([
+        CallRecord(call_id='1', type='end', timestamp=timestamp),
+        CallRecord(call_id='2', type='end', timestamp=timestamp),
+    ])
+    assert written == 1
+    assert CallRecord.objects.count() == 2
+
+
+@postgresql_only
+@pytest.mark.django_db
+def test_partition_command_detaches_and_drops_partitions():
+    CallRecord.objects.create(call_id='1', type='end', timestamp='2023-10-10T15:10:00Z')
+    CallRecord.objects.create(call_id='2', type='end', timestamp='2023-11-10T15:10:00Z')
+
+    # Records move from the default partition into the new ones
+    create_partitions([date(2023, 10, 1), date(2023, 11, 1)])
+    assert {'billing_callrecord_y2023m10', 'billing_callrecord_y2023m11'} <= existing_partitions()
+
+    call_command('partition_call_records', detach=['2023-10'])
+    assert CallRecord.objects.get().call_id == '2'
+
+    call_command('partition_call_records', detach=['2023-11'], drop=True)
+    assert not CallRecord.objects.exists()
+
+    # The key of a dropped record is released, the one of a detached record is not
+    CallRecord.objects.create(call_id='2', type='end', timestamp='2023-11-10T15:10:00Z')
+    with pytest.raises(IntegrityError), transaction.atomic():
+        CallRecord.objects.create(call_id='1', type='end', timestamp='2023-10-10T15:10:00Z')
@@ -0,0 +1,92 @@
+import pytest
+
+from datetime import datetime, timedelta
+from django.core.management import call_command
+from django.utils.timezone import make_aware, now
+
+from billing.models import CallRecord, CompletedCall, QuarantinedCallRecord
+from billing.reaper import quarantine_counts, reap_unmatched_records
+
+
+CUTOFF = make_aware(datetime(2023, 11, 1))
+
+
+def create_start(call_id, timestamp):
+    CallRecord.objects.create(
+        call_id=call_id,
+        type='start',
+        timestamp=timestamp,
+        source='11987654321',
+        destination='11912345678',
+    )
+
+
+def create_end(call_id, timestamp):
+    CallRecord.objects.create(call_id=call_id, type='end', timestamp=timestamp)
+
+
+@pytest.mark.django_db
+def test_reaper_quarantines_old_unmatched_halves_in_chunks():
+    create_start('paired', '2023-10-10T15:00:00Z')
+    create_end('paired', '2023-10-10T15:10:00Z')
+    for index in range(5):
+        create_start(f'stale-{index}', f'2023-10-1{index}T15:00:00Z')
+    create_end('orphan', '2023-10-20T15:10:00Z')
+    # Too recent to tell
+    create_start('recent', '2023-11-02T15:00:00Z')
+
+    counts = reap_unmatched_records(CUTOFF, chunk_size=2)
+
+    assert counts == {'start': 5, 'end': 1}
+    assert set(CallRecord.objects.values_list('call_id', flat=True)) == {'paired', 'recent'}
+    assert CompletedCall.objects.count() == 1
+
+    quarantined = QuarantinedCallRecord.objects.get(call_id='orphan')
+    assert (quarantined.type, quarantined.source) == ('end', None)
+    assert quarantined.timestamp == make_aware(datetime(2023, 10, 20, 15, 10))
+    assert quarantine_counts() == {'start': 5, 'end': 1}
+
+    # Nothing left to reap
+    assert reap_unmatched_records(CUTOFF) == {'start': 0, 'end': 0}
+
+
+@pytest.mark.django_db
+def test_reaper_only_searches_the_lookback_before_the_cutoff_when_given():
+    # Records sharing a timestamp across chunk boundaries
+    for index in range(3):
+        create_start(f'stale-{index}', '2023-10-20T15:00:00Z')
+    create_end('orphan', '2023-10-02T15:10:00Z')
+    # Before the lookback
+    create_start('ancient', '2023-09-20T15:00:00Z')
+
+    assert reap_unmatched_records(CUTOFF, chunk_size=2, dry_run=True, lookback=timedelta(days=30)) == {
+        'start': 3, 'end': 1,
+    }
+    assert reap_unmatched_records(CUTOFF, chunk_size=2, lookback=timedelta(days=30)) == {'start': 3, 'end': 1}
+    assert set(CallRecord.objects.values_list('call_id', flat=True)) == {'ancient'}
+
+    # Without a lookback, every record before the cutoff is searched
+    assert reap_unmatched_records(CUTOFF) == {'start': 1, 'end': 0}
+    assert not CallRecord.objects.exists()
+
+
+@pytest.mark.django_db
+def test_reap_call_records_command(capsys):
+    create_start('stale', now() - timedelta(days=10))
+    create_end('orphan', now() - timedelta(days=2))
+
+    call_command('reap_call_records', '--older-than', '7', '--dry-run')
+    assert 'Would quarantine 1 unmatched start and 0 unmatched end records' in capsys.readouterr().out
+    assert CallRecord.objects.count() == 2
+
+    call_command('reap_call_records', '--older-than', '1')
+    output = capsys.readouterr().out
+    assert 'Quarantined 1 unmatched start and 1 unmatched end records' in output
+    assert 'Quarantine: 1 start and 1 end records.' in output
+    assert not CallRecord.objects.exists()
+
+    create_start('ancient', now() - timedelta(days=400))
+    call_command('reap_call_records', '--older-than', '7', '--lookback', '30', '--dry-run')
+    assert 'Would quarantine 0 unmatched start' in capsys.readouterr().out
+    call_command('reap_call_records', '--older-than', '7')
+    assert 'Quarantined 1 unmatched start' in capsys.readouterr().out
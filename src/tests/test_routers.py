@@ -0,0 +1,113 @@
+import pytest
+
+from datetime import date
+from django.urls import reverse
+from django.db import router
+from django.utils.timezone import localdate, now
+
+from rest_framework import status
+
+from billing.bills import bill_reads
+from billing.cache import get_bill_cache
+from billing.models import CallRecord, CompletedCall, PeriodTotal
+from billing.routers import reading_from_primary, reading_from_replica
+
+
+@pytest.fixture
+def replica(settings):
+    settings.BILLING_REPLICA_ALIAS = 'replica'
+    return 'replica'
+
+
+def test_reads_stay_on_the_primary_without_a_replica(settings):
+    settings.BILLING_REPLICA_ALIAS = 'unconfigured'
+
+    with reading_from_replica():
+        assert router.db_for_read(CompletedCall) == 'default'
+
+
+def test_router_sends_reads_to_the_replica_within_the_block(replica):
+    assert router.db_for_read(CompletedCall) == 'default'
+
+    with reading_from_replica():
+        assert router.db_for_read(CompletedCall) == 'replica'
+        assert router.db_for_write(CompletedCall) == 'default'
+        with reading_from_primary():
+            assert router.db_for_read(CompletedCall) == 'default'
+        assert router.db_for_read(CompletedCall) == 'replica'
+
+    assert router.db_for_read(CompletedCall) == 'default'
+
+    with bill_reads(date(2023, 10, 1)):
+        assert router.db_for_read(CompletedCall) == 'replica'
+    with bill_reads(localdate().replace(day=1)):
+        assert router.db_for_read(CompletedCall) == 'default'
+
+
+def post_call(api_client, call_id, start, end):
+    for record in (
+        {'call_id': call_id, 'type': 'start', 'timestamp': start, 'source': '11987654321', 'destination': '11912345678'},
+        {'call_id': call_id, 'type': 'end', 'timestamp': end},
+    ):
+        response = api_client.post(reverse('call-records'), record, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+
+def replicate(*models):
+    """
+    Copy the rows of `models` from the primary to the replica, as
+    replication would.
+    """
+    for model in models:
+        model.objects.using('replica').bulk_create(model.objects.using('default').all())
+
+
+@pytest.mark.django_db(databases=['default', 'replica'])
+def test_closed_period_bills_are_read_from_the_replica(api_client, replica):
+    post_call(api_client, '1', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+    post_call(api_client, '2', '2023-10-11T15:00:00Z', '2023-10-11T15:10:00Z')
+    params = {'phone_number': '11987654321', 'period': '2023-10'}
+
+    # Ingestion writes to the primary only
+    assert CompletedCall.objects.using('default').count() == 2
+    assert not CallRecord.objects.using('replica').exists()
+
+    # Until the replica has the calls, the bill they changed is read from
+    # the primary
+    response = api_client.get(reverse('phone-bills'), params)
+    assert len(response.data['call_records']) == 2
+
+    get_bill_cache().clear()
+    response = api_client.get(reverse('phone-bills'), params)
+    assert response.data['call_records'] == []
+
+    replicate(CompletedCall, PeriodTotal)
+    get_bill_cache().clear()
+
+    response = api_client.get(reverse('phone-bills'), params)
+    assert len(response.data['call_records']) == 2
+    assert response.data['total_price'] == 'R$ 2.52'
+
+    response = api_client.get(reverse('phone-bills'), {**params, 'export': 'csv'})
+    assert len(b''.join(response.streaming_content).splitlines()) == 3
+
+    response = api_client.get(reverse('phone-bill-statement'), {**params, 'from': '2023-09', 'to': '2023-10'})
+    assert response.data['total_price'] == 'R$ 2.52'
+
+    response = api_client.get(reverse('phone-bill-totals'), params)
+    assert response.data['call_count'] == 2
+
+
+@pytest.mark.django_db(databases=['default', 'replica'])
+def test_open_period_bills_read_your_writes(api_client, replica):
+    start = now().replace(day=1, hour=8, minute=0, second=0, microsecond=0)
+    post_call(api_client, '1', start.isoformat(), start.replace(minute=10).isoformat())
+
+    response = api_client.get(reverse('phone-bills'), {
+        'phone_number': '11987654321',
+        'period': start.strftime('%Y-%m'),
+    })
+    assert len(response.data['call_records']) == 1
+
+    response = api_client.get(reverse('phone-bill-totals'), {'phone_number': '11987654321'})
+    assert response.data['call_count'] == 1
@@ -1,6 +1,11 @@
 import pytest
-from billing.serializers import CallRecordSerializer
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from django.utils.timezone import make_aware
+from billing.serializers import CallRecordSerializer, PhoneBillSerializer, phone_bill_representation
+from billing.utils import format_duration
 from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 
 
 @pytest.mark.django_db
@@ -28,4 +33,35 @@ def test_call_record_serializer_invalid():
     }
     serializer = CallRecordSerializer(data=data)
     assert not serializer.is_valid()
-    assert 'timestamp' in serializer.errors
\ No newline at end of file
+    assert 'timestamp' in serializer.errors
+
+def test_phone_bill_representation_renders_like_the_serializer():
+    rows = [
+        (1, '11912345678', make_aware(datetime(2023, 10, 1, 0, 0)), timedelta(0), Decimal('0.36')),
+        (2, '11912345678', make_aware(datetime(2023, 10, 10, 15, 0, 0, 250000)),
+         timedelta(hours=26, seconds=59, microseconds=900000), Decimal('138.33')),
+        (3, None, make_aware(datetime(2023, 10, 31, 23, 59, 59)), timedelta(minutes=10), Decimal('1260.5')),
+    ]
+    call_details = [
+        {
+            'destination': destination,
+            'call_start_date': start_time.date(),
+            'call_start_time': start_time.time(),
+            'duration': format_duration(duration),
+            'price': f'R$ {price:.2f}',
+        }
+        for _, destination, start_time, duration, price in rows
+    ]
+    renderer = JSONRenderer()
+
+    expected = renderer.render(PhoneBillSerializer({
+        'phone_number': '11987654321',
+        'period': '2023-10',
+        'total_price': 'R$ 1399.19',
+        'call_records': call_details,
+    }).data)
+    rendered = renderer.render(
+        phone_bill_representation('11987654321', date(2023, 10, 1), rows, Decimal('1399.19'))
+    )
+
+    assert rendered == expected
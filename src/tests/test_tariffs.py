@@ -0,0 +1,182 @@
+import pytest
+
+from decimal import Decimal
+from datetime import date, datetime, time
+from django.urls import reverse
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.utils.timezone import make_aware
+
+from billing import tariffs
+from billing.bills import close_period, rerate_period
+from billing.models import (
+    CompletedCall,
+    PeriodTotal,
+    PhoneBill,
+    SubscriberTariff,
+    Tariff,
+    TariffVersion,
+    TariffWindow,
+)
+from billing.tariffs import get_tariff_book, publish_tariff_version
+
+
+def create_version(tariff, effective_from, fixed_rate, rate_per_minute, publish=True):
+    version = TariffVersion.objects.create(tariff=tariff, effective_from=effective_from, fixed_rate=fixed_rate)
+    TariffWindow.objects.bulk_create([
+        TariffWindow(
+            version=version,
+            day_type=day_type,
+            start_time=time(0, 0),
+            end_time=time(0, 0),
+            rate_per_minute=rate_per_minute,
+        )
+        for day_type in ('weekday', 'saturday', 'sunday')
+    ])
+    if publish:
+        publish_tariff_version(version)
+    return version
+
+
+@pytest.mark.django_db
+def test_standard_tariff_is_seeded():
+    version = TariffVersion.objects.get(tariff__name='standard')
+    assert version.published_at is not None
+    assert version.fixed_rate == Decimal('0.36')
+
+    tariff = get_tariff_book().tariff_for(None, make_aware(datetime(2023, 10, 10, 15, 0)))
+    assert tariff.rate(make_aware(datetime(2023, 10, 10, 15, 0)), make_aware(datetime(2023, 10, 10, 15, 10))) == (
+        10, Decimal('1.26')
+    )
+
+
+@pytest.mark.django_db
+def test_subscribers_are_priced_with_the_version_in_effect_when_the_call_started(create_call):
+    flat = Tariff.objects.create(name='flat')
+    create_version(flat, make_aware(datetime(2023, 1, 1)), Decimal('0.10'), Decimal('0.01'))
+    create_version(flat, make_aware(datetime(2023, 10, 15)), Decimal('0.20'), Decimal('0.02'))
+    SubscriberTariff.objects.create(phone_number='11987654321', tariff=flat)
+
+    create_call('1', '11987654321', '2023-10-10T23:00:00Z', '2023-10-10T23:10:00Z')
+    create_call('2', '11987654321', '2023-10-20T23:00:00Z', '2023-10-20T23:10:00Z')
+    # Other subscribers stay on the standard tariff, free at night
+    create_call('3', '11987654322', '2023-10-20T23:00:00Z', '2023-10-20T23:10:00Z')
+
+    prices = dict(CompletedCall.objects.values_list('call_id', 'price'))
+    assert prices == {'1': Decimal('0.20'), '2': Decimal('0.40'), '3': Decimal('0.36')}
+    assert CompletedCall.objects.get(call_id='1').billable_minutes == 10
+    assert CompletedCall.objects.get(call_id='3').billable_minutes == 0
+
+
+@pytest.mark.django_db
+def test_unpublished_versions_are_not_used(create_call):
+    flat = Tariff.objects.create(name='flat')
+    create_version(flat, make_aware(datetime(2023, 1, 1)), Decimal('0.10'), Decimal('0.01'), publish=False)
+    SubscriberTariff.objects.create(phone_number='11987654321', tariff=flat)
+
+    create_call('1', '11987654321', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+
+    assert CompletedCall.objects.get().price == Decimal('1.26')
+
+
+@pytest.mark.django_db
+def test_versions_with_overlapping_windows_are_not_published(admin_client):
+    flat = Tariff.objects.create(name='flat')
+    version = create_version(flat, make_aware(datetime(2023, 1, 1)), Decimal('0.10'), Decimal('0.01'), publish=False)
+    TariffWindow.objects.create(
+        version=version,
+        day_type='weekday',
+        start_time=time(8, 0),
+        end_time=time(9, 0),
+        rate_per_minute=Decimal('0.20'),
+    )
+
+    with pytest.raises(ValidationError, match='Overlapping weekday rate windows'):
+        publish_tariff_version(version)
+
+    response = admin_client.post(
+        reverse('admin:billing_tariffversion_changelist'),
+        {'action': 'publish', '_selected_action': [version.pk]},
+        follow=True,
+    )
+    assert 'was not published: Overlapping weekday rate windows.' in response.content.decode()
+
+    version.refresh_from_db()
+    assert version.published_at is None
+    assert get_tariff_book().tariff_for('flat', make_aware(datetime(2023, 10, 1))).fixed_units == 3600
+
+
+@pytest.mark.django_db
+def test_admin_rejects_overlapping_windows(admin_client):
+    flat = Tariff.objects.create(name='flat')
+    windows = [('weekday', '08:00', '12:00'), ('weekday', '11:00', '13:00'), ('saturday', '11:00', '13:00')]
+    data = {
+        'tariff': flat.pk,
+        'effective_from_0': '2023-01-01',
+        'effective_from_1': '00:00:00',
+        'fixed_rate': '0.10',
+        'windows-TOTAL_FORMS': len(windows),
+        'windows-INITIAL_FORMS': 0,
+        'windows-MIN_NUM_FORMS': 0,
+        'windows-MAX_NUM_FORMS': 1000,
+    }
+    for index, (day_type, start_time, end_time) in enumerate(windows):
+        data.update({
+            f'windows-{index}-day_type': day_type,
+            f'windows-{index}-start_time': start_time,
+            f'windows-{index}-end_time': end_time,
+            f'windows-{index}-rate_per_minute': '0.05',
+        })
+
+    response = admin_client.post(reverse('admin:billing_tariffversion_add'), data)
+    assert response.status_code == 200
+    assert 'Overlapping weekday rate windows.' in response.content.decode()
+    assert not TariffVersion.objects.filter(tariff=flat).exists()
+
+    data['windows-1-day_type'] = 'sunday'
+    response = admin_client.post(reverse('admin:billing_tariffversion_add'), data)
+    assert response.status_code == 302
+    assert TariffVersion.objects.get(tariff=flat).windows.count() == 3
+
+
+@pytest.mark.django_db
+def test_publishing_elsewhere_is_picked_up_after_the_recheck_interval(monkeypatch):
+    book = get_tariff_book()
+    standard = Tariff.objects.get(name='standard')
+    version = create_version(standard, make_aware(datetime(2023, 1, 1)), Decimal('0.10'), Decimal('0.01'), publish=False)
+    # Published by another process
+    TariffVersion.objects.filter(pk=version.pk).update(published_at=make_aware(datetime(2030, 1, 1)))
+    tariffs._book = book
+
+    assert get_tariff_book() is book
+
+    monkeypatch.setattr(tariffs, 'TARIFF_RECHECK_SECONDS', 0)
+    assert get_tariff_book() is not book
+    assert get_tariff_book().tariff_for(None, make_aware(datetime(2023, 10, 1))).fixed_units == 1000
+
+
+@pytest.mark.django_db
+def test_rerate_period_reprices_calls_totals_and_bills(create_call):
+    create_call('1', '11987654321', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+    close_period(date(2023, 10, 1))
+    assert PhoneBill.objects.get().total_price == Decimal('1.26')
+
+    standard = Tariff.objects.get(name='standard')
+    create_version(standard, make_aware(datetime(2023, 10, 1)), Decimal('0.10'), Decimal('0.01'))
+
+    assert rerate_period(date(2023, 10, 1)) == 1
+
+    assert CompletedCall.objects.get().price == Decimal('0.20')
+    period_total = PeriodTotal.objects.get()
+    assert (period_total.call_count, period_total.total_price) == (1, Decimal('0.20'))
+    assert PhoneBill.objects.get().total_price == Decimal('0.20')
+
+
+@pytest.mark.django_db
+def test_rerate_calls_command(capsys, create_call):
+    create_call('1', '11987654321', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+
+    call_command('rerate_calls', '--period', '2023-10')
+
+    assert 'Rerated period 2023-10: 1 calls priced.' in capsys.readouterr().out
+    assert CompletedCall.objects.get().price == Decimal('1.26')
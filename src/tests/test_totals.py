@@ -0,0 +1,135 @@
+import time
+import pytest
+import threading
+
+from decimal import Decimal
+from datetime import date
+from django.db import connection, transaction
+from django.urls import reverse
+
+from rest_framework import status
+
+from billing.models import CallRecord, PeriodTotal
+from billing.pairing import complete_calls
+
+
+postgresql_only = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='SQLite runs one write transaction at a time.',
+)
+
+
+def create_start(call_id, source, timestamp):
+    CallRecord.objects.create(
+        call_id=call_id,
+        type='start',
+        timestamp=timestamp,
+        source=source,
+        destination='11912345678',
+    )
+
+
+def create_end(call_id, timestamp):
+    CallRecord.objects.create(call_id=call_id, type='end', timestamp=timestamp)
+
+
+@pytest.mark.django_db
+def test_completing_calls_updates_the_running_totals():
+    create_start('1', '11987654321', '2023-10-10T15:00:00Z')
+    assert not PeriodTotal.objects.exists()
+
+    create_end('1', '2023-10-10T15:10:00Z')
+    # Late start record
+    create_end('2', '2023-10-11T22:17:53Z')
+    create_start('2', '11987654321', '2023-10-11T21:57:13Z')
+
+    period_total = PeriodTotal.objects.get(phone_number='11987654321', period_start=date(2023, 10, 1))
+    assert period_total.call_count == 2
+    assert period_total.billable_minutes == 12
+    assert period_total.total_price == Decimal('1.80')
+
+
+@pytest.mark.django_db
+def test_completing_a_call_again_does_not_count_it_twice():
+    create_start('1', '11987654321', '2023-10-10T15:00:00Z')
+    create_end('1', '2023-10-10T15:10:00Z')
+
+    complete_calls(CallRecord.objects.all())
+
+    period_total = PeriodTotal.objects.get()
+    assert period_total.call_count == 1
+    assert period_total.total_price == Decimal('1.26')
+
+
+@postgresql_only
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_completions_count_a_call_once():
+    # Stored without the post_save signal, so neither thread sees the call
+    records = CallRecord.objects.bulk_create([
+        CallRecord(call_id='1', type='start', timestamp='2023-10-10T15:00:00Z',
+                   source='11987654321', destination='11912345678'),
+        CallRecord(call_id='1', type='end', timestamp='2023-10-10T15:10:00Z'),
+    ])
+    first_completed = threading.Event()
+    second_started = threading.Event()
+
+    def complete_first():
+        try:
+            with transaction.atomic():
+                complete_calls(records)
+                first_completed.set()
+                second_started.wait()
+                # Give the second completion time to read the calls
+                time.sleep(0.5)
+        finally:
+            connection.close()
+
+    def complete_second():
+        try:
+            first_completed.wait()
+            second_started.set()
+            complete_calls(records)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=complete_first), threading.Thread(target=complete_second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    period_total = PeriodTotal.objects.get()
+    assert period_total.call_count == 1
+    assert period_total.total_price == Decimal('1.26')
+
+
+@pytest.mark.django_db
+def test_totals_are_kept_per_period_of_the_call_end():
+    create_start('1', '11987654321', '2023-10-31T23:50:00Z')
+    create_end('1', '2023-11-01T00:10:00Z')
+
+    assert PeriodTotal.objects.get().period_start == date(2023, 11, 1)
+
+
+@pytest.mark.django_db
+def test_phone_bill_totals_view(api_client):
+    create_start('1', '11987654321', '2023-10-10T15:00:00Z')
+    create_end('1', '2023-10-10T15:10:00Z')
+    url = reverse('phone-bill-totals')
+
+    response = api_client.get(url, {'phone_number': '11987654321', 'period': '2023-10'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {
+        'phone_number': '11987654321',
+        'period': '2023-10',
+        'call_count': 1,
+        'billable_minutes': 10,
+        'total_price': 'R$ 1.26',
+    }
+
+    response = api_client.get(url, {'phone_number': '11987654321', 'period': '2023-09'})
+    assert response.data['call_count'] == 0
+    assert response.data['total_price'] == 'R$ 0.00'
+
+    response = api_client.get(url, {'period': '2023-10'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
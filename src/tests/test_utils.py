@@ -1,9 +1,20 @@
 import pytest
+import random
+import numpy as np
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from django.utils.timezone import make_aware
 
-from billing.utils import calculate_call_price, format_duration
+from billing.utils import (
+    STANDARD_TARIFF,
+    CompiledTariff,
+    calculate_billable_minutes,
+    calculate_call_price,
+    calculate_call_prices,
+    clear_price_cache,
+    format_duration,
+    price_cache_stats,
+)
 
 
 def test_calculate_call_price_standard_tariff():
@@ -54,6 +65,113 @@ def test_calculate_call_price_after_22():
     assert price == expected_price, f"Expected {expected_price}, but got {price}"
 
 
+def test_calculate_call_price_spanning_several_days():
+    start_time = make_aware(datetime(2023, 11, 18, 21, 0, 30))
+    end_time = make_aware(datetime(2023, 11, 21, 7, 30, 0))
+    # 59 minutes on the first day, two full days and 90 minutes on the last day
+    assert calculate_billable_minutes(start_time, end_time) == 59 + 2 * 960 + 90
+    expected_price = Decimal('0.36') + (Decimal('2069') * Decimal('0.09'))
+    assert calculate_call_price(start_time, end_time) == expected_price
+
+
+def test_calculate_call_price_huge_duration():
+    start_time = make_aware(datetime(2023, 11, 18, 0, 0, 0))
+    end_time = start_time + timedelta(days=365 * 100)
+    expected_price = Decimal('0.36') + (Decimal(365 * 100 * 960) * Decimal('0.09'))
+    assert calculate_call_price(start_time, end_time) == expected_price
+
+
+def test_calculate_call_price_end_before_start():
+    start_time = make_aware(datetime(2023, 11, 18, 8, 10, 0))
+    end_time = make_aware(datetime(2023, 11, 18, 8, 0, 0))
+    assert calculate_call_price(start_time, end_time) == Decimal('0.36')
+
+
+def test_compiled_tariff_rates_windows_by_day_type():
+    tariff = CompiledTariff(Decimal('0.50'), {
+        'weekday': [(8 * 3600, 18 * 3600, Decimal('0.10')), (18 * 3600, 24 * 3600, Decimal('0.05'))],
+        'saturday': [(0, 24 * 3600, Decimal('0.02'))],
+    })
+
+    # Tuesday, 17:50 to 18:20: 10 minutes at 0.10 and 20 at 0.05
+    minutes, price = tariff.rate(make_aware(datetime(2023, 10, 10, 17, 50)), make_aware(datetime(2023, 10, 10, 18, 20)))
+    assert (minutes, price) == (30, Decimal('2.50'))
+
+    # Friday 23:30 to Sunday 00:30: 30 minutes at 0.05, a day at 0.02, free Sunday
+    minutes, price = tariff.rate(make_aware(datetime(2023, 10, 13, 23, 30)), make_aware(datetime(2023, 10, 15, 0, 30)))
+    assert minutes == 30 + 24 * 60
+    assert price == Decimal('0.50') + 30 * Decimal('0.05') + 24 * 60 * Decimal('0.02')
+
+
+def test_compiled_tariff_rejects_overlapping_windows():
+    with pytest.raises(ValueError):
+        CompiledTariff(Decimal('0.36'), {'weekday': [(0, 3600, Decimal('0.1')), (1800, 7200, Decimal('0.1'))]})
+
+
+def test_calls_of_the_same_shape_share_a_memoized_price():
+    clear_price_cache()
+    tariff = CompiledTariff(Decimal('0.36'), {
+        'weekday': [(6 * 3600, 22 * 3600, Decimal('0.09'))],
+    })
+
+    # Same time of day and length, on two Tuesdays and a Saturday
+    for day in (10, 17, 14):
+        start = make_aware(datetime(2023, 10, day, 21, 55, 30))
+        assert tariff.rate(start, start + timedelta(minutes=10)) == (
+            (4, Decimal('0.72')) if day != 14 else (0, Decimal('0.36'))
+        )
+
+    # Prices of the standard tariff do not depend on the weekday
+    for day in (10, 14):
+        start = make_aware(datetime(2023, 10, day, 15, 0))
+        assert calculate_call_price(start, start + timedelta(minutes=10)) == Decimal('1.26')
+
+    stats = price_cache_stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 3, 3)
+
+
+def random_intervals(rng, count):
+    """
+    Return `count` random (start, end) intervals of 2023, mostly short
+    calls, some over several days or weeks and some ending before they
+    start, with a few naive datetimes.
+    """
+    intervals = []
+    for _ in range(count):
+        start = datetime(2023, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=rng.randrange(365 * 86_400_000_000))
+        length = rng.choice([
+            timedelta(seconds=rng.randrange(3 * 3600)),
+            timedelta(microseconds=rng.randrange(20 * 86_400_000_000)),
+            -timedelta(seconds=rng.randrange(3600)),
+        ])
+        end = start + length
+        if rng.random() < 0.05:
+            start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+        intervals.append((start, end))
+    return intervals
+
+
+@pytest.mark.parametrize('time_zone', ['UTC', 'America/Sao_Paulo', 'America/New_York'])
+def test_calculate_call_prices_matches_calculate_call_price(settings, time_zone):
+    settings.TIME_ZONE = time_zone
+    tariffs = [
+        STANDARD_TARIFF,
+        CompiledTariff(Decimal('0.50'), {
+            'weekday': [(8 * 3600, 18 * 3600, Decimal('0.1015')), (18 * 3600, 24 * 3600, Decimal('0.05'))],
+            'saturday': [(0, 12 * 3600 + 30 * 60, Decimal('0.0225'))],
+        }),
+    ]
+    intervals = random_intervals(random.Random(time_zone), 3000)
+    starts = [start for start, _ in intervals]
+    ends = [end for _, end in intervals]
+
+    for tariff in tariffs:
+        prices = calculate_call_prices(starts, ends, tariff)
+
+        assert prices.dtype == np.int64
+        assert prices.tolist() == [int(calculate_call_price(start, end, tariff) * 100) for start, end in intervals]
+
+
 def test_format_duration():
     duration = timedelta(hours=2, minutes=30, seconds=45)
     duration_str = format_duration(duration)
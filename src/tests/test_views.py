@@ -1,23 +1,15 @@
+import json
 import pytest
 
+from decimal import Decimal
 from datetime import datetime
 from django.urls import reverse
-from django.contrib.auth.models import User
+from django.core.management import call_command
 
 from rest_framework import status
-from rest_framework.test import APIClient
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from billing.models import CallRecord
-
-
-@pytest.fixture
-def api_client():
-    client = APIClient()
-    user = User.objects.create_user(username="testuser", password="password123")
-    refresh = RefreshToken.for_user(user)
-    client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
-    return client
+from billing.models import CallRecord, CompletedCall, PhoneBill
+from billing.serializers import CallRecordSerializer
 
 
 @pytest.mark.django_db
@@ -147,4 +139,341 @@ def test_phone_bill_view_valid_request(api_client):
     response = api_client.get(reverse('phone-bills'), {'phone_number': '11987654321', 'period': '2023-10'})
     assert response.status_code == status.HTTP_200_OK
     assert response.data['phone_number'] == '11987654321'
-    assert len(response.data['call_records']) == 1
\ No newline at end of file
+    assert len(response.data['call_records']) == 1
+
+@pytest.mark.django_db
+def test_phone_bill_view_closed_period_uses_materialized_bill(api_client):
+    CallRecord.objects.create(
+        call_id='123',
+        type='start',
+        timestamp='2023-10-10T15:00:00Z',
+        source='11987654321',
+        destination='11912345678',
+    )
+    CallRecord.objects.create(
+        call_id='123',
+        type='end',
+        timestamp='2023-10-10T15:10:00Z',
+    )
+    call_command('close_billing_period', period='2023-10')
+
+    # Raw records of a closed period are no longer read
+    CallRecord.objects.all().delete()
+
+    response = api_client.get(reverse('phone-bills'), {'phone_number': '11987654321', 'period': '2023-10'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['total_price'] == 'R$ 1.26'
+    assert len(response.data['call_records']) == 1
+
+
+@pytest.mark.django_db
+def test_call_record_view_accepts_a_deleted_record_again(api_client):
+    data = {'call_id': '123', 'type': 'end', 'timestamp': '2023-11-18T10:30:00Z'}
+    response = api_client.post(reverse('call-records'), data, format='json')
+    assert response.status_code == status.HTTP_201_CREATED
+
+    CallRecord.objects.filter(call_id='123').delete()
+
+    response = api_client.post(reverse('call-records'), data, format='json')
+    assert response.status_code == status.HTTP_201_CREATED
+    assert CallRecord.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_call_record_view_rejects_a_record_created_concurrently(api_client, monkeypatch):
+    data = {'call_id': '123', 'type': 'end', 'timestamp': '2023-11-18T10:30:00Z'}
+    api_client.post(reverse('call-records'), data, format='json')
+    # As if the record was created after the serializer looked for it
+    monkeypatch.setattr(CallRecordSerializer, 'get_validators', lambda self: [])
+
+    response = api_client.post(reverse('call-records'), data, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data == {'non_field_errors': ['The fields call_id, type must make a unique set.']}
+    assert CallRecord.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_call_record_view_create_batch(api_client):
+    data = [
+        {
+            'call_id': '123',
+            'type': 'start',
+            'timestamp': '2023-11-18T10:00:00Z',
+            'source': '11987654321',
+            'destination': '11912345678',
+        },
+        {
+            'call_id': '123',
+            'type': 'end',
+            'timestamp': '2023-11-18T10:30:00Z',
+        },
+    ]
+    response = api_client.post(reverse('call-records'), data, format='json')
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data == {'created': 2, 'errors': []}
+    assert CallRecord.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_call_record_view_create_batch_reports_errors_per_item(api_client):
+    CallRecord.objects.create(
+        call_id='123',
+        type='start',
+        timestamp='2023-11-18T10:00:00Z',
+        source='11987654321',
+        destination='11912345678',
+    )
+    data = [
+        {'call_id': '123', 'type': 'start', 'timestamp': '2023-11-18T10:00:00Z'},
+        {'call_id': '123', 'type': 'end', 'timestamp': '2023-11-18T10:30:00Z'},
+        {'call_id': '124', 'type': 'end', 'timestamp': 'invalid-timestamp'},
+        {'call_id': '123', 'type': 'end', 'timestamp': '2023-11-18T10:31:00Z'},
+    ]
+    response = api_client.post(reverse('call-records'), data, format='json')
+    assert response.status_code == status.HTTP_207_MULTI_STATUS
+    assert response.data['created'] == 1
+    assert [error['index'] for error in response.data['errors']] == [0, 2, 3]
+    assert 'non_field_errors' in response.data['errors'][0]['errors']
+    assert 'timestamp' in response.data['errors'][1]['errors']
+    assert CallRecord.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_call_record_view_create_batch_ndjson(api_client):
+    body = (
+        '{"call_id": "123", "type": "start", "timestamp": "2023-11-18T10:00:00Z", '
+        '"source": "11987654321", "destination": "11912345678"}\n'
+        '\n'
+        '{"call_id": "123", "type": "end", "timestamp": "2023-11-18T10:30:00Z"}\n'
+    )
+    response = api_client.post(reverse('call-records'), body, content_type='application/x-ndjson')
+    assert response.status_code == status.HTTP_201_CREATED
+    assert CallRecord.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_call_record_view_create_batch_all_invalid(api_client):
+    data = [{'call_id': '123', 'type': 'start'}]
+    response = api_client.post(reverse('call-records'), data, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data['created'] == 0
+    assert CallRecord.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_phone_bill_view_is_cached_until_a_call_record_is_posted(api_client, django_assert_num_queries):
+    params = {'phone_number': '11987654321', 'period': '2023-10'}
+    api_client.post(reverse('call-records'), {
+        'call_id': '123',
+        'type': 'start',
+        'timestamp': '2023-10-10T15:00:00Z',
+        'source': '11987654321',
+        'destination': '11912345678',
+    }, format='json')
+    api_client.post(reverse('call-records'), {
+        'call_id': '123',
+        'type': 'end',
+        'timestamp': '2023-10-10T15:10:00Z',
+    }, format='json')
+
+    response = api_client.get(reverse('phone-bills'), params)
+    assert len(response.data['call_records']) == 1
+
+    # Only the user lookup of the authentication remains
+    with django_assert_num_queries(1):
+        cached_response = api_client.get(reverse('phone-bills'), params)
+    assert cached_response.data == response.data
+
+    api_client.post(reverse('call-records'), [
+        {
+            'call_id': '124',
+            'type': 'start',
+            'timestamp': '2023-10-11T15:00:00Z',
+            'source': '11987654321',
+            'destination': '11912345678',
+        },
+        {
+            'call_id': '124',
+            'type': 'end',
+            'timestamp': '2023-10-11T15:10:00Z',
+        },
+    ], format='json')
+
+    response = api_client.get(reverse('phone-bills'), params)
+    assert len(response.data['call_records']) == 2
+
+
+def create_october_calls(count):
+    for i in range(count):
+        CallRecord.objects.create(
+            call_id=str(i),
+            type='start',
+            timestamp=f'2023-10-{i + 1:02d}T15:00:00Z',
+            source='11987654321',
+            destination='11912345678',
+        )
+        CallRecord.objects.create(
+            call_id=str(i),
+            type='end',
+            timestamp=f'2023-10-{i + 1:02d}T15:10:00Z',
+        )
+
+
+@pytest.mark.django_db
+def test_phone_bill_view_paginates_calls_by_start_time(api_client):
+    create_october_calls(5)
+    params = {'phone_number': '11987654321', 'period': '2023-10', 'page_size': 2}
+
+    pages = []
+    while True:
+        response = api_client.get(reverse('phone-bills'), params)
+        assert response.status_code == status.HTTP_200_OK
+        pages.append(response.data)
+        if response.data['next_cursor'] is None:
+            break
+        params['cursor'] = response.data['next_cursor']
+
+    assert [len(page['call_records']) for page in pages] == [2, 2, 1]
+    assert {page['total_price'] for page in pages} == {'R$ 6.30'}
+    start_dates = [call['call_start_date'] for page in pages for call in page['call_records']]
+    assert start_dates == [f'2023-10-{day:02d}' for day in range(1, 6)]
+
+
+@pytest.mark.django_db
+def test_phone_bill_view_invalid_pagination(api_client):
+    params = {'phone_number': '11987654321', 'period': '2023-10'}
+
+    response = api_client.get(reverse('phone-bills'), {**params, 'page_size': 'all'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = api_client.get(reverse('phone-bills'), {**params, 'cursor': 'forged'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data['error'] == 'Invalid cursor.'
+
+
+@pytest.mark.django_db
+def test_phone_bill_view_streams_ndjson_export(api_client):
+    create_october_calls(3)
+    response = api_client.get(
+        reverse('phone-bills'),
+        {'phone_number': '11987654321', 'period': '2023-10', 'export': 'ndjson'},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+
+    lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+    assert len(lines) == 4
+    assert lines[0] == {
+        'destination': '11912345678',
+        'call_start_date': '2023-10-01',
+        'call_start_time': '15:00:00',
+        'duration': '0h10m0s',
+        'price': 'R$ 1.26',
+    }
+    assert lines[-1] == {'phone_number': '11987654321', 'period': '2023-10', 'total_price': 'R$ 3.78'}
+
+
+@pytest.mark.django_db
+def test_phone_bill_view_streams_csv_export(api_client):
+    create_october_calls(2)
+    response = api_client.get(
+        reverse('phone-bills'),
+        {'phone_number': '11987654321', 'period': '2023-10', 'export': 'csv'},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert b''.join(response.streaming_content).decode().splitlines() == [
+        'destination,call_start_date,call_start_time,duration,price',
+        '11912345678,2023-10-01,15:00:00,0h10m0s,R$ 1.26',
+        '11912345678,2023-10-02,15:00:00,0h10m0s,R$ 1.26',
+    ]
+
+
+@pytest.mark.django_db
+def test_phone_bill_statement_view_groups_calls_by_period_of_their_end(api_client, django_assert_max_num_queries, create_call):
+    create_call('1', '11987654321', '2023-09-10T15:00:00Z', '2023-09-10T15:10:00Z')
+    # Started in September, ended in October
+    create_call('2', '11987654321', '2023-09-30T23:50:00Z', '2023-10-01T00:10:00Z')
+    create_call('3', '11987654321', '2023-11-10T15:00:00Z', '2023-11-10T15:10:00Z')
+    create_call('4', '11987654321', '2023-12-10T15:00:00Z', '2023-12-10T15:10:00Z')
+    create_call('5', '11987654322', '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+    params = {'phone_number': '11987654321', 'from': '2023-09', 'to': '2023-11'}
+
+    # Authentication and a single query for the calls of every period
+    with django_assert_max_num_queries(2):
+        response = api_client.get(reverse('phone-bill-statement'), params)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['total_price'] == 'R$ 2.88'
+    assert [
+        (period['period'], period['total_price'], len(period['call_records']))
+        for period in response.data['periods']
+    ] == [('2023-09', 'R$ 1.26', 1), ('2023-10', 'R$ 0.36', 1), ('2023-11', 'R$ 1.26', 1)]
+
+    # Each period matches its bill
+    for period in response.data['periods']:
+        bill = api_client.get(reverse('phone-bills'), {'phone_number': '11987654321', 'period': period['period']})
+        assert period['call_records'] == bill.data['call_records']
+        assert period['total_price'] == bill.data['total_price']
+
+
+@pytest.mark.django_db
+def test_phone_bill_statement_view_invalid_ranges(api_client):
+    url = reverse('phone-bill-statement')
+
+    for params in [
+        {'from': '2023-01', 'to': '2023-12'},
+        {'phone_number': '11987654321', 'from': '2023-01'},
+        {'phone_number': '11987654321', 'from': '2023-13', 'to': '2023-12'},
+        {'phone_number': '11987654321', 'from': '2023-12', 'to': '2023-01'},
+        {'phone_number': '11987654321', 'from': '2022-01', 'to': '2024-01'},
+    ]:
+        response = api_client.get(url, params)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'error' in response.data
+
+
+@pytest.mark.django_db
+def test_phone_bill_batch_view_matches_single_bills(api_client, django_assert_max_num_queries, create_call):
+    numbers = [f'1198765{index:04d}' for index in range(30)]
+    for index, number in enumerate(numbers[:20]):
+        create_call(f'{index}-a', number, '2023-10-10T15:00:00Z', '2023-10-10T15:10:00Z')
+        create_call(f'{index}-b', number, '2023-10-09T22:00:00Z', '2023-10-09T22:05:00Z')
+    # Bills of half of the numbers are materialized, and served even after
+    # their calls change
+    call_command('close_billing_period', '--period', '2023-10')
+    PhoneBill.objects.filter(phone_number__in=numbers[10:]).delete()
+    CompletedCall.objects.filter(source__in=numbers).update(price=Decimal('9.99'))
+
+    body = {'phone_numbers': [numbers[25], *numbers[:20], numbers[0]], 'period': '2023-10'}
+    # Authentication, then the materialized bills, their calls and the other calls
+    with django_assert_max_num_queries(4):
+        response = api_client.post(reverse('phone-bill-batch'), body, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    bills = response.data['bills']
+    assert [bill['phone_number'] for bill in bills] == [numbers[25], *numbers[:20]]
+    assert bills[0] == {
+        'phone_number': numbers[25],
+        'period': '2023-10',
+        'total_price': 'R$ 0.00',
+        'call_records': [],
+    }
+    assert bills[1]['total_price'] == 'R$ 1.62'
+    assert bills[20]['total_price'] == 'R$ 19.98'
+    for bill in bills:
+        single = api_client.get(reverse('phone-bills'), {'phone_number': bill['phone_number'], 'period': '2023-10'})
+        assert bill == single.data
+
+
+@pytest.mark.django_db
+def test_phone_bill_batch_view_invalid_requests(api_client):
+    url = reverse('phone-bill-batch')
+
+    for body in [
+        {},
+        {'phone_numbers': []},
+        {'phone_numbers': ['123']},
+        {'phone_numbers': ['11987654321'], 'period': '2023/10'},
+    ]:
+        response = api_client.post(url, body, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST